@@ -4,4 +4,5 @@ __version__ = "1.0.32"
 # from . import main as NsgOrcFx
 from .main import *
 from . import main as NsgOrcFx
-from .fatigue import FatigueAnalysis
\ No newline at end of file
+from .fatigue import FatigueAnalysis
+from .sncurves import SNCurve, selectSNCurveByName, selectSNCurves, minerDamage
\ No newline at end of file
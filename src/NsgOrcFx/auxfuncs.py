@@ -4,6 +4,7 @@ import numpy as np
 import OrcFxAPI as __ofx
 from . import constants
 from . import utils
+from .wavesearch import WaveSearchCache, waveSearchCacheFrom, WaveSearchKey, waveSearchEngines, LargestRiseAndFallNumpy
 
 __char = ctypes.c_wchar
 __letters = 'abcdefghijklimnoprstuvwxyz'
@@ -145,28 +146,19 @@ def isRegularWave(waveType: str) -> bool:
         print(f'Warning! Wave type {waveType} not recognized. Considered as irregular.')
         return False
 
-def SetReducedSimDuration(
+def SetWaveSearchStart(
         model: __ofx.Model, 
-        reducedDuration: float = 200., 
-        refstormduration = 10800.,
-        fallOrRise: str ='rise', # 'rise' or 'fall'
         extremeWavePosition: list[float] = [0.,0.],
         iniWaveTimeOrigin: float | None = 0.0
         ) -> None:
     '''
-    Reduces the simulation time for irreguar wave based on the highest fall/rise
-        - model: OrcaFlex loaded model
-        - reducedDuration: The simulation time after reducing. Used for the Stage 1. 
-        - refstormduration: wave duration along which the highest rise/fall will be searched
-        - fallOrRise: if time selection is based on the largest 'fall' or 'rise' event
-        - waveTrainIndex: based on which wave train largest fall or rise must be selected
+    Sets the wave time origin of each wave train and the wave preview position before the search 
+    of the largest rise/fall of `SetReducedSimDuration` (the wave search key and the wave components
+    of the search depend on them, see `WaveSearchKey`)
         - extremeWavePosition: position of wave origin for search
-        - iniWaveTimeOrigin: initial wave time origin to search for the next extreme event. If `None`, keep the value in the model for each wave train.
-
-        Obs.: the Tp value defined in the model will be used for the Stage 0.
-    '''        
+        - iniWaveTimeOrigin: initial wave time origin. If `None`, keep the value in the model for each wave train.
+    '''
     env = model.environment
-    general = model.general
     # previousWaveTrainIndex = env.SelectedWaveTrainIndex
     # env.SelectedWaveTrainIndex = waveTrainIndex
     hasIrregularWave = False
@@ -186,8 +178,36 @@ def SetReducedSimDuration(
     # prevWavePreviewPosition = [env.WavePreviewPositionX, env.WavePreviewPositionY]
     env.WavePreviewPositionX = extremeWavePosition[0]
     env.WavePreviewPositionY = extremeWavePosition[1]
+
+def SetReducedSimDuration(
+        model: __ofx.Model, 
+        reducedDuration: float = 200., 
+        refstormduration = 10800.,
+        fallOrRise: str ='rise', # 'rise' or 'fall'
+        extremeWavePosition: list[float] = [0.,0.],
+        iniWaveTimeOrigin: float | None = 0.0,
+        cache: WaveSearchCache | str | None = None,
+        engine: str = 'spreadsheet'
+        ) -> None:
+    '''
+    Reduces the simulation time for irreguar wave based on the highest fall/rise
+        - model: OrcaFlex loaded model
+        - reducedDuration: The simulation time after reducing. Used for the Stage 1. 
+        - refstormduration: wave duration along which the highest rise/fall will be searched
+        - fallOrRise: if time selection is based on the largest 'fall' or 'rise' event
+        - waveTrainIndex: based on which wave train largest fall or rise must be selected
+        - extremeWavePosition: position of wave origin for search
+        - iniWaveTimeOrigin: initial wave time origin to search for the next extreme event. If `None`, keep the value in the model for each wave train.
+        - cache: cache of the wave search results (`WaveSearchCache` or path of its file). If `None`, the search is always done.
+        - engine: 'spreadsheet' (OrcaFlex wave search) or 'numpy' (in memory, from the wave components). See `GetLargestRiseAndFall`.
+
+        Obs.: the Tp value defined in the model will be used for the Stage 0.
+    '''        
+    env = model.environment
+    general = model.general
+    SetWaveSearchStart(model, extremeWavePosition, iniWaveTimeOrigin)
     
-    tRise, tFall = GetLargestRiseAndFall(model, WaveSearchDuration=refstormduration)
+    tRise, tFall = GetLargestRiseAndFall(model, WaveSearchDuration=refstormduration, cache=cache, engine=engine)
     if fallOrRise == 'rise': tSel = tRise
     elif fallOrRise == 'fall': tSel = tFall
     else: raise Exception(f'Input {fallOrRise} not allowed to "fallOrRise".')
@@ -210,17 +230,28 @@ def SetReducedSimDuration(
 def GetLargestRiseAndFall(
         model: __ofx.Model, 
         filename: str = 'SearchWave', 
-        WaveSearchDuration: float = 10800
+        WaveSearchDuration: float = 10800,
+        cache: WaveSearchCache | str | None = None,
+        engine: str = 'spreadsheet'
         ) -> tuple[float,float]:
     '''
     Inputs:
         - model: OrcaFlex model with the defined wave (type, Tp, Hs ...)
         - filename (optional): Temporary file that will be used in the search.
         - WaveSearchDuration (optional): Period, in seconds, to find the highest rise or fall. Default = 10080
+        - cache (optional): cache of the wave search results (`WaveSearchCache` or path of its file). 
+        If the same wave search was already done (see `WaveSearchKey`), the result is taken from the 
+        cache and the wave search spreadsheet is not generated.
+        - engine (optional): 'spreadsheet' to parse the OrcaFlex wave search spreadsheet or 'numpy' to 
+        compute the elevation in memory from the wave components (see `LargestRiseAndFallBatch`). The 
+        'numpy' engine reports the zero crossing between the trough and the crest, and does not support 
+        non-linear regular waves (e.g. Dean stream).
         
     Outputs:
         - tuple (t1, t2) with two values: time of highest rise and fall
     '''        
+    if not engine in waveSearchEngines:
+        raise Exception(f'Wave search engine "{engine}" not recognized. Options: {waveSearchEngines}.')
     env = model.environment
 
     #assuming we want to look over the first 3hrs
@@ -236,6 +267,17 @@ def GetLargestRiseAndFall(
     if env.NumberOfWaveTrains == 1 and env.WaveNumberOfSpectralDirections == 1: 
         env.WaveSearchMinSteepness = 1e9
 
+    cache = waveSearchCacheFrom(cache)
+    if cache != None:
+        key = WaveSearchKey(model, WaveSearchDuration, engine)
+        cached = cache.get(key)
+        if cached != None: return cached
+
+    if engine == 'numpy':
+        tRise, tFall = LargestRiseAndFallNumpy(model, WaveSearchDuration)
+        if cache != None: cache.put(key, tRise, tFall)
+        return tRise, tFall
+
     # file = filename + '.txt'
     file = utils.getAvailableFileName(filename, '.txt', forceRandom=True)
     try:   
@@ -254,5 +296,7 @@ def GetLargestRiseAndFall(
     os.remove(file) # delete temp file
 
     t0 = env.WaveTimeOrigin
+    tRise, tFall = timeOfLargestRise-t0, timeOfLargestFall-t0
+    if cache != None: cache.put(key, tRise, tFall)
 
-    return timeOfLargestRise-t0, timeOfLargestFall-t0
+    return tRise, tFall
@@ -179,6 +179,22 @@ class Modes(_ofx.Modes):
         line = self.getLineByName(lineName)
         return _modal.StressShape(line, self, modeIndex, nThetas, radiusPos, normalizeByDiameter, equalySpaced)
 
+    def StressShapes(
+            self,
+            lineName: str,
+            modeIndexes: list[int] | None = None, # 0 based; all modes if None
+            nThetas: int=8, # number of cross section points (polar coords.) to calculate stress range
+            radiusPos: str='mid', # 'inner', 'mid', 'outer'
+            normalizeByDiameter: bool=True
+            ) -> tuple[list[float], np.ndarray]:
+        """
+        Returns the arc lengths and the stress shapes of the modes (modes x arc lengths, stress 
+        range per diameter unit, in MPa), e.g. for the spectral fatigue (`ModalStressPSD`)
+        """
+        if modeIndexes == None: modeIndexes = list(range(self.modeCount))
+        shapes = [self.StressShape(lineName, i, nThetas, radiusPos, normalizeByDiameter) for i in modeIndexes]
+        return shapes[0][0], np.array([stressRanges for _, stressRanges in shapes])
+
 
 
             
\ No newline at end of file
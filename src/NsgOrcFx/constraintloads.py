@@ -3,13 +3,17 @@ Extract constraint loads from OrcaFlex simulation files
 """
 
 import os
+import glob
 import OrcFxAPI as ofx
 import numpy as np
 import pandas as pd
+from .resultstore import ResultStore, resultStoreFrom
+from .modelcache import LoadModelCached
+from .extraction import ExtremeBlock, VariableSpec, extractFromSims, extractFromStore
 
 class _Units:
     def __init__(self, file: str):
-        model = ofx.Model(file)
+        model = LoadModelCached(file) # reused by the extraction of the first file
         self.__force = model.general.ForceUnits
         self.__length = model.general.LengthUnits    
         self.__time = model.general.TimeUnits 
@@ -30,25 +34,6 @@ class _Units:
         else:
             raise Exception(f'Load type {loadType} not recognized.')
 
-class CriticalLCs:
-    def __init__(self, extremesByObj: dict):
-        self.__criticalLCs: dict[list] = {}
-        for objRsts in extremesByObj.values():
-            for rstItem in objRsts:
-                LC, time = rstItem[0], rstItem[1]
-                if not LC in self.__criticalLCs.keys():
-                    self.__criticalLCs[LC] = []
-                if not time in self.__criticalLCs[LC]:
-                    self.__criticalLCs[LC].append(time)
-    def isIncluded(self, LC: str, time: None|float=None):
-        if LC in self.__criticalLCs.keys():
-            if time == None:
-                return True
-            else:
-                if time in self.__criticalLCs[LC]:
-                    return True
-        return False
-
 class ResultDefinitions:
     __loadTypes = ['force', 'moment']
     __directions = ['x','y','z','Total']
@@ -131,23 +116,19 @@ def __is_resultant_load(label: str) -> bool:
 def __getFileList(path: str) -> list[str]:
     return [f for f in os.listdir(path) if f[-4:] == '.sim']
 
-def __copy(fromExtremes: list[list[float]]) -> list:
-    newExtremes = []
-    for row in fromExtremes:
-        newExtremes.append(row.copy())
-    return newExtremes
-
 def __saveToFile(
-        extremesByObj: dict, 
-        completeRstList: dict,
+        extremes: dict[tuple, ExtremeBlock], 
+        samplesByLC: dict,
         file: str,
-        constraints: list[str],
         units: _Units,
         includeStatics: bool = True
         ):
+    """`extremes`, `samplesByLC`: results of the constraints extracted by `extractFromSims`"""
     print('Saving file...', end=' ', flush=True)
-    df1 = __genTableExtremeByObject(extremesByObj, file, constraints, units, includeStatics)
-    df2 = __genTableCriticalLCs(constraints, extremesByObj, completeRstList, includeStatics)
+    constraints = [objName for objName, _, _ in extremes]
+    extremesByObj = {objName: block for (objName, _, _), block in extremes.items()}
+    df1 = __genTableExtremeByObject(extremesByObj, constraints, units, includeStatics)
+    df2 = __genTableCriticalLCs(constraints, list(extremes.keys()), samplesByLC, includeStatics)
     ext = os.path.splitext(file)[-1]
 
     if ext == '.xlsx' or ext == '.xls': 
@@ -155,8 +136,8 @@ def __saveToFile(
             df1.to_excel(writer, sheet_name='Extreme loads')
             df2.to_excel(writer, sheet_name='LC list')
     elif ext == '.csv':
-        df1.to_csv(file.replace('.csv','_Extreme-Loads.csv'), sheet_name='Extreme loads')
-        df2.to_excel(file.replace('.csv','_LC-list.csv'), sheet_name='LC list')
+        df1.to_csv(file.replace('.csv','_Extreme-Loads.csv'))
+        df2.to_csv(file.replace('.csv','_LC-list.csv'))
     else:
         raise Exception(f'Extension "{ext}" not supported.')
 
@@ -165,7 +146,6 @@ def __saveToFile(
 
 def __genTableExtremeByObject(
         extremesByObj: dict, 
-        file: str,
         constraints: list[str],
         units: _Units,
         include_statics: bool = True
@@ -173,8 +153,7 @@ def __genTableExtremeByObject(
     data = []
     rowTitles = []
     for objName in constraints:
-        extremes = extremesByObj[objName]
-        for i, row in enumerate(extremes):
+        for i, row in enumerate(extremesByObj[objName].rows()):
             if i < resultDefinitions.count: maxMinTag = 'Max'
             else: maxMinTag = 'Min'            
             loadTag = resultDefinitions.fullList[i % 8][1]
@@ -191,16 +170,18 @@ def __genTableExtremeByObject(
 
     cols = pd.MultiIndex.from_tuples(columnTitles)
     df = pd.DataFrame(data, index=indexes, columns=cols)
-    df.to_excel(file) 
     return df
 
 def __genTableCriticalLCs(
         constraintList: list[str], 
-        extremesByObj: dict,
-        completeRstList: dict[dict], 
+        channelKeys: list[tuple],
+        samplesByLC: dict[str, dict], 
         includeStatics: bool = True
         ):
-    criticalLCs = CriticalLCs(extremesByObj)
+    """
+    * channelKeys: key of the results of each constraint (see `extractFromSims`)
+    * samplesByLC: samples at the extremes of each load case (see `extractFromSims`), of the single period
+    """
     indexesTitles = []
     columnTitles = []
     data = []
@@ -213,199 +194,47 @@ def __genTableCriticalLCs(
             columnTitles.extend(resultDefinitions.tableColTitles(['Static', objName]))
 
     # iterate over the LCs
-    for i, LC in enumerate(completeRstList.keys()):
-        if criticalLCs.isIncluded(LC):            
+    keys = list(channelKeys)
+    if includeStatics: keys += [(*key, 'Static') for key in keys]
+    for LC, samplesByPeriod in samplesByLC.items():
+        for samples in samplesByPeriod.values():
             # create the row titles (indexes)
-            for time in completeRstList[LC]['Time']:
-                if criticalLCs.isIncluded(LC, time):
-                    indexesTitles.append((LC, time))
-            
-            # set data into the required format
-            for iTime, time in enumerate(completeRstList[LC]['Time']):
-                if criticalLCs.isIncluded(LC, time):
-
-                    newGeneralRow = []
-                    # dynamic results
-                    for objName in constraintList:
-                        newObjRow = []
-                        if objName in completeRstList[LC].keys(): 
-                            for value in completeRstList[LC][objName]['Dynamic'].values():
-                                newObjRow.append(value[iTime])
-                            newGeneralRow.extend(newObjRow)    
-
-                    # static results
-                    if includeStatics:
-                        for objName in constraintList:
-                            newObjRow = []
-                            if objName in completeRstList[LC].keys(): 
-                                for value in completeRstList[LC][objName]['Static'].values():
-                                    newObjRow.append(value)
-                                newGeneralRow.extend(newObjRow)    
-                            else:
-                                raise Exception('Missing constraint in particular sim file not implemented yet.')
-
-                    data.append(newGeneralRow)            
+            indexesTitles.extend([(LC, time) for time in samples['Time'].tolist()])
+            # dynamic and static results (samples x results) of each constraint, side by side
+            data.append(np.hstack([samples[key] for key in keys]))
 
     indexes = pd.MultiIndex.from_tuples(indexesTitles, names=['File', 'Sim. time [s]'])
     columns = pd.MultiIndex.from_tuples(columnTitles)
-    df = pd.DataFrame(data, index=indexes, columns=columns)
+    df = pd.DataFrame(np.vstack(data), index=indexes, columns=columns)
     return df
 
-def __storeGlobalResults(
-        constraintName: str, LC: str, 
-        sampleTimes: list[float],
-        timeHistoryResults: dict[list[float]], 
-        staticResults: dict[float]|None,
-        complete_result_list: dict
-        ):
-    
-    if not LC in complete_result_list.keys(): 
-        complete_result_list[LC] = {}
-        complete_result_list[LC]['Time'] = sampleTimes
-
-    if not constraintName in complete_result_list[LC].keys(): 
-        complete_result_list[LC][constraintName] = {}        
-        complete_result_list[LC][constraintName]['Dynamic'] = {}        
-        complete_result_list[LC][constraintName]['Static'] = {}        
-
-    for tag, value in timeHistoryResults.items():
-        complete_result_list[LC][constraintName]['Dynamic'][tag] = value
-        if staticResults != None:
-            complete_result_list[LC][constraintName]['Static'][tag] = staticResults[tag]
-
-def __getConstraintList(model: ofx.Model, constraints: list[str]) -> list[str]:
-    for obj in model.objects:
-        if obj.type == ofx.ObjectType.Constraint:
-            constraints.append(obj.name)
+def __getConstraintList(model: ofx.Model) -> list[str]:
+    constraints = [obj.name for obj in model.objects if obj.type == ofx.ObjectType.Constraint]
     if len(constraints) == 0:
         raise Exception('None constraint object was found in the model.')
-            
-def __procFiles(
-        files: list[str], 
-        simFilesFolder: str, 
+    return constraints
+
+def __constraintSpecs(
         constraints: list[str],
         latestWave: bool = True,
         includeStatics: bool = True,
         invert_signs: bool = False
-        ):
-    extremesByObj = {}
-    completeResultList = {}
-
-    n = len(files)
-    for i, f in enumerate(files):
-        print(f'Processing file ({i+1}/{n}): "{f}" ...', end=' ', flush=True)
-        LC = f # the Load Case title is assumed to be the file name
-
-        path = os.path.join(simFilesFolder, f)
-        model = ofx.Model(path)
-        if len(constraints) == 0 and i == 0:
-            __getConstraintList(model, constraints)
-
-        for objName in constraints:
-            constraint = model[objName]            
-            newExtremeResults, thResults, sampleTimes, staticRsts = __getConstraintExtremes(
-                constraint, LC, latestWave, includeStatics, invert_signs)
-
-            # stores the extreme results for the evaluated constraint
-            if i == 0: 
-                extremesByObj[objName] = __copy(newExtremeResults)
-            else:
-                __compareExtremeLCs(
-                    extremesByObj[objName], newExtremeResults)
-
-            # stores in the complete result list
-            __storeGlobalResults(
-                objName, LC, sampleTimes, thResults, staticRsts, completeResultList)
-
-        print('done.')
-
-    return extremesByObj, completeResultList
-
-def __compareExtremeLCs(extremesA: list[list[float]], extremesB: list[list[float]]):
-    for maxMinOffset in [0,resultDefinitions.count]:
-        # compare only the first block of results , which corresponds to the total (dynamic) extremes
-        for i in range(resultDefinitions.count): 
-            row = i + maxMinOffset            
-            if (maxMinOffset == 0 and extremesA[row][i+2] < extremesB[row][i+2]) \
-                or (maxMinOffset == resultDefinitions.count and extremesA[row][i+2] > extremesB[row][i+2]):
-                # copy all values, including the second block, which corresponds to the static values
-                for j in range(len(extremesB[row])): 
-                    extremesA[row][j] = extremesB[row][j]
-
-def __getPeriod(latestWave: bool=True) -> ofx.PeriodArg:
-    if latestWave: pn = ofx.pnLatestWave
-    else: pn = ofx.pnWholeSimulation
-    return pn
-
-def __getTimeHistories(
-        obj: ofx.OrcaFlexObject, 
-        latestWave: bool = True,
-        invert_signs: bool = False
-        ):    
-    pn = __getPeriod(latestWave)
-    th_results = {}
-    for varName, tag, _, _ in resultDefinitions.fullList: 
-        th = obj.TimeHistory(varName, pn)
-        if invert_signs: 
-            if not __is_resultant_load(tag): 
-                th = -1 * th
-        th_results[tag] = th
-    return th_results
-
-def __getStaticResults(        
-        obj: ofx.OrcaFlexObject,
-        invert_signs: bool = False
-        ):
-    results = {}
-    for varName, tag, _, _ in resultDefinitions.fullList:
-        r = obj.StaticResult(varName)
-        if invert_signs:
-            # invert only the components (x, y, z); not the resultant
-            if not __is_resultant_load(tag): 
-                r *= -1
-        results[tag] = r
-    return results
-
-
-def __getExtremeValuesFromTH(
-        sampleTimes: np.ndarray,
-        th_results: dict, 
-        LC: str
-        ):
-    extremeResults = []
-    for iExtreme in [np.argmax, np.argmin]:
-        for tag1 in resultDefinitions.tags: 
-            rstList: list[float] = th_results[tag1]
-            i = iExtreme(rstList)
-            time = sampleTimes[i]
-            rstNewRow = [LC,time]
-            for tag2 in resultDefinitions.tags: 
-                rstNewRow.append(th_results[tag2][i])
-            extremeResults.append(rstNewRow)
-      
-    return extremeResults
-
-def __getConstraintExtremes(
-        obj: ofx.OrcaFlexObject, 
-        LC: str,
-        latestWave: bool = True,
-        includeStatics: bool = True,
-        invert_signs: bool = False
-        ):
-    th_results = __getTimeHistories(obj, latestWave, invert_signs)
-    pn = __getPeriod(latestWave)
-    sampleTimes = obj.SampleTimes(pn)
-    extremeResults = __getExtremeValuesFromTH(sampleTimes, th_results, LC)
-
-    if includeStatics:
-        staticResults = __getStaticResults(obj, invert_signs)
-        for extreme in extremeResults:
-            extreme.extend(staticResults.values())
-    else:
-        staticResults = None
-
-    return extremeResults, th_results, sampleTimes, staticResults
+        ) -> list[VariableSpec]:
+    """Specification of the results of each constraint (see `VariableSpec`), in the order of the result tags"""
+    varNames = [varName for varName, _, _, _ in resultDefinitions.fullList]
+    factors = __resultSigns(invert_signs).tolist()
+    period = 'latest wave' if latestWave else None
+    return [
+        VariableSpec(varNames, 'Constraint', glob.escape(objName), period=period, factors=factors, statics=includeStatics)
+        for objName in constraints]
 
+def __resultSigns(invert_signs: bool = False) -> np.ndarray:
+    """Factor of each result: -1 to invert only the components (x, y, z), not the resultant"""
+    signs = np.ones(resultDefinitions.count)
+    if invert_signs:
+        for i, (_, tag, _, _) in enumerate(resultDefinitions.fullList):
+            if not __is_resultant_load(tag): signs[i] = -1.
+    return signs
 
 
 
@@ -417,7 +246,10 @@ def ExtremeLoadsFromConstraints(
         in_frame: bool=True, 
         local: bool=True,
         include_statics: bool = True,
-        invert_signs: bool = False
+        invert_signs: bool = False,
+        streaming: bool = True,
+        n_workers: int = 1,
+        store: ResultStore|str|None = None
         ):
     """
     Extract Constraint extreme (max. and min.) loads (force and moment) from OrcaFLex simulation files
@@ -436,20 +268,38 @@ def ExtremeLoadsFromConstraints(
     applied by the in-frame to the out-frame; set this input as `False` if the 
     opposite is required, i.e. load applied to the object to which the constraint is 
     connected (`in_frame=True`) or by the out-frame to the out-frame (`in_frame=False`)
+    * streaming: if `True`, only the running extremes and the samples at the extreme times 
+    (rows of the 'LC list') are kept, and the time histories of each file are released after 
+    processing it, so the memory does not grow with the number of files. If `False`, all time 
+    histories are kept up to the end (same output)
+    * n_workers: number of processes loading and processing the .sim files at the same time; the 
+    results of each file are merged in the order of the files, giving the same output of the serial 
+    extraction (on Windows, protect the calling script by `if __name__ == '__main__':`)
+    * store: result store (`ResultStore` or its folder) to which the time histories of each constraint 
+    are written, with the OrcaFlex variable names (e.g. 'In-frame connection Lz force') and 
+    the static values, so they can be queried later without the .sim files (requires `pyarrow`). 
+    The output file is then built from the store, as a view of it
 
     Obs.: Assumes all .sim files have the same Constraint objects and unit definitions 
     """
     files = __getFileList(sim_files_folder)
 
-    units = _Units(os.path.join(sim_files_folder,files[0]))
+    firstFile = os.path.join(sim_files_folder, files[0])
+    units = _Units(firstFile)
 
     global resultDefinitions
     resultDefinitions = ResultDefinitions(units, in_frame, local)
 
-    if constraints == None: constraints = []
-
-    extremeByObj, completeRstList = __procFiles(
-        files, sim_files_folder, constraints, latest_wave, 
-        include_statics, invert_signs)
+    if constraints == None: constraints = __getConstraintList(LoadModelCached(firstFile))
+    store = resultStoreFrom(store)
+
+    # the constraints as variable specifications of the generic extraction (see `ExtremeResultsFromSims`)
+    specs = __constraintSpecs(constraints, latest_wave, include_statics, invert_signs)
+    extremes, channelVars, samplesByLC, _ = extractFromSims(
+        files, sim_files_folder, specs, streaming or store != None, n_workers, None if store == None else store.folder)
+    if store != None: # the tables are a view of the store
+        print('Reading the results from the store...', flush=True)
+        extremes, _, samplesByLC, _ = extractFromStore(
+            files, store.folder, extremes, channelVars, streaming, n_workers)
     
-    __saveToFile(extremeByObj, completeRstList, out_file, constraints, units, include_statics)
\ No newline at end of file
+    __saveToFile(extremes, samplesByLC, out_file, units, include_statics)
\ No newline at end of file
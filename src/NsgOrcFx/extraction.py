@@ -0,0 +1,505 @@
+"""
+Extreme results of any object type (e.g. line end loads, vessel motions, winch and link tensions) 
+from OrcaFlex simulation files, defined by variable specifications and extracted in one pass per file
+"""
+
+import os
+import fnmatch
+import itertools
+import multiprocessing
+from dataclasses import dataclass
+import OrcFxAPI as ofx
+import numpy as np
+import pandas as pd
+from .postproc import periodFromSpec, objectExtraFromSpec
+from .resultstore import ResultStore, resultStoreFrom, periodLabel
+from .variations import caseNameFromFile
+from .modelcache import LoadModelCached, sharedModelCache
+
+class ExtremeBlock:
+    """
+    Extreme results of an object, one row per extreme (the max. of each result, then the min. 
+    of each result), with the load case, the time and the values of all results at that time
+    """
+    def __init__(
+            self, 
+            LCs: np.ndarray, 
+            times: np.ndarray, 
+            dynamic: np.ndarray, 
+            static: np.ndarray|None = None,
+            samples: np.ndarray|None = None
+            ):
+        self.LCs = LCs          # (extremes,) load case of each extreme
+        self.times = times      # (extremes,) simulation time of each extreme
+        self.dynamic = dynamic  # (extremes, results) total (dynamic) results at the time of each extreme
+        self.static = static    # (extremes, results) static results, if included
+        self.samples = samples  # (extremes,) index of the sample of each extreme in its load case, if known
+
+    @classmethod
+    def fromTimeHistories(
+            cls, 
+            LC: str, 
+            sampleTimes: np.ndarray, 
+            values: np.ndarray, 
+            static: np.ndarray|None = None
+            ) -> tuple['ExtremeBlock', np.ndarray]:
+        """
+        Returns the extremes of the time histories (samples x results) and the sample index of each extreme
+        """
+        indexes = np.concatenate([np.argmax(values, axis=0), np.argmin(values, axis=0)])
+        n = len(indexes)
+        if static is None: staticRows = None
+        else: staticRows = np.tile(static, (n, 1))
+        block = cls(
+            np.full(n, LC, dtype=object), np.asarray(sampleTimes)[indexes], values[indexes], staticRows, indexes.copy())
+        return block, indexes
+
+    @property
+    def extremeValues(self) -> np.ndarray:
+        """Value of the result of each extreme (e.g. the max. Fx in the row of the max. Fx)"""
+        n, nResults = self.dynamic.shape
+        return self.dynamic[np.arange(n), np.arange(n) % nResults]
+
+    def merge(self, other: 'ExtremeBlock'):
+        """Replaces the rows whose extreme is exceeded by the other block (in a tie, the current row is kept)"""
+        nResults = self.dynamic.shape[1]
+        a, b = self.extremeValues, other.extremeValues
+        exceeded = np.concatenate([b[:nResults] > a[:nResults], b[nResults:] < a[nResults:]])
+        self.LCs[exceeded] = other.LCs[exceeded]
+        self.times[exceeded] = other.times[exceeded]
+        self.dynamic[exceeded] = other.dynamic[exceeded]
+        if self.static is not None: self.static[exceeded] = other.static[exceeded]
+        if self.samples is not None: self.samples[exceeded] = other.samples[exceeded]
+
+    def copy(self) -> 'ExtremeBlock':
+        static = None if self.static is None else self.static.copy()
+        samples = None if self.samples is None else self.samples.copy()
+        return ExtremeBlock(self.LCs.copy(), self.times.copy(), self.dynamic.copy(), static, samples)
+
+    def rows(self) -> list[list]:
+        """Rows of the table: load case, time, dynamic results and static results"""
+        values = self.dynamic if self.static is None else np.hstack([self.dynamic, self.static])
+        return [[LC, time, *row] for LC, time, row in zip(self.LCs, self.times, values.tolist())]
+
+
+
+
+@dataclass
+class VariableSpec:
+    """
+    Results to be extracted from the objects of a type and/or with names matching a pattern, e.g.:
+    * line end loads: `VariableSpec(['Effective tension', 'Bend moment'], 'Line', objectExtra='End A')`
+    * vessel motions: `VariableSpec(['X', 'Y', 'Rotation 3'], 'Vessel')`
+    * winch and link tensions: `VariableSpec('Tension', 'Winch')`, `VariableSpec('Tension', 'Link')`
+    """
+    varNames: str|list[str]                         # OrcaFlex result variables
+    objectType: str|None = None                     # type of the objects (OrcaFlex type name); any type if `None`
+    namePattern: str = '*'                          # pattern of the object names (e.g. 'Mooring*'), case-insensitive
+    objectExtra: None|str|float = None              # see `objectExtraFromSpec`
+    period: None|str|int|tuple[float,float] = None  # see `periodFromSpec`
+    factors: None|float|list[float] = None          # factor of each variable (e.g. -1 to invert the sign); 1 if `None`
+    statics: bool = False                           # if the static value of each variable is also extracted
+
+    def __post_init__(self):
+        if type(self.varNames) == str: self.varNames = [self.varNames]
+        if self.objectType == None and self.namePattern == '*':
+            raise Exception('The object type or the name pattern must be defined in the variable specification.')
+        if self.factors == None: self.factors = 1.
+        if np.ndim(self.factors) == 0: self.factors = [float(self.factors)] * len(self.varNames)
+        if len(self.factors) != len(self.varNames):
+            raise Exception(f'The number of factors ({len(self.factors)}) differs from the number of variables ({len(self.varNames)}).')
+
+    def matches(self, obj: ofx.OrcaFlexObject) -> bool:
+        if self.objectType != None and obj.typeName.lower() != self.objectType.lower(): return False
+        return fnmatch.fnmatchcase(obj.name.lower(), self.namePattern.lower())
+
+    @property
+    def objectExtraLabel(self) -> str:
+        return '' if self.objectExtra == None else str(self.objectExtra)
+
+
+class CriticalLCs:
+    """
+    Samples at the extremes of any channel, as sets of sample indexes with the period and the load case as key
+    """
+    def __init__(self, extremes: dict[tuple, ExtremeBlock]):
+        self.__criticalLCs: dict[tuple[str, str], set[int]] = {}
+        for (_, _, period), block in extremes.items():
+            for LC, sample in zip(block.LCs, block.samples.tolist()):
+                self.__criticalLCs.setdefault((period, LC), set()).add(sample)
+
+    def isIncluded(self, period: str, LC: str, sample: None|int=None) -> bool:
+        if sample == None: return (period, LC) in self.__criticalLCs
+        return sample in self.__criticalLCs.get((period, LC), ())
+
+    def sampleIndexes(self, period: str, LC: str) -> np.ndarray:
+        """Indexes (ascending) of the critical samples of the load case"""
+        return np.array(sorted(self.__criticalLCs.get((period, LC), ())), dtype=int)
+
+    def positions(self, period: str, LC: str, storedSamples: np.ndarray) -> np.ndarray:
+        """
+        Positions of the critical samples of the load case in the stored ones 
+        (sample indexes, ascending, including all critical samples)
+        """
+        return np.searchsorted(storedSamples, self.sampleIndexes(period, LC))
+
+
+def __resolveChannels(
+        model: ofx.Model, 
+        specs: list[VariableSpec]
+        ) -> dict[tuple[str, str, str], tuple[VariableSpec, list[str], list[float], bool]]:
+    """
+    Returns the result channels of the model: (object name, object extra, period) as key, with the 
+    specification, the variables, their factors and if the statics are extracted. The variables 
+    of the specs matching the same channel are joined
+    """
+    channels = {}
+    for spec in specs:
+        objNames = [obj.name for obj in model.objects if spec.matches(obj)]
+        if len(objNames) == 0:
+            raise Exception(f'None object was found in the model for {spec}.')
+        for objName in objNames:
+            key = (objName, spec.objectExtraLabel, periodLabel(spec.period))
+            if key in channels:
+                _, varNames, factors, statics = channels[key]
+                for varName, factor in zip(spec.varNames, spec.factors):
+                    if varName in varNames: continue
+                    varNames.append(varName)
+                    factors.append(factor)
+                channels[key] = (channels[key][0], varNames, factors, statics or spec.statics)
+            else:
+                channels[key] = (spec, list(spec.varNames), list(spec.factors), spec.statics)
+    return channels
+
+def __fileResults(
+        LC: str, 
+        histories: dict[tuple, tuple[list[str], np.ndarray, np.ndarray, np.ndarray|None]],
+        streaming: bool = True
+        ) -> tuple[dict, dict, dict]:
+    """
+    Returns the extreme results and the variables of each channel and the samples of each period (all samples or, 
+    if `streaming`, only the samples at the extremes), as a dictionary with 'Index' and 'Time' of the samples and 
+    the results (samples x variables) of each channel (and, if extracted, the static results of the channel in 
+    each sample, with the channel key plus 'Static')
+    * histories: variables, sample times, time histories (samples x variables) and static results of each channel
+    """
+    extremes = {}
+    channelVars = {}
+    historiesByPeriod = {}
+    for key, (varNames, sampleTimes, values, static) in histories.items():
+        period = key[2]
+        extremes[key] = ExtremeBlock.fromTimeHistories(LC, sampleTimes, values, static)[0]
+        channelVars[key] = varNames
+        if not period in historiesByPeriod: historiesByPeriod[period] = (sampleTimes, {})
+        historiesByPeriod[period][1][key] = (values, static)
+
+    samples = {}
+    for period, (sampleTimes, periodHistories) in historiesByPeriod.items():
+        if streaming: # keeps only the samples of the extremes, releasing the time histories
+            indexes = np.unique(np.concatenate([extremes[key].samples for key in periodHistories]))
+        else:
+            indexes = np.arange(len(sampleTimes))
+        samples[period] = {'Index': indexes, 'Time': sampleTimes[indexes]}
+        for key, (values, static) in periodHistories.items():
+            samples[period][key] = values[indexes]
+            if static is not None: samples[period][(*key, 'Static')] = np.tile(static, (len(indexes), 1))
+    return extremes, channelVars, samples
+
+def __procFile(
+        f: str, 
+        simFilesFolder: str, 
+        specs: list[VariableSpec],
+        streaming: bool = True,
+        storeFolder: str|None = None
+        ) -> tuple[dict, dict, dict]:
+    """Extracts the results of a simulation file (see `__fileResults`)"""
+    LC = f # the Load Case title is assumed to be the file name
+    path = os.path.join(simFilesFolder, f)
+    model = LoadModelCached(path)
+
+    store = resultStoreFrom(storeFolder)
+    records = None
+    histories = {}
+    for key, (spec, varNames, factors, statics) in __resolveChannels(model, specs).items():
+        obj = model[key[0]]
+        pn = periodFromSpec(spec.period)
+        oe = objectExtraFromSpec(spec.objectExtra)
+        sampleTimes = np.asarray(obj.SampleTimes(pn))
+        values = np.column_stack([obj.TimeHistory(varName, pn, oe) for varName in varNames]) * factors
+        if statics: static = np.array([obj.StaticResult(varName, oe) for varName in varNames]) * factors
+        else: static = None
+        histories[key] = (varNames, sampleTimes, values, static)
+
+        if store != None:
+            records = store.timeHistoryRecords(
+                LC, key[0], sampleTimes, dict(zip(varNames, values.T)), spec.period, spec.objectExtra, 
+                static=None if static is None else dict(zip(varNames, static)), records=records)
+
+    if records != None: store.addRecords(records) # one file of the store for all channels
+    sharedModelCache.release(path) # the memory does not grow with the number of files (nor in the workers)
+    return __fileResults(LC, histories, streaming)
+
+def __procStoredFile(
+        f: str, 
+        storeFolder: str, 
+        storeFiles: list[str],
+        channels: dict[tuple, tuple[list[str], bool]],
+        streaming: bool = True
+        ) -> tuple[dict, dict, dict]:
+    """
+    Reads the results of a simulation file from the result store (latest ones written), as `__procFile`
+    * storeFiles: files of the store with the results of the simulation file (see `ResultStore.resultFiles`)
+    * channels: variables of each channel and if its static results are read
+    """
+    store = resultStoreFrom(storeFolder)
+    varNames = list(dict.fromkeys(varName for names, _ in channels.values() for varName in names))
+    df = store.query(
+        caseNameFromFile(f), list(dict.fromkeys(key[0] for key in channels)), varNames,
+        columns=['Static'] + store.historyColumns, files=storeFiles)
+    rows = {}
+    for row in df.itertuples(index=False):
+        objectExtra = '' if pd.isna(row.ObjectExtra) else row.ObjectExtra
+        rows[(row.Object, objectExtra, row.Period, row.Variable)] = row # the latest one is kept
+
+    histories = {}
+    for key, (varNames, statics) in channels.items():
+        channelRows = [rows.get((*key, varName)) for varName in varNames]
+        if any(row is None for row in channelRows):
+            raise Exception(f'Results of "{key[0]}" ({key[2]}) not found in the result store for "{f}".')
+        sampleTimes = np.asarray(channelRows[0].Time)
+        values = np.column_stack([row.Values for row in channelRows])
+        static = np.array([row.Static for row in channelRows], dtype=float) if statics else None
+        histories[key] = (varNames, sampleTimes, values, static)
+    return __fileResults(f, histories, streaming)
+
+def __procFileInWorker(args: tuple) -> tuple[dict, dict, dict]:
+    """`args`: function reading the file (`__procFile` or `__procStoredFile`) and its arguments"""
+    return args[0](*args[1:])
+
+def __dropNonCriticalSamples(extremes: dict[tuple, ExtremeBlock], samplesByLC: dict[str, dict]):
+    """Removes the stored samples that are no longer extremes of any channel"""
+    criticalLCs = CriticalLCs(extremes)
+    for LC in list(samplesByLC.keys()):
+        for period in list(samplesByLC[LC].keys()):
+            samples = samplesByLC[LC][period]
+            if not criticalLCs.isIncluded(period, LC):
+                del samplesByLC[LC][period]
+                continue
+            keep = criticalLCs.positions(period, LC, samples['Index'])
+            if len(keep) < len(samples['Index']):
+                for name in samples: samples[name] = samples[name][keep]
+        if len(samplesByLC[LC]) == 0: del samplesByLC[LC]
+
+def extractFromSims(
+        files: list[str], 
+        simFilesFolder: str, 
+        specs: list[VariableSpec],
+        streaming: bool = True,
+        nWorkers: int = 1,
+        storeFolder: str|None = None
+        ) -> tuple[dict, dict, dict, dict]:
+    """
+    Extracts the results of the simulation files (engine of `ExtremeResultsFromSims` and 
+    `ExtremeLoadsFromConstraints`). Returns:
+    * the extremes (`ExtremeBlock`) of each channel, with (object name, object extra, period) as key
+    * the variables of each channel
+    * the samples at the extremes of each load case and period (see `__fileResults`)
+    * the max. and min. of each variable of each channel in each file
+    """
+    args = [(__procFile, f, simFilesFolder, specs, streaming, storeFolder) for f in files]
+    return __mergeFiles(files, args, streaming, nWorkers)
+
+def extractFromStore(
+        files: list[str], 
+        storeFolder: str, 
+        extremes: dict[tuple, ExtremeBlock], 
+        channelVars: dict[tuple, list[str]],
+        streaming: bool = True,
+        nWorkers: int = 1
+        ) -> tuple[dict, dict, dict, dict]:
+    """
+    Same as `extractFromSims`, reading the time histories of the files from the result store 
+    (e.g. written by `extractFromSims`), for the channels of the `extremes` and `channelVars`
+    """
+    channels = {key: (varNames, extremes[key].static is not None) for key, varNames in channelVars.items()}
+    # files of each load case found once, so each one is read only from its files
+    filesByLC = resultStoreFrom(storeFolder).resultFiles(files)
+    args = [(__procStoredFile, f, storeFolder, filesByLC.get(caseNameFromFile(f), []), channels, streaming) for f in files]
+    return __mergeFiles(files, args, streaming, nWorkers)
+
+def __mergeFiles(
+        files: list[str], 
+        args: list[tuple],
+        streaming: bool = True,
+        nWorkers: int = 1
+        ) -> tuple[dict, dict, dict, dict]:
+    """Reads each file (see `__procFileInWorker`) and merges their results"""
+    extremes = {}
+    channelVars = {}
+    samplesByLC = {}
+    fileExtremes = {} # max. and min. of each variable of each channel in each file
+
+    n = len(files)
+    nWorkers = min(nWorkers, n)
+    if nWorkers > 1:
+        pool = multiprocessing.Pool(nWorkers)
+        # the first file is processed by this process, as its model may already be loaded (e.g. units), 
+        # and the others by the pool, with the results in the order of the files, so the merge 
+        # is the same of the serial extraction
+        otherResults = pool.imap(__procFileInWorker, args[1:])
+        fileResults = itertools.chain([__procFileInWorker(args[0])], otherResults)
+    else:
+        pool = None
+        fileResults = map(__procFileInWorker, args)
+
+    try:
+        for i, f in enumerate(files):
+            if pool == None: print(f'Processing file ({i+1}/{n}): "{f}" ...', end=' ', flush=True)
+            newExtremes, newChannelVars, samples = next(fileResults)
+            if i == 0:
+                extremes = {key: block.copy() for key, block in newExtremes.items()}
+                channelVars = newChannelVars
+            elif newChannelVars != channelVars:
+                raise Exception(f'The objects or variables found in "{f}" differ from the ones of the first file.')
+            else:
+                for key, block in newExtremes.items(): extremes[key].merge(block)
+
+            samplesByLC[f] = samples
+            fileExtremes[f] = np.concatenate([newExtremes[key].extremeValues for key in extremes])
+            if streaming: __dropNonCriticalSamples(extremes, samplesByLC)
+
+            if pool == None: print('done.')
+            else: print(f'File processed ({i+1}/{n}): "{f}".', flush=True)
+    finally:
+        if pool != None: 
+            pool.terminate()
+            pool.join()
+
+    if not streaming: __dropNonCriticalSamples(extremes, samplesByLC) # only the extremes in the 'LC list'
+    return extremes, channelVars, samplesByLC, fileExtremes
+
+def __genTableExtremes(extremes: dict[tuple, ExtremeBlock], channelVars: dict[tuple, list[str]]) -> pd.DataFrame:
+    """
+    One row per extreme of each variable, with the values of all variables of the channel at that time
+    (and their static values, if extracted)
+    """
+    allVarNames = []
+    for varNames in channelVars.values():
+        allVarNames.extend([varName for varName in varNames if not varName in allVarNames])
+    nVars = len(allVarNames)
+    hasStatics = any(block.static is not None for block in extremes.values())
+
+    rowTitles = []
+    data = []
+    for key, block in extremes.items():
+        varNames = channelVars[key]
+        columns = np.array([allVarNames.index(varName) for varName in varNames])
+        for i, (LC, time) in enumerate(zip(block.LCs, block.times.tolist())):
+            maxMinTag = 'Max' if i < len(varNames) else 'Min'
+            rowTitles.append((*key, maxMinTag, varNames[i % len(varNames)]))
+            row = np.full(2*nVars if hasStatics else nVars, np.nan)
+            row[columns] = block.dynamic[i]
+            if block.static is not None: row[nVars + columns] = block.static[i]
+            data.append([LC, time, *row])
+
+    indexes = pd.MultiIndex.from_tuples(
+        rowTitles, names=['Object', 'Object extra', 'Period', 'Max/Min', 'Variable'])
+    staticColumns = [f'{varName} (static)' for varName in allVarNames] if hasStatics else []
+    return pd.DataFrame(data, index=indexes, columns=['File', 'Sim. time', *allVarNames, *staticColumns])
+
+def __genTablesCriticalLCs(
+        extremes: dict[tuple, ExtremeBlock], 
+        channelVars: dict[tuple, list[str]],
+        samplesByLC: dict[str, dict]
+        ) -> dict[str, pd.DataFrame]:
+    """
+    Samples of the load cases at the extreme times, with the results of all channels, one table per period
+    """
+    periods = list(dict.fromkeys(period for _, _, period in extremes))
+    tables = {}
+    for period in periods:
+        keys = [key for key in extremes if key[2] == period]
+        keys += [(*key, 'Static') for key in keys if extremes[key].static is not None]
+        columnTitles = []
+        for key in keys:
+            suffix = ' (static)' if len(key) > 3 else ''
+            columnTitles.extend([(key[0], key[1], varName + suffix) for varName in channelVars[key[:3]]])
+        indexesTitles = []
+        data = []
+        for LC, samplesByPeriod in samplesByLC.items():
+            if not period in samplesByPeriod: continue
+            samples = samplesByPeriod[period]
+            indexesTitles.extend([(LC, time) for time in samples['Time'].tolist()])
+            data.append(np.hstack([samples[key] for key in keys]))
+        indexes = pd.MultiIndex.from_tuples(indexesTitles, names=['File', 'Sim. time'])
+        columns = pd.MultiIndex.from_tuples(columnTitles, names=['Object', 'Object extra', 'Variable'])
+        name = 'LC list' if len(periods) == 1 else f'LC list ({period})'[:31]
+        tables[name] = pd.DataFrame(np.vstack(data), index=indexes, columns=columns)
+    return tables
+
+def __genTableFileExtremes(channelVars: dict[tuple, list[str]], fileExtremes: dict[str, np.ndarray]) -> pd.DataFrame:
+    """Max. and min. of each variable in each file (e.g. for the extreme statistics of several seeds)"""
+    columnTitles = [
+        (*key, maxMinTag, varName) for key, varNames in channelVars.items() 
+        for maxMinTag in ['Max', 'Min'] for varName in varNames]
+    columns = pd.MultiIndex.from_tuples(
+        columnTitles, names=['Object', 'Object extra', 'Period', 'Max/Min', 'Variable'])
+    index = pd.Index(list(fileExtremes.keys()), name='File')
+    return pd.DataFrame(np.vstack(list(fileExtremes.values())), index=index, columns=columns)
+
+
+def ExtremeResultsFromSims(
+        sim_files_folder: str,
+        specs: VariableSpec|list[VariableSpec],
+        out_file: str|None = None,
+        streaming: bool = True,
+        n_workers: int = 1,
+        store: ResultStore|str|None = None
+        ) -> dict[str, pd.DataFrame]:
+    """
+    Extract the extreme (max. and min.) results of the objects defined by variable specifications 
+    (see `VariableSpec`) from OrcaFlex simulation files. Each file is loaded once for all specs
+    * sim_files_folder: path to the .sim files
+    * specs: variable specifications (object type and/or name pattern, variables, object extra and period)
+    * out_file: Excel file (.xlsx) to write the tables; not written if `None`
+    * streaming: if `True`, only the running extremes and the samples at the extreme times 
+    (rows of the 'LC list') are kept, and the time histories of each file are released after 
+    processing it. If `False`, all samples are kept up to the end (same output)
+    * n_workers: number of processes loading and processing the .sim files at the same time (on 
+    Windows, protect the calling script by `if __name__ == '__main__':`)
+    * store: result store (`ResultStore` or its folder) to which the time histories are written 
+    (requires `pyarrow`); the tables are then built from the store, as a view of it
+    \nReturns the tables (sheet name as key): 'Extremes', with the load case, the time and the values 
+    of all variables of the object at the time of each extreme (and the static values, for the specs 
+    with `statics`), and 'LC list', with the results 
+    of all objects at the extreme times (one table per period, if more than one), and 'Extremes 
+    by file', with the max. and min. of each variable in each file (see `ExtremeStatistics`)
+
+    Obs.: Assumes all .sim files have the same objects
+    """
+    if isinstance(specs, VariableSpec): specs = [specs]
+    files = [f for f in os.listdir(sim_files_folder) if f[-4:] == '.sim']
+    if len(files) == 0:
+        raise Exception(f'None .sim file was found in "{sim_files_folder}".')
+    store = resultStoreFrom(store)
+
+    extremes, channelVars, samplesByLC, fileExtremes = extractFromSims(
+        files, sim_files_folder, specs, streaming or store != None, n_workers, None if store == None else store.folder)
+    if store != None:
+        print('Reading the results from the store...', flush=True)
+        extremes, channelVars, samplesByLC, fileExtremes = extractFromStore(
+            files, store.folder, extremes, channelVars, streaming, n_workers)
+
+    tables = {'Extremes': __genTableExtremes(extremes, channelVars)}
+    tables.update(__genTablesCriticalLCs(extremes, channelVars, samplesByLC))
+    tables['Extremes by file'] = __genTableFileExtremes(channelVars, fileExtremes)
+
+    if out_file != None:
+        ext = os.path.splitext(out_file)[-1]
+        if not ext in ['.xlsx', '.xls']:
+            raise Exception(f'Extension "{ext}" not supported.')
+        print('Saving file...', end=' ', flush=True)
+        with pd.ExcelWriter(out_file) as writer:
+            for name, df in tables.items(): df.to_excel(writer, sheet_name=name)
+        print('done.')
+    return tables
@@ -0,0 +1,210 @@
+"""
+Statistical extreme estimation (most probable maximum and quantiles) from the maxima of several
+seeds (Gumbel or Weibull fit) or from the peaks over a threshold (generalized Pareto fit), fitting
+all the results (e.g. variables and objects) at once. The samples are along the last axis and
+may be padded with NaN (e.g. groups with different numbers of seeds)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+extremeDistributions = ['gumbel', 'weibull']
+
+
+def __newton(func, x0: np.ndarray, nIter: int = 100, tol: float = 1e-10) -> np.ndarray:
+    """Solves func(x) = 0 (func returns the value and the derivative), element-wise"""
+    x = np.array(x0, dtype=float)
+    for _ in range(nIter):
+        g, dg = func(x)
+        step = g / dg
+        x = np.where(np.isfinite(step), x - step, x)
+        if np.all(~np.isfinite(step) | (np.abs(step) <= tol * np.abs(x))): break
+    return x
+
+def FitGumbel(maxima: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Maximum likelihood fit of the Gumbel distribution (of maxima) to the samples (last axis, NaN ignored)
+    \nReturns the location and the scale
+    """
+    x = np.asarray(maxima, dtype=float)
+    xMin = np.nanmin(x, axis=-1, keepdims=True)
+    xMean = np.nanmean(x, axis=-1)
+    x = x - xMin # shifted, so the weights exp(-x/scale) do not overflow
+
+    def equation(scale):
+        w = np.exp(-x / scale[..., None])
+        sw = np.nansum(w, axis=-1)
+        m1 = np.nansum(w * x, axis=-1) / sw
+        m2 = np.nansum(w * x**2, axis=-1) / sw
+        return scale - (xMean - xMin[..., 0]) + m1, 1 + (m2 - m1**2) / scale**2
+
+    scale0 = np.sqrt(6) / np.pi * np.nanstd(x, axis=-1) # method of moments
+    scale = __newton(equation, np.maximum(scale0, 1e-12))
+    loc = xMin[..., 0] - scale * np.log(np.nanmean(np.exp(-x / scale[..., None]), axis=-1))
+    return loc, scale
+
+def FitWeibull(values: np.ndarray, loc: float|np.ndarray = 0.) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Maximum likelihood fit of the Weibull distribution, with the defined location, to the samples
+    (last axis, NaN ignored), which must be larger than the location
+    \nReturns the shape and the scale
+    """
+    x = np.asarray(values, dtype=float) - np.asarray(loc, dtype=float)[..., None]
+    if np.any(x <= 0):
+        raise Exception('The samples of the Weibull fit must be larger than the location.')
+    xMax = np.nanmax(x, axis=-1, keepdims=True)
+    lnz = np.log(x / xMax) # scaled, so x^shape does not overflow (the shape does not depend on the scale)
+    meanLn = np.nanmean(lnz, axis=-1)
+
+    def equation(shape):
+        w = np.exp(shape[..., None] * lnz)
+        sw = np.nansum(w, axis=-1)
+        m1 = np.nansum(w * lnz, axis=-1) / sw
+        m2 = np.nansum(w * lnz**2, axis=-1) / sw
+        return m1 - 1 / shape - meanLn, m2 - m1**2 + 1 / shape**2
+
+    shape0 = np.pi / (np.sqrt(6) * np.nanstd(lnz, axis=-1)) # method of moments of ln(x)
+    shape = __newton(equation, np.maximum(shape0, 1e-3))
+    scale = xMax[..., 0] * np.nanmean(np.exp(shape[..., None] * lnz), axis=-1)**(1 / shape)
+    return shape, scale
+
+def FitGPD(excesses: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fit of the generalized Pareto distribution to the excesses over the threshold (last axis,
+    NaN ignored), by the probability-weighted moments (Hosking & Wallis, 1987)
+    \nReturns the shape (`c` of `scipy.stats.genpareto`) and the scale
+    """
+    y = np.sort(np.asarray(excesses, dtype=float), axis=-1) # NaN at the end
+    n = np.sum(~np.isnan(y), axis=-1)
+    rank = np.arange(1, y.shape[-1] + 1)
+    factor = (n[..., None] - rank) / (n[..., None] - 1)
+    a0 = np.nanmean(y, axis=-1)
+    a1 = np.nansum(factor * y, axis=-1) / n
+    shape = 2 - a0 / (a0 - 2 * a1)
+    scale = 2 * a0 * a1 / (a0 - 2 * a1)
+    return shape, scale
+
+def ClusterPeaks(values: np.ndarray, threshold: float) -> np.ndarray:
+    """Largest value of each cluster of consecutive samples above the threshold (declustered peaks)"""
+    values = np.asarray(values, dtype=float)
+    above = values > threshold
+    if not above.any(): return np.array([])
+    starts = np.flatnonzero(np.diff(above.astype(np.int8), prepend=0) == 1)
+    # the samples between the clusters are below the threshold, so they do not change the maxima
+    return np.maximum.reduceat(values, starts)
+
+def __padded(samples: list[np.ndarray]) -> np.ndarray:
+    """Samples of different sizes as rows of an array padded with NaN"""
+    n = max([len(s) for s in samples] + [1])
+    padded = np.full((len(samples), n), np.nan)
+    for i, s in enumerate(samples): padded[i, :len(s)] = s
+    return padded
+
+def __isMinimum(columns: pd.Index) -> np.ndarray:
+    """If each column is a minimum, by the 'Max/Min' level of the columns (e.g. table 'Extremes by file')"""
+    if 'Max/Min' in (columns.names or []):
+        return np.asarray(columns.get_level_values('Max/Min') == 'Min')
+    return np.zeros(len(columns), dtype=bool)
+
+def ExtremeStatistics(
+        maxima: pd.DataFrame,
+        distribution: str = 'gumbel',
+        quantiles: list[float] = [0.9],
+        groups: None|pd.Series|list = None,
+        weibull_loc: float = 0.
+        ) -> pd.DataFrame:
+    """
+    Most probable maximum (MPM, mode of the fitted distribution) and quantiles of the maxima of
+    several seeds (e.g. 3-hour simulations of the same sea state), for all columns at once
+    * maxima: maximum of each seed (rows) of each result (columns), e.g. the 'Extremes by file'
+    table of `ExtremeResultsFromSims`; the columns of minima (level 'Max/Min' equal to 'Min')
+    are fitted with the opposite sign, so their MPM and quantiles are minima
+    * distribution: 'gumbel' or 'weibull' (2-parameter, with the location `weibull_loc`)
+    * quantiles: probabilities of non-exceedance of the maximum (e.g. 0.9 for P90)
+    * groups: group (e.g. sea state) of each row, fitted separately; all rows in one group if `None`
+    \nReturns a table with the number of seeds, the observed extreme, the parameters of the
+    distribution, the MPM and the quantiles ('P90', ...) of each column (and group)
+    """
+    if not distribution in extremeDistributions:
+        raise Exception(f'Distribution "{distribution}" not supported. Options: {extremeDistributions}.')
+    signs = np.where(__isMinimum(maxima.columns), -1., 1.)
+    values = maxima.to_numpy(dtype=float) * signs
+
+    if groups is None:
+        groupLabels = [None]
+        samples = values.T[None] # (groups, columns, seeds)
+    else:
+        groups = np.asarray(groups)
+        groupLabels = list(dict.fromkeys(groups.tolist()))
+        blocks = [values[groups == label].T for label in groupLabels]
+        nSeeds = max(block.shape[1] for block in blocks)
+        samples = np.stack([np.pad(block, ((0, 0), (0, nSeeds - block.shape[1])), constant_values=np.nan)
+                            for block in blocks])
+
+    if distribution == 'gumbel':
+        loc, scale = FitGumbel(samples)
+        params = {'Location': loc, 'Scale': scale}
+        mpm = loc
+        quantileValues = [stats.gumbel_r.ppf(p, loc, scale) for p in quantiles]
+    else:
+        shape, scale = FitWeibull(samples, weibull_loc)
+        params = {'Shape': shape, 'Scale': scale}
+        mode = scale * np.where(shape > 1, (np.abs(shape - 1) / shape)**(1 / shape), 0.)
+        mpm = weibull_loc + mode
+        quantileValues = [stats.weibull_min.ppf(p, shape, weibull_loc, scale) for p in quantiles]
+
+    table = {
+        'Seeds': np.sum(~np.isnan(samples), axis=-1),
+        'Observed': np.nanmax(samples, axis=-1) * signs}
+    for name, value in params.items():
+        table[name] = value * signs if name == 'Location' else value
+    table['MPM'] = mpm * signs
+    for p, value in zip(quantiles, quantileValues):
+        table[f'P{100*p:g}'] = value * signs
+
+    if groups is None:
+        index = maxima.columns
+    else:
+        index = pd.MultiIndex.from_tuples(
+            [(label, *(c if type(c) == tuple else (c,))) for label in groupLabels for c in maxima.columns],
+            names=['Group', *maxima.columns.names])
+    return pd.DataFrame({name: np.ravel(value) for name, value in table.items()}, index=index)
+
+def PeaksOverThreshold(
+        histories: np.ndarray,
+        duration: float,
+        target_duration: float|None = None,
+        threshold: None|float|np.ndarray = None,
+        quantiles: list[float] = [0.9]
+        ) -> pd.DataFrame:
+    """
+    Most probable maximum and quantiles of the maximum in the target duration, by the generalized
+    Pareto fit of the peaks of the time histories over the threshold (one fit per row)
+    * histories: time histories (results x samples), e.g. the 'Values' of a `ResultStore`
+    * duration: duration of the time histories
+    * target_duration: duration of the maximum (e.g. 10800 s); the `duration` if `None`
+    * threshold: threshold of each result; the mean plus 1.4 standard deviations if `None`
+    * quantiles: probabilities of non-exceedance of the maximum in the target duration
+    \nReturns a table with the threshold, the number of peaks, the parameters of the
+    distribution, the MPM and the quantiles ('P90', ...) of each result (row)
+    """
+    histories = np.atleast_2d(np.asarray(histories, dtype=float))
+    if threshold is None:
+        threshold = histories.mean(axis=1) + 1.4 * histories.std(axis=1)
+    threshold = np.broadcast_to(np.asarray(threshold, dtype=float), histories.shape[:1])
+    if target_duration == None: target_duration = duration
+
+    peaks = [ClusterPeaks(values, u) for values, u in zip(histories, threshold)]
+    nPeaks = np.array([len(p) for p in peaks])
+    shape, scale = FitGPD(__padded([p - u for p, u in zip(peaks, threshold)]))
+    rate = nPeaks * target_duration / duration # expected number of peaks in the target duration
+
+    # Poisson number of peaks: P(max <= x) = exp(-rate * (1 - F(x)))
+    # MPM as the value exceeded by one peak in the target duration
+    table = {'Threshold': threshold, 'Peaks': nPeaks, 'Shape': shape, 'Scale': scale}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['MPM'] = threshold + stats.genpareto.isf(1 / rate, shape, 0, scale)
+        for p in quantiles:
+            table[f'P{100*p:g}'] = threshold + stats.genpareto.isf(-np.log(p) / rate, shape, 0, scale)
+    return pd.DataFrame(table)
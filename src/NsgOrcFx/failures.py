@@ -0,0 +1,77 @@
+"""
+Classification of the load cases that fail in `ProcMultiThread`
+"""
+
+import re
+from dataclasses import dataclass
+import OrcFxAPI as orc
+
+# failure categories
+failureCategories = ['load', 'timeout', 'unstable', 'transient', 'crash', 'error']
+
+# words or phrases of error messages that indicate a failure that may not happen again (e.g. licence 
+# or file lock), matched as whole words (e.g. 'locked' does not match 'blocked' nor 'deadlocked')
+transientKeywords = [
+    'licence', 'license', 'licences', 'licenses', 'dongle', 'locked', 'lock violation', 
+    'access is denied', 'permission denied', 'being used by another process', 'sharing violation', 
+    'network path', 'network name', 'network error', 'network is unreachable', 'connection reset'
+    ]
+__transientPattern = re.compile(r'\b(' + '|'.join(re.escape(k) for k in transientKeywords) + r')\b')
+
+
+@dataclass
+class FailureRecord:
+    file: str
+    category: str                       # one of `failureCategories`
+    errorType: str|None = None          # name of the exception class
+    message: str = ''
+    simTimeReached: float|None = None   # simulation time when the failure occurred
+    modelState: str|None = None         # name of the OrcaFlex model state
+    attempts: int = 1
+
+    def __str__(self) -> str:
+        s = f'{self.file} ({self.category}'
+        if self.simTimeReached != None: s += f' at t={self.simTimeReached:0.2f}s'
+        s += ')'
+        if self.message: s += f': {self.message}'
+        return s
+
+
+def isTransientError(error: Exception) -> bool:
+    if __transientPattern.search(str(error).lower()): return True
+    return isinstance(error, (PermissionError, TimeoutError, ConnectionError))
+
+def classifyFailure(
+        file: str,
+        error: Exception|None,
+        model: orc.Model|None,
+        timedOut: bool = False,
+        simTimeReached: float|None = None,
+        loading: bool = False
+        ) -> FailureRecord:
+    """
+    Returns the failure record of a load case
+    * error: exception raised, if any
+    * model: model of the load case, used to get its state
+    * timedOut: if the simulation was cancelled due to the timeout
+    * simTimeReached: latest simulation time reported by the progress handler
+    * loading: if the error occurred when loading the file
+    """
+    modelState = None
+    if model != None:
+        try: modelState = model.state.name
+        except Exception: pass
+
+    if loading: category = 'load'
+    elif timedOut: category = 'timeout'
+    elif modelState == 'SimulationStoppedUnstable': category = 'unstable'
+    elif error != None and isTransientError(error): category = 'transient'
+    else: category = 'error'
+
+    if error != None:
+        errorType, message = type(error).__name__, str(error)
+    else:
+        errorType, message = None, f'simulation not completed (model state: {modelState})'
+
+    return FailureRecord(file, category, errorType, message, simTimeReached, modelState)
+
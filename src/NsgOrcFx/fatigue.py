@@ -1,9 +1,11 @@
 from typing import Optional
 import os
+import numpy as np
 import pandas as pd
 import OrcFxAPI as _ofx
 from .sncurves import *
 from .objauxfuncs import *
+from .modelcache import LoadModelCached, sharedModelCache
 from . import params
 
 class FatigueAnalysis(_ofx.FatigueAnalysis):
@@ -14,7 +16,7 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         object.__setattr__(self, 'data', params._DataFatigueAnalysisObject(self))
 
     def __selectSNCurveByName(self, name: str, environment: str) -> SNCurve:
-        """Name (e.g, 'F1') and environment ('air' or 'seawater')"""
+        """Name (e.g, 'F1') and environment ('air', 'seawater' or 'free corrosion')"""
         return selectSNCurveByName(name, environment)
 
     def addLoadCase(
@@ -35,7 +37,7 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         
         basePath = os.getcwd()
         self.LoadCaseFileName[-1] = os.path.join(basePath, simFile)
-        model = _ofx.Model(simFile)
+        model = LoadModelCached(simFile)
 
         if lineName == None:
             lines = getLinesToList(model)
@@ -47,6 +49,8 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         self.PeriodTo[-1] = simPeriod[1]
 
         self.LoadCaseExposureTime[-1] = exposureTime
+        # the model of the first load case is kept for `addAnalysisData`, which releases it
+        if self.LoadCaseCount > 1: sharedModelCache.release(simFile)
 
     def addAnalysisData(
             self, 
@@ -68,7 +72,7 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         # analysisIndex = self.ArclengthIntervalsCount - 1
         lineName = self.data.LoadCaseLineName[0]
         modelFile = self.data.LoadCaseFileName[0]
-        model = _ofx.Model(modelFile)
+        model = LoadModelCached(modelFile)
         line = model[lineName]
         if arcLengthInterval[1] == 0: arcLengthInterval[1] = line.CumulativeLength[-1]
         self.FromArclength[-1] = arcLengthInterval[0]
@@ -78,6 +82,7 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         self.ThicknessCorrectionFactor[-1] = thicknessFactor
         snCurvaName = self.data.SNcurveName[SnCurveIndex]
         self.AnalysisDataSNcurve[-1] = snCurvaName
+        sharedModelCache.release(modelFile) # not kept in memory (e.g. during `Calculate`)
 
 
 
@@ -96,7 +101,7 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         Set the parameters the S-N curve selected based on its name (e.g., 'F3')
         and environment ('air' or 'seawater')
         * name: S-N curve name (e.g., 'F3')
-        * environment: S-N curve environment ('air' or 'seawater')
+        * environment: S-N curve environment ('air', 'seawater' with cathodic protection, or 'free corrosion')
         \nReturns the index of the new S-N curve created
         """
         SNCurve = self.__selectSNCurveByName(name, environment)
@@ -172,3 +177,61 @@ class FatigueAnalysis(_ofx.FatigueAnalysis):
         cols = ['Arc length (m)', 'Damage', 'Life (years)']
         return pd.DataFrame(zdlList, columns=cols)
 
+    def getSpectralDamageAsDF(
+            self, 
+            SNCurve: SNCurve, 
+            method: str = 'dirlik', 
+            nThetas: int = 8
+            ) -> pd.DataFrame:
+        """
+        Fatigue damage screening by the spectral method (see `SpectralDamage`), from the stress PSD 
+        of each load case, without the calculation of the fatigue analysis. Uses the load cases 
+        (simulation file, line, period and exposure time) and the first analysis data (arc length 
+        interval, radial position, SCF and thickness factor). Assumes stresses in kPa
+        * SNCurve: S-N curve (e.g. `selectSNCurveByName('F3', 'seawater')`)
+        * method: 'narrow-band', 'dirlik' or 'tovo-benasciutti'
+        * nThetas: number of cross section points (polar coords.)
+        \nReturns a DataFrame as `getArcLengthDamageLifeListAsDF`
+        """
+        from .rainflow import StressTimeHistories
+        from .spectralfatigue import StressPSD, SpectralDamage, SpectralFatigueTable
+        fromArcLength, toArcLength = self.FromArclength[0], self.ToArclength[0]
+        radialPos = self.RadialPosition[0].lower()
+        factor = self.SCF[0] * self.ThicknessCorrectionFactor[0]
+
+        if self.LoadCaseCount == 0:
+            raise Exception('No load case defined in the fatigue analysis for the spectral damage.')
+
+        damage = 0.
+        for i in range(self.LoadCaseCount):
+            model = LoadModelCached(self.LoadCaseFileName[i])
+            line = model[self.data.LoadCaseLineName[i]]
+            endArcLength = line.CumulativeLength[-1] if toArcLength == 0 else toArcLength
+            caseArcLengths = [z for z in line.NodeArclengths if fromArcLength <= z <= endArcLength]
+            # the damage of each node is summed over the load cases
+            if i == 0:
+                arcLengths = caseArcLengths
+            elif len(caseArcLengths) != len(arcLengths) or not np.allclose(caseArcLengths, arcLengths):
+                raise Exception(
+                    f'The arc lengths of the nodes of load case {i+1} ("{self.LoadCaseFileName[i]}", ' + \
+                    f'line "{self.data.LoadCaseLineName[i]}") differ from the ones of the first load case.')
+            period = (self.PeriodFrom[i], self.PeriodTo[i])
+            _, _, stress = StressTimeHistories(line, period, arcLengths, nThetas, radialPos)
+            times = model.SampleTimes(_ofx.SpecifiedPeriod(*period))
+            freqs, psd = StressPSD(stress / 1e3, times[1] - times[0]) # MPa
+            exposureTime = self.LoadCaseExposureTime[i] * 3600 # hours to seconds
+            damage = damage + SpectralDamage(freqs, psd, exposureTime, SNCurve, factor, method)[0]
+            sharedModelCache.release(self.LoadCaseFileName[i])
+
+        return SpectralFatigueTable(arcLengths, damage, self.totalExposureTime() * 3600)
+
+    def saveToStore(self, store, name: str = 'FatigueDamage', label: str|None = None) -> None:
+        """
+        Appends the arc length, damage and life of each node (see `getArcLengthDamageLifeListAsDF`) 
+        to a table of the result store (`ResultStore` or its folder). Requires `pyarrow`.
+        * label: identification of the analysis (e.g. line name), included as the 'Analysis' column
+        """
+        from .resultstore import resultStoreFrom
+        df = self.getArcLengthDamageLifeListAsDF()
+        df.insert(0, 'Analysis', label)
+        resultStoreFrom(store).addTable(name, df)
@@ -1,7 +1,13 @@
 import OrcFxAPI as __ofx
 from .auxfuncs import *
+from .wavesearch import WaveSearchKey, waveSearchCacheFrom, WaveSearchMemoryCache, WaveComponentTable, LargestRiseAndFallBatch
+from .variations import baseModelFileName, variationExtension, GetLoadCaseVariation, WriteVariationFile
 import pandas as pd
 import math
+import json
+import hashlib
+import multiprocessing
+from typing import Iterable, Iterator
 
 
 def __setEnvironment(
@@ -16,7 +22,9 @@ def __setEnvironment(
         reducedIrregDuration: float = None,
         largestFallOrRise: str = 'rise',
         waveTrainIndex: int = 0,
-        extremeWavePosition: list[float] = [0.,0.]        
+        extremeWavePosition: list[float] = [0.,0.],
+        waveSearchCache: str | None = None,
+        waveSearchEngine: str = 'spreadsheet'
         ):
     """
     `waveTrainIndex` was keept for legacy compatibility
@@ -46,10 +54,256 @@ def __setEnvironment(
         else:
             SetReducedSimDuration(
                 model, reducedIrregDuration, stormDuration, 
-                largestFallOrRise, extremeWavePosition)
+                largestFallOrRise, extremeWavePosition, cache=waveSearchCache, engine=waveSearchEngine)
 
 
 
+__caseListFile = '_CaseList.xlsx' # file to save the cases list
+
+def __caseName(waveType: str, index: int, nDigits: int, height: float, period: float, direction: float) -> str:
+    if isRegularWave(waveType):
+        return f'LC{str(index).zfill(nDigits)}_H={height:0.2f}m_T={period:00.2f}s_dir={direction}'
+    else:
+        return f'LC{str(index).zfill(nDigits)}_Hs={height:0.2f}m_Tp={period:00.2f}s_dir={direction}'
+
+
+def __caseMatrix(
+        waveType: str, 
+        waveDirList: list[float],
+        waveHeightList: list[float],
+        wavePeriodList: list[float]
+        ) -> list[tuple[str, dict[str, float]]]:
+    """Returns the name and parameters of each load case"""
+    nCases = len(waveHeightList) * len(waveDirList) * len(wavePeriodList)
+    nDigits = math.floor(math.log10(nCases)) + 1
+    cases = []
+    cont = 0
+    for height in waveHeightList:
+        for period in wavePeriodList:
+            for direction in waveDirList:
+                cont += 1
+                caseName = __caseName(waveType, cont, nDigits, height, period, direction)
+                params = {'Height(m)': height, 'Period(s)': period, 'Direction(deg)': direction}
+                cases.append((caseName, params))
+    return cases
+
+def __iterCases(
+        model: __ofx.Model,
+        waveType: str, 
+        cases: list[tuple[str, dict[str, float]]],
+        settings: dict
+        ) -> Iterator[tuple[str, dict[str, float], __ofx.Model]]:
+    """`settings`: optional inputs of `__setEnvironment`"""
+    env = model.environment
+    env.WaveType = waveType
+    if env.NumberOfWaveTrains > 1: env.SelectedWaveTrainIndex = settings['waveTrainIndex']
+
+    for caseName, params in cases:
+        __setEnvironment(
+            model, params['Direction(deg)'], waveType, params['Height(m)'], params['Period(s)'], **settings)
+        yield caseName, params, model
+
+def __caseFileExtension(compact: bool) -> str:
+    if compact: return variationExtension
+    return '.dat'
+
+def __saveCases(
+        loadCases: Iterable[tuple[str, dict[str, float], __ofx.Model]], 
+        outFolder: str,
+        compact: bool = False
+        ) -> list[list]:
+    """
+    Saves the data file of each load case (or, if `compact`, its variation 
+    from the base model) and returns the rows of the list of cases
+    """
+    ext = __caseFileExtension(compact)
+    CaseList = []
+    for caseName, params, model in loadCases:
+        fullPath = os.path.join(outFolder, caseName+ext)
+        if compact:
+            WriteVariationFile(fullPath, baseModelFileName, GetLoadCaseVariation(model))
+        else:
+            model.SaveData(fullPath)
+        CaseList.append([caseName+ext, params['Height(m)'], params['Period(s)'], params['Direction(deg)']])
+    return CaseList
+
+def __writeCaseList(CaseList: list[list], outFolder: str):
+    """`CaseList`: rows with file, height, period, direction and, optionally, hash of each case"""
+    columns = ['File','Height(m)','Period(s)','Direction(deg)','Hash']
+    df = pd.DataFrame(CaseList, columns=columns[:len(CaseList[0])])
+    fullPath = os.path.join(outFolder, __caseListFile)
+    df.to_excel(fullPath)
+
+def __readCaseHashes(outFolder: str) -> dict[str, str]:
+    """Returns the hash of each file recorded in the list of cases, if any"""
+    fullPath = os.path.join(outFolder, __caseListFile)
+    if not os.path.isfile(fullPath): return {}
+    df = pd.read_excel(fullPath)
+    if not 'Hash' in df.columns: return {}
+    return {file: caseHash for file, caseHash in zip(df['File'], df['Hash']) if type(caseHash) == str}
+
+def __copyModel(model: __ofx.Model) -> __ofx.Model:
+    copy = __ofx.Model()
+    copy.LoadDataMem(model.SaveDataMem())
+    return copy
+
+def __baseModelHash(model: __ofx.Model, waveType: str, settings: dict) -> str:
+    """
+    Hash of the model text data, excluding the comment lines (program version, date, user, etc.), with 
+    the data set by the cases (wave type, height, period, direction, time origin, stage durations, etc.) 
+    set to fixed values, so it does not depend on the case previously set in the model
+    """
+    model = __copyModel(model)
+    normalized = [('', {'Height(m)': 1., 'Period(s)': 10., 'Direction(deg)': 0.})]
+    for _ in __iterCases(model, waveType, normalized, {**settings, 'reducedIrregDuration': None}): pass
+    if settings['reducedIrregDuration'] != None and not isRegularWave(waveType):
+        SetWaveSearchStart(model, settings['extremeWavePosition'])
+    data = bytes(model.SaveDataMem(__ofx.DataFileType.Text))
+    lines = [line for line in data.splitlines() if not line.lstrip().startswith(b'#')]
+    return hashlib.sha256(b'\n'.join(lines)).hexdigest()
+
+def __caseHash(baseHash: str, waveType: str, params: dict[str, float], settings: dict, ext: str) -> str:
+    # the wave search cache does not change the load case (the engine does, as the times may differ slightly)
+    settings = {name: value for name, value in settings.items() if name != 'waveSearchCache'}
+    if settings.get('waveSearchEngine') == 'spreadsheet': settings.pop('waveSearchEngine') # same hash as before the option
+    content = json.dumps([baseHash, waveType, params, settings, ext], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def __pendingCases(
+        cases: list[tuple[str, dict[str, float]]],
+        CaseList: list[list],
+        outFolder: str
+        ) -> list[tuple[str, dict[str, float]]]:
+    """
+    Returns the cases to be generated, comparing their hashes (last column of `CaseList`) to the
+    ones of the existing list of cases. The unchanged ones are kept, even if their file was deleted
+    (e.g. by `ProcMultiThread` after a successful simulation), and the ones whose file name changed
+    (e.g., LC number) are renamed
+    """
+    previous = __readCaseHashes(outFolder)
+    exists = lambda file: os.path.isfile(os.path.join(outFolder, file))
+    byHash = {caseHash: file for file, caseHash in previous.items() if exists(file)}
+    keep = set([row[0] for row in CaseList if previous.get(row[0]) == row[-1]])
+    nDeleted = len([file for file in keep if not exists(file)])
+
+    pending = []
+    renames = {}
+    for (caseName, params), row in zip(cases, CaseList):
+        file, caseHash = row[0], row[-1]
+        if file in keep: continue
+        source = byHash.get(caseHash)
+        if source != None and not source in keep and not source in renames:
+            renames[source] = file
+        else:
+            pending.append((caseName, params))
+
+    # in two steps, as a new name may be the old name of another case
+    for source in renames:
+        os.replace(os.path.join(outFolder, source), os.path.join(outFolder, source + '.renaming'))
+    for source, target in renames.items():
+        os.replace(os.path.join(outFolder, source + '.renaming'), os.path.join(outFolder, target))
+
+    print(f'Load cases: {len(pending)} to be generated, {len(keep)} unchanged ({nDeleted} without data file, '
+          f'e.g. already simulated), {len(renames)} renamed.', flush=True)
+    return pending
+
+def __searchWavesAtOnce(
+        model: __ofx.Model,
+        waveType: str, 
+        cases: list[tuple[str, dict[str, float]]],
+        settings: dict
+        ) -> dict:
+    """
+    With the reduced duration of irregular waves and the 'numpy' engine, searches the largest rise
+    and fall of all the cases at once (`LargestRiseAndFallBatch`, each sea state searched only once)
+    and returns the settings with a cache of the results (the `waveSearchCache`, if any), from which
+    each case takes its wave search. A copy of the model is used, so the input model is not changed
+    """
+    if settings['reducedIrregDuration'] == None or settings['waveSearchEngine'] != 'numpy' or \
+        isRegularWave(waveType) or len(cases) == 0: return settings
+    cache = waveSearchCacheFrom(settings['waveSearchCache'])
+    if cache == None: cache = WaveSearchMemoryCache()
+
+    copy = __copyModel(model)
+    env = copy.environment
+    # same model state as at the search of `SetReducedSimDuration` (same key and wave components)
+    searchSettings = {**settings, 'reducedIrregDuration': None}
+    searches = {} # key: (wave components, wave time origin)
+    for _ in __iterCases(copy, waveType, cases, searchSettings):
+        SetWaveSearchStart(copy, settings['extremeWavePosition'])
+        key = WaveSearchKey(copy, settings['stormDuration'], 'numpy')
+        if not key in searches and cache.get(key) == None:
+            searches[key] = WaveComponentTable(copy), env.WaveTimeOrigin
+
+    if len(searches) > 0:
+        print(f'Searching the largest rise and fall of {len(searches)} sea states at once...', flush=True)
+        results = LargestRiseAndFallBatch(
+            [table for table, _ in searches.values()], 0., settings['stormDuration'], settings['extremeWavePosition'])
+        for (key, (_, t0)), result in zip(searches.items(), results):
+            cache.put(key, float(result[0]-t0), float(result[2]-t0))
+    return {**settings, 'waveSearchCache': cache}
+
+def __genLoadCasesShard(
+        modelData: bytes,
+        waveType: str, 
+        cases: list[tuple[str, dict[str, float]]],
+        outFolder: str,
+        settings: dict,
+        compact: bool = False
+        ) -> list[list]:
+    """
+    Target of each process of the parallel generation: loads its own copy of the 
+    base model and saves its part of the load cases, returning their rows of the list of cases
+    """
+    model = __ofx.Model()
+    model.LoadDataMem(modelData)
+    return __saveCases(__iterCases(model, waveType, cases, settings), outFolder, compact)
+
+
+def IterLoadCases(
+        model: __ofx.Model,
+        waveType: str, 
+        waveDirList: list[float],
+        waveHeightList: list[float],
+        wavePeriodList: list[float],
+        nTimesPeriodStage1: float = 5,
+        stormDuration: float = 10800,
+        calcGamma: bool = True,
+        reducedIrregDuration: float = None,
+        largestFallOrRise: str = 'rise',
+        waveTrainIndex: int = 0,
+        extremeWavePosition: list[float] = [0.,0.],
+        waveSearchCache: str | None = None,
+        waveSearchEngine: str = 'spreadsheet'
+        ) -> Iterator[tuple[str, dict[str, float], __ofx.Model]]:
+    """
+    Generates the load cases on demand, without saving files. Yields, for each case, a tuple 
+    (case name, parameters, model), where the parameters are a dictionary with 'Height(m)', 
+    'Period(s)' and 'Direction(deg)' and the model is the input model set for the load case. 
+    The same model is changed for each case, so it should be used (e.g. saved or simulated) 
+    before getting the next one. The load cases may be run directly by `ProcLoadCases` 
+    or saved by `SaveLoadCases`. The inputs are the same of `GenLoadCases`
+    """
+    cases = __caseMatrix(waveType, waveDirList, waveHeightList, wavePeriodList)
+    settings = dict(
+        nTimesPeriodStage1=nTimesPeriodStage1, stormDuration=stormDuration, calcGamma=calcGamma, 
+        reducedIrregDuration=reducedIrregDuration, largestFallOrRise=largestFallOrRise, 
+        waveTrainIndex=waveTrainIndex, extremeWavePosition=extremeWavePosition, 
+        waveSearchCache=waveSearchCache, waveSearchEngine=waveSearchEngine)
+    return __iterCases(model, waveType, cases, settings)
+
+
+def SaveLoadCases(
+        loadCases: Iterable[tuple[str, dict[str, float], __ofx.Model]], 
+        outFolder: str
+        ) -> None:
+    """
+    Saves the data file (.dat) of each load case of the iterable (see `IterLoadCases`)
+    and the list of cases (_CaseList.xlsx) at the specified folder
+    """
+    __writeCaseList(__saveCases(loadCases, outFolder), outFolder)
+
+
 def GenLoadCases(
         model: __ofx.Model,
         waveType: str, 
@@ -63,11 +317,17 @@ def GenLoadCases(
         reducedIrregDuration: float = None,
         largestFallOrRise: str = 'rise',
         waveTrainIndex: int = 0,
-        extremeWavePosition: list[float] = [0.,0.]
+        extremeWavePosition: list[float] = [0.,0.],
+        nWorkers: int = 1,
+        incremental: bool = False,
+        compact: bool = False,
+        waveSearchCache: str | None = None,
+        waveSearchEngine: str = 'spreadsheet'
         ) -> None:
     """
     Generates load cases from the current model for the list of wave direction, 
-    height and period provided and saves the files at the specified folder
+    height and period provided and saves the files at the specified folder. 
+    The cases are set in a copy of the model, so the input model is not changed
     
     * waveType: 'regular' (e.g., Dean stream) or 'JONSWAP'
     * waveDirList: list of wave direction
@@ -81,43 +341,62 @@ def GenLoadCases(
     * largestFallOrRise: if `reducedIrregDuration != None`, if the extreme event is searched based on the largest 'fall' or 'rise'
     * waveTrainIndex: keept for legacy compatibility. This input is ignored. The "Wave time origin" for all wave trains are changed when `reducedIrregDuration = True`.
     * extremeWavePosition: if `reducedIrregDuration != None`, position to search for the largest 'rise' or 'fall'
+    * nWorkers: number of processes generating the load cases at the same time, each one with a copy 
+    of the model and a part of the cases (useful with `reducedIrregDuration`, due to the wave search). 
+    On Windows, the calling script must be protected by `if __name__ == '__main__':`
+    * incremental: if `True`, only the new or changed load cases are written (if `False`, the default, all of them). 
+    Each case is identified by a hash of the model (comment lines of the text data and the data set by the cases, 
+    e.g. wave height and stage durations, excluded), the wave type, the case parameters and the other 
+    inputs above, recorded in the 'Hash' column of the _CaseList.xlsx. A case with the same hash recorded in the list 
+    is kept, even if its file was deleted after the simulation (`del_success_dat` of `ProcMultiThread`), or renamed, 
+    if its LC number changed (e.g. after adding a wave height). To generate a case again, remove its row from the list. 
+    Files of cases no longer in the list are not deleted
+    * compact: if `True`, instead of a full copy of the model for each case, the model is saved once 
+    ('_BaseModel.dat') and each case is a small variation file ('.var.yml') with the environment and 
+    stage data set for the case. The variation files are run by `ProcMultiThread` (base model 
+    loaded once per worker and the variation applied in memory) or loaded by `LoadVariationFile`
+    * waveSearchCache: if `reducedIrregDuration != None`, path of the file of the wave search cache (see `WaveSearchCache`). 
+    The result of a wave search already done (e.g. same sea state in another direction or in a previous run) 
+    is taken from the cache. The file may be shared by the workers (`nWorkers`) and by other projects
+    * waveSearchEngine: if `reducedIrregDuration != None`, 'spreadsheet' (OrcaFlex wave search) or 'numpy' 
+    (elevation computed in memory from the wave components, much faster for large matrices; see `GetLargestRiseAndFall`). 
+    With 'numpy', the sea states of all the cases to be generated are searched at once, before the cases are written
     """
-    __caseListFile ='_CaseList.xlsx' # file to save the cases list
-    env = model.environment
-    env.WaveType = waveType
-    if env.NumberOfWaveTrains > 1: env.SelectedWaveTrainIndex = waveTrainIndex
-
-    nCases = len(waveHeightList) * len(waveDirList) * len(wavePeriodList)
-    nDigits = math.floor(math.log10(nCases)) + 1
-    def __fi(n: int, digits: int) -> float:
-        s = str(n)
-        while len(s) < digits:
-            s = '0'+s
-        return s
+    cases = __caseMatrix(waveType, waveDirList, waveHeightList, wavePeriodList)
+    settings = dict(
+        nTimesPeriodStage1=nTimesPeriodStage1, stormDuration=stormDuration, calcGamma=calcGamma, 
+        reducedIrregDuration=reducedIrregDuration, largestFallOrRise=largestFallOrRise, 
+        waveTrainIndex=waveTrainIndex, extremeWavePosition=extremeWavePosition, 
+        waveSearchCache=waveSearchCache, waveSearchEngine=waveSearchEngine)
 
+    ext = __caseFileExtension(compact)
     CaseList = []
-    cont=0
+    if incremental:
+        baseHash = __baseModelHash(model, waveType, settings)
+        for caseName, params in cases:
+            caseHash = __caseHash(baseHash, waveType, params, settings, ext)
+            CaseList.append([caseName+ext, params['Height(m)'], params['Period(s)'], params['Direction(deg)'], caseHash])
+        pending = __pendingCases(cases, CaseList, outFolder)
+    else:
+        for caseName, params in cases:
+            CaseList.append([caseName+ext, params['Height(m)'], params['Period(s)'], params['Direction(deg)']])
+        pending = cases
 
-    for height in waveHeightList:
-        for period in wavePeriodList:
-            for direction in waveDirList:
-                cont += 1
+    # base model of the variation files, saved before being changed by the cases
+    basePath = os.path.join(outFolder, baseModelFileName)
+    if compact and (len(pending) > 0 or not os.path.isfile(basePath)):
+        model.SaveData(basePath)
 
-                if isRegularWave(waveType):
-                    caseName = f'LC{__fi(cont, nDigits)}_H={height:0.2f}m_T={period:00.2f}s_dir={direction}'
-                else:
-                    caseName = f'LC{__fi(cont, nDigits)}_Hs={height:0.2f}m_Tp={period:00.2f}s_dir={direction}'
-    
-                __setEnvironment(
-                    model, direction, waveType, height, period, 
-                    nTimesPeriodStage1, stormDuration, calcGamma, 
-                    reducedIrregDuration, largestFallOrRise, waveTrainIndex, extremeWavePosition)                
-
-                fullPath = os.path.join(outFolder, caseName+'.dat')
-                model.SaveData(fullPath)                    
-
-                CaseList.append([caseName+'.dat', height, period, direction])
+    settings = __searchWavesAtOnce(model, waveType, pending, settings)
+    nWorkers = min(nWorkers, len(pending))
+    if nWorkers <= 1:
+        __saveCases(__iterCases(__copyModel(model), waveType, pending, settings), outFolder, compact)
+    else:
+        # interleaved shards, so each process gets a similar mix of cases
+        modelData = model.SaveDataMem()
+        shards = [pending[i::nWorkers] for i in range(nWorkers)]
+        with multiprocessing.Pool(nWorkers) as pool:
+            pool.starmap(
+                __genLoadCasesShard, [(modelData, waveType, shard, outFolder, settings, compact) for shard in shards])
 
-    df = pd.DataFrame(CaseList, columns=['File','Height(m)','Period(s)','Direction(deg)'])
-    fullPath = os.path.join(outFolder, __caseListFile)
-    df.to_excel(fullPath)
+    __writeCaseList(CaseList, outFolder)
@@ -16,7 +16,7 @@ __email__ = "gabriel.nascimento@nsgeng.com"
 __status__ = "Development"
 
 
-from typing import Union
+from typing import Union, Iterator
 from types import FunctionType
 
 import OrcFxAPI
@@ -30,7 +30,19 @@ from .loadcases import *
 from .utils import *
 from .raos import *
 from .constraintloads import ExtremeLoadsFromConstraints
-from .multiproc import ProcMultiThread
+from .extraction import VariableSpec, ExtremeResultsFromSims
+from .extremestats import ExtremeStatistics, PeaksOverThreshold, FitGumbel, FitWeibull, FitGPD
+from .rainflow import Rainflow, RainflowCycles, RainflowHistogram, StressTimeHistories
+from .spectralfatigue import StressPSD, ModalStressPSD, SpectralMoments, SpectralDamage, SpectralFatigueTable
+from .multiproc import ProcMultiThread, ProcLoadCases, BenchmarkThreadPolicies, PrepareSharedQueue
+from .sharedqueue import SharedCaseQueue
+from .runmanifest import RunManifest
+from .runevents import RunEvent, BatchMetrics
+from .variations import LoadVariationFile, ReadVariationFile, ApplyVariation
+from .resultstore import ResultStore
+from .modelcache import ModelCache, LoadModelCached, sharedModelCache
+from .wavesearch import WaveSearchCache, WaveComponentTable, ElevationHistory, LargestRiseAndFallBatch
+from .postproc import ExtremeResults, TimeHistoryResults, RangeGraphResults, ReadPostProcResults
 
 # ======= CONSTANTS ======== #
 requiredOrcFxVer = '11.3a'
@@ -185,7 +197,9 @@ class Model(orc.Model):
             refstormduration = 10800.,
             fallOrRise: str ='rise', # 'rise' or 'fall'
             extremeWavePosition: list[float] = [0.,0.],
-            iniWaveTimeOrigin: float | None = 0.0
+            iniWaveTimeOrigin: float | None = 0.0,
+            cache: WaveSearchCache | str | None = None,
+            engine: str = 'spreadsheet'
             ) -> None:
         '''
         Reduces the simulation time for irreguar wave based on the highest fall/rise
@@ -195,10 +209,12 @@ class Model(orc.Model):
             - waveTrainIndex: based on which wave train largest fall or rise must be selected
             - extremeWavePosition: position to search the largest 'fall' or 'rise'
             - iniWaveTimeOrigin: initial wave time origin to search for the next extreme event. If `None`, keep the value in the model for each wave train.
+            - cache: cache of the wave search results (`WaveSearchCache` or path of its file). If `None`, the search is always done.
+            - engine: 'spreadsheet' (OrcaFlex wave search) or 'numpy' (in memory, from the wave components)
 
             Obs.: the Tp value defined in the model will be used for the Stage 0.
         ''' 
-        SetReducedSimDuration(self, reducedDuration, refstormduration, fallOrRise, extremeWavePosition, iniWaveTimeOrigin)
+        SetReducedSimDuration(self, reducedDuration, refstormduration, fallOrRise, extremeWavePosition, iniWaveTimeOrigin, cache, engine)
 
     def GenerateLoadCases(
             self,
@@ -213,7 +229,12 @@ class Model(orc.Model):
             reducedIrregDuration: float = None,
             largestFallOrRise: str = 'rise',
             waveTrainIndex: int = 0,
-            extremeWavePosition: list[float] = [0.,0.]
+            extremeWavePosition: list[float] = [0.,0.],
+            nWorkers: int = 1,
+            incremental: bool = False,
+            compact: bool = False,
+            waveSearchCache: str | None = None,
+            waveSearchEngine: str = 'spreadsheet'
             ) -> None:
         """
         Generates load cases from the current model for the list of wave direction, 
@@ -231,11 +252,49 @@ class Model(orc.Model):
         * largestFallOrRise: if `reducedIrregDuration != None`, if the extreme event is searched based on the largest 'fall' or 'rise'
         * waveTrainIndex: which Wave Train should be considered
         * extremeWavePosition: if `reducedIrregDuration != None`, position to search for the largest 'rise' or 'fall'
+        * nWorkers: number of processes generating the load cases at the same time, each one with a copy of 
+        the model and a part of the cases (on Windows, protect the calling script by `if __name__ == '__main__':`)
+        * incremental: if `True`, only the new or changed load cases are written (hash of the model and 
+        of the case inputs, recorded in the _CaseList.xlsx); the cases whose LC number changed are renamed. 
+        If `False` (default), all the cases are written
+        * compact: if `True`, the model is saved once ('_BaseModel.dat') and each case is a small variation 
+        file ('.var.yml') with the data set for the case, run by `ProcMultiThread` as the .dat files
+        * waveSearchCache: if `reducedIrregDuration != None`, path of the file of the wave search cache 
+        (see `WaveSearchCache`), so the wave search of a sea state is done only once
+        * waveSearchEngine: if `reducedIrregDuration != None`, 'spreadsheet' (OrcaFlex wave search) 
+        or 'numpy' (elevation computed in memory from the wave components, all the sea states searched at once)
         """
         GenLoadCases(
             self, waveType, waveDirList, waveHeightList, wavePeriodList, outFolder,
             nTimesPeriodStage1, stormDuration, calcGamma, reducedIrregDuration,
-            largestFallOrRise, waveTrainIndex, extremeWavePosition)
+            largestFallOrRise, waveTrainIndex, extremeWavePosition, nWorkers, incremental, compact, waveSearchCache, waveSearchEngine)
+
+    def IterLoadCases(
+            self,
+            waveType: str, 
+            waveDirList: list[float],
+            waveHeightList: list[float],
+            wavePeriodList: list[float],
+            nTimesPeriodStage1: float = 5,
+            stormDuration: float = 10800,
+            calcGamma: bool = True,
+            reducedIrregDuration: float = None,
+            largestFallOrRise: str = 'rise',
+            waveTrainIndex: int = 0,
+            extremeWavePosition: list[float] = [0.,0.],
+            waveSearchCache: str | None = None,
+            waveSearchEngine: str = 'spreadsheet'
+            ) -> Iterator[tuple[str, dict[str, float], Model]]:
+        """
+        Generates the load cases on demand, without saving files (same inputs of `GenerateLoadCases`, 
+        except `outFolder`). Yields, for each case, a tuple (case name, parameters, model), where the 
+        model is this model, set for the load case. May be run directly by `ProcLoadCases`, e.g.:
+        `ofx.ProcLoadCases(model.IterLoadCases('JONSWAP', directions, heights, periods), outFolder)`
+        """
+        return IterLoadCases(
+            self, waveType, waveDirList, waveHeightList, wavePeriodList,
+            nTimesPeriodStage1, stormDuration, calcGamma, reducedIrregDuration,
+            largestFallOrRise, waveTrainIndex, extremeWavePosition, waveSearchCache, waveSearchEngine)
 
 
     def CalculateModal(
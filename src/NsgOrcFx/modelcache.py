@@ -0,0 +1,78 @@
+"""
+Cache of the models loaded from data and simulation files, so the same file is loaded only
+once by the functions reading it (e.g. units, constraints and results of the first .sim file)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import OrcFxAPI as orc
+
+
+class ModelCache:
+    """
+    Models loaded from files, with the path, modification time and size of the file as key
+    (a changed file is loaded again). When the number of models exceeds `maxModels`, or the sum
+    of their file sizes exceeds `maxBytes`, the least recently used ones are released; the latest
+    one is always kept. The cached models are shared, so they must only be read (not changed)
+    """
+    def __init__(self, maxModels: int = 2, maxBytes: float = 4e9):
+        self.maxModels = maxModels
+        self.maxBytes = maxBytes
+        self.__models: OrderedDict[tuple, tuple[orc.Model, int]] = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path: str) -> tuple[str, float, int]:
+        stat = os.stat(path)
+        return os.path.normcase(os.path.abspath(path)), stat.st_mtime, stat.st_size
+
+    def load(self, path: str) -> orc.Model:
+        """Returns the model of the file, loading it if not in the cache"""
+        key = self.key(path)
+        with self.__lock:
+            if key in self.__models:
+                self.__models.move_to_end(key)
+                self.hits += 1
+                return self.__models[key][0]
+        model = orc.Model(path)
+        with self.__lock:
+            self.misses += 1
+            # older versions of the same file are released
+            for oldKey in [k for k in self.__models if k[0] == key[0]]:
+                del self.__models[oldKey]
+            self.__models[key] = (model, key[2])
+            self.__evict()
+        return model
+
+    def __evict(self):
+        while len(self.__models) > 1 and (
+                len(self.__models) > self.maxModels or
+                sum(size for _, size in self.__models.values()) > self.maxBytes):
+            self.__models.popitem(last=False)
+
+    def release(self, path: str|None = None):
+        """Releases the model of the file (all models if `None`)"""
+        with self.__lock:
+            if path == None:
+                self.__models.clear()
+            else:
+                path = os.path.normcase(os.path.abspath(path))
+                for key in [k for k in self.__models if k[0] == path]:
+                    del self.__models[key]
+
+    def __len__(self) -> int:
+        return len(self.__models)
+
+
+# cache shared by the functions of the package in the session
+sharedModelCache = ModelCache()
+
+def LoadModelCached(path: str) -> orc.Model:
+    """
+    Returns the model of the file from the cache shared in the session (see `ModelCache`),
+    loading it only if not loaded yet (or if the file changed). The model must not be changed
+    """
+    return sharedModelCache.load(path)
@@ -3,16 +3,30 @@
 """
 
 import os
+import queue
 from dataclasses import dataclass
-# from multiprocessing import Process
+import multiprocessing
 import threading
+import time
+import socket
+import shutil
+import tempfile
+from typing import Any, Callable, Iterable
 import OrcFxAPI as orc
+from .runmanifest import RunManifest, isSimUpToDate
+from .threadbudget import ThreadBudget, ThreadBudgetFromPolicy, resolveThreadBudget, defaultCoreBudget
+from .postproc import PostProcResultWriter, runPostProcessors
+from .failures import FailureRecord, classifyFailure
+from .sharedqueue import SharedCaseQueue
+from .variations import baseModelFileName, isVariationFile, caseNameFromFile, LoadVariationFile
+from .runevents import RunEvent, EventDispatcher, CaseProgressHandler, BatchMetrics, ConsolePrinter
 
 @dataclass
 class ProcessResult:
     nAssignedLCs: int = 0
     nErrorLCs: int = 0
     ErrorLcList: list = None
+    FailureList: list[FailureRecord] = None
 
 @dataclass
 class MultiProcConfig:
@@ -22,7 +36,24 @@ class MultiProcConfig:
     pathModelFiles: str
     outputFolder: str
     delSuccessRunLCs: bool
-    groupList: list|None = None
+    backend: str = 'thread'
+    longestFirst: bool = True
+    resume: bool = False
+    modelThreads: int = 1
+    postProcessors: dict|None = None
+    saveSim: bool = True
+    timeout: float|None = None
+    retries: int = 0
+    retryBackoff: float = 30.
+    progressStep: float|None = 10.
+    sharedQueue: str|None = None
+    inMemory: bool = False
+    maxRestarts: int = 3 # consecutive restarts of a worker process that exits before starting a load case
+
+    @property
+    def hasCaseList(self) -> bool:
+        """If all the load cases to be run by this computer are known in advance (`fileList`)"""
+        return self.sharedQueue == None and not self.inMemory
 
     @property
     def nFiles(self) -> int:
@@ -30,147 +61,796 @@ class MultiProcConfig:
 
 
 def __getFileList(path: str) -> list[str]:
-    return [f for f in os.listdir(path) if f[-4:] == '.dat']
+    """Data (.dat) and variation (.var.yml) files of the load cases, excluding the base model of the variations"""
+    return [f for f in os.listdir(path) 
+            if (f[-4:] == '.dat' and f != baseModelFileName) or isVariationFile(f)]
+
+def __loadCaseFile(model: orc.Model, path: str):
+    if isVariationFile(path): LoadVariationFile(model, path)
+    else: model.LoadData(path)
+
+def __newConfig(
+        fileList: list[str],
+        budget: ThreadBudget,
+        datFilesPath: str,
+        outPath: str,
+        delSuccessDat: bool,
+        **options
+        ) -> MultiProcConfig:
+    """`options` are the optional fields of `MultiProcConfig`"""
+    procResults: list[ProcessResult] = []
+    for _ in range(budget.nWorkers):
+        procResults.append(ProcessResult())
+        procResults[-1].ErrorLcList = []
+        procResults[-1].FailureList = []
+
+    return MultiProcConfig(
+        fileList, procResults, budget.nWorkers, datFilesPath, outPath, delSuccessDat, 
+        modelThreads=budget.modelThreads, **options)
+
+def __simPath(cfg: MultiProcConfig, file: str) -> str:
+    return os.path.join(cfg.pathModelFiles, cfg.outputFolder, caseNameFromFile(file) + '.sim')
+
+def __saveSimulation(model: orc.Model, simPath: str):
+    """
+    Saves the simulation file with a temporary name, renamed when complete, so a worker killed 
+    while saving does not leave a partial simulation file, taken as completed when resuming
+    """
+    tmpPath = simPath + '.tmp'
+    model.SaveSimulation(tmpPath)
+    os.replace(tmpPath, simPath)
+
+def __isCompleted(cfg: MultiProcConfig, file: str, states: dict[str, dict]) -> bool:
+    """
+    A load case is completed if its simulation file exists and is newer than the data file, 
+    or, when the simulation files are not saved, if the manifest records it as completed
+    after the last change of the data file. The ones recorded with error are always run again
+    """
+    datPath = os.path.join(cfg.pathModelFiles, file)
+    record = states.get(file)
+    if record != None and record['state'] == 'error': 
+        return False
+    if cfg.inMemory: # no data file
+        if cfg.saveSim: return os.path.isfile(__simPath(cfg, file))
+        return record != None and record['state'] == 'completed'
+    if cfg.saveSim:
+        return isSimUpToDate(datPath, __simPath(cfg, file))
+    if record == None or record['state'] != 'completed': 
+        return False
+    return record['end'] >= os.path.getmtime(datPath)
+
+def __removeCompletedLCs(cfg: MultiProcConfig, manifest: RunManifest) -> list[str]:
+    """Returns the completed files (see `__isCompleted`), removing them from the list to be run"""
+    states = manifest.latestStates()
+    completed = []
+    for file in cfg.fileList:
+        if __isCompleted(cfg, file, states):
+            completed.append(file)
+    completedSet = set(completed)
+    cfg.fileList = [f for f in cfg.fileList if not f in completedSet]
+    return completed
+
+def __estimateCost(model: orc.Model, path: str) -> float:
+    """
+    Estimated computational cost of a load case, given by the number of time steps 
+    (sum of the stage durations divided by the time step). Returns 0 if it can not be estimated
+    """
+    try:
+        __loadCaseFile(model, path)
+        general = model.general
+        if general.DynamicsSolutionMethod == 'Explicit time domain':
+            timeStep = general.InnerTimeStep
+        elif general.ImplicitUseVariableTimeStep == 'Yes':
+            timeStep = general.ImplicitVariableMaxTimeStep
+        else:
+            timeStep = general.ImplicitConstantTimeStep
+        return sum(general.StageDuration) / timeStep
+    except Exception:
+        return 0.
 
-def __distributeLCs(cfg: MultiProcConfig) -> list[list[str]]:
-    nLCs = len(cfg.fileList)
-    nLCsPerThread = nLCs // cfg.nProcs
-    if nLCs % cfg.nProcs != 0:
-        nLCsPerThread += 1
+def __sortByCost(cfg: MultiProcConfig) -> list[str]:
+    """Returns the file list sorted by the estimated cost, longest first"""
+    model = orc.Model()
+    costs = {}
+    for file in cfg.fileList:
+        costs[file] = __estimateCost(model, os.path.join(cfg.pathModelFiles, file))
+    model.Clear()
+    return sorted(cfg.fileList, key=lambda f: costs[f], reverse=True)
 
+def __printHeader(cfg: MultiProcConfig):
     print('\nORCAFLEX MULTIPROCESS SIMULATION')
     print('\n================================')
-    print('Number of LCs: ', nLCs)
+    if cfg.inMemory:
+        print('Number of LCs: generated on demand')
+    else:
+        print('Number of LCs: ', cfg.nFiles)
     print('Number of process: ', cfg.nProcs)
-    print('Number LCs per process:', nLCsPerThread)
+    print('Number of threads per model: ', cfg.modelThreads)
+    if cfg.sharedQueue != None:
+        print(f'Distribution of LCs: shared folder queue ({cfg.sharedQueue})')
+    elif cfg.longestFirst:
+        print('Distribution of LCs: shared queue, longest first')
+    else:
+        print('Distribution of LCs: shared queue')
     print('--------------------------------')
     print('')
-    groups = []
 
-    if nLCs > cfg.nProcs:
-        for i in range(cfg.nProcs-1):
-            newGroup = cfg.fileList[i*nLCsPerThread:(i+1)*nLCsPerThread]
-            groups.append(newGroup.copy())
-        groups.append(cfg.fileList[(cfg.nProcs-1)*nLCsPerThread:])
+def __orderedFileList(cfg: MultiProcConfig) -> list[str]:
+    if cfg.longestFirst:
+        return __sortByCost(cfg)
     else:
-        for file in cfg.fileList:
-            groups.append([file])
-        for i in range(cfg.nFiles-1, cfg.nProcs):
-            groups.append([])
+        return cfg.fileList
 
-    return groups
+def __fillCaseQueue(cfg: MultiProcConfig, caseQueue):
+    """
+    Put all load cases in the queue shared by the workers, followed by one 
+    `None` per worker to indicate that there are no more cases
+    """
+    for file in __orderedFileList(cfg):
+        caseQueue.put(file)
+    for _ in range(cfg.nProcs):
+        caseQueue.put(None)
 
+def __openSharedQueue(cfg: MultiProcConfig) -> SharedCaseQueue:
+    """
+    Returns the queue in the shared folder, from which the workers claim the load cases. 
+    The first worker to open it (in any computer) writes the order of the load cases
+    """
+    sharedQueue = SharedCaseQueue(cfg.sharedQueue, cfg.fileList)
+    if not sharedQueue.isCreated():
+        sharedQueue.create(__orderedFileList(cfg))
+    return sharedQueue
 
-def __runMultiThreading(cfg: MultiProcConfig):
-    # procs: list[Process] = []
+def __runMultiThreading(
+        cfg: MultiProcConfig, 
+        caseQueue: queue.Queue|SharedCaseQueue, 
+        dispatcher: EventDispatcher
+        ):
     procs: list[threading.Thread] = []
 
     for i in range(cfg.nProcs):        
-        group = cfg.groupList[i]
-        if len(group) > 0:
-            # newProc = Process(target=__runLCs, args=(i, group, cfg))
-            newProc = threading.Thread(target=__runLCs, args=(i, group, cfg))
-            procs.append(newProc)
+        newProc = threading.Thread(target=__runLCs, args=(i, caseQueue, cfg, dispatcher))
+        procs.append(newProc)
 
     for p in procs:
         p.start()
 
     for p in procs:
         p.join()
-        # if p.is_alive():
-        #     p.terminate()
-
-    __printSummary(cfg.procResults)
         
-def __runAllLCs(cfg: MultiProcConfig):
-    if cfg.nProcs == 1:
-        __runLCs(-1, cfg.fileList, cfg)
+def __runAllLCs(
+        cfg: MultiProcConfig, 
+        manifest: RunManifest, 
+        resultWriter: PostProcResultWriter|None = None,
+        onEvent: Callable[[RunEvent], Any]|None = None,
+        loadCases: Iterable[tuple[str, dict, orc.Model]]|None = None,
+        nCases: int|None = None
+        ) -> BatchMetrics:
+    """
+    * loadCases: if provided (`cfg.inMemory`), the load cases are generated on demand by this 
+    iterable of (case name, parameters, model), instead of read from the data files
+    * nCases: number of load cases of `loadCases`, if known
+    """
+    completed = []
+    if cfg.resume and not cfg.inMemory:
+        completed = __removeCompletedLCs(cfg, manifest)
+        print(f'\nResuming: {len(completed)} LCs already completed will be skipped.')
+
+    sharedQueue = None
+    if cfg.sharedQueue != None:
+        sharedQueue = __openSharedQueue(cfg)
+        metrics = BatchMetrics(None) # the LCs are shared with other computers
+    elif cfg.inMemory:
+        metrics = BatchMetrics(nCases)
+    else:
+        metrics = BatchMetrics(cfg.nFiles)
+    dispatcher = EventDispatcher([
+        lambda event: __registerEvent(cfg, event, resultWriter),
+        manifest, metrics, ConsolePrinter(cfg.nProcs, metrics)])
+    if sharedQueue != None:
+        dispatcher.add(lambda event: __markSharedQueueDone(sharedQueue, event))
+    if onEvent != None: 
+        dispatcher.add(onEvent)
+    for file in completed:
+        dispatcher(RunEvent('skipped', file, -1, output=__simPath(cfg, file)))
+
+    __printHeader(cfg)
+    feeder = None
+    if sharedQueue != None:
+        caseQueue = sharedQueue
+    elif cfg.inMemory:
+        # bounded, so the generation is only a few cases ahead of the simulations
+        if cfg.backend == 'process': caseQueue = multiprocessing.Queue(2*cfg.nProcs)
+        else: caseQueue = queue.Queue(2*cfg.nProcs)
+        feeder = threading.Thread(
+            target=__feedLoadCases, args=(cfg, loadCases, caseQueue, dispatcher, manifest))
+        feeder.start()
+    elif cfg.backend == 'process':
+        caseQueue = multiprocessing.Queue()
+        __fillCaseQueue(cfg, caseQueue)
+    else:
+        caseQueue = queue.Queue()
+        __fillCaseQueue(cfg, caseQueue)
+
+    if cfg.backend == 'process':
+        __runMultiProcessing(cfg, caseQueue, dispatcher)
     else:
-        cfg.groupList = __distributeLCs(cfg)
-        __runMultiThreading(cfg)
+        __runMultiThreading(cfg, caseQueue, dispatcher)
+    if feeder != None:
+        feeder.join()
+    __printSummary(cfg.procResults, metrics)
+    return metrics
  
-def __runLCs(iProc: int, group: list[str], cfg: MultiProcConfig):
-    cfg.procResults[iProc].nAssignedLCs = len(group)
-    cfg.procResults[iProc].nErrorLCs = len(group)
+def __feedLoadCases(
+        cfg: MultiProcConfig, 
+        loadCases: Iterable[tuple[str, dict, orc.Model]], 
+        caseQueue: Any, 
+        dispatcher: EventDispatcher,
+        manifest: RunManifest
+        ):
+    """
+    Target of the thread that generates the load cases and puts their data (in memory) 
+    in the case queue, followed by one `None` per worker when all cases were generated
+    """
+    if cfg.resume: states = manifest.latestStates()
+    try:
+        for caseName, params, model in loadCases:
+            file = caseName + '.dat'
+            if cfg.resume and __isCompleted(cfg, file, states):
+                dispatcher(RunEvent('skipped', file, -1, output=__simPath(cfg, file)))
+                continue
+            caseQueue.put((file, model.SaveDataMem()))
+    except Exception as error:
+        print('Error generating the load cases:', error, flush=True)
+    finally:
+        for _ in range(cfg.nProcs):
+            caseQueue.put(None)
+
+def __getCase(caseQueue: Any) -> tuple[str|None, bytes|None]:
+    """Returns the next load case of the queue (file name) and its data, if sent in memory"""
+    item = caseQueue.get()
+    if type(item) == tuple: return item
+    return item, None
+
+def __markSharedQueueDone(sharedQueue: SharedCaseQueue, event: RunEvent):
+    if event.kind == 'finished': sharedQueue.markDone(event.file, 'completed')
+    elif event.kind == 'failed': sharedQueue.markDone(event.file, 'error')
+
+def __runLCs(
+        iProc: int, 
+        caseQueue: queue.Queue|SharedCaseQueue, 
+        cfg: MultiProcConfig, 
+        dispatcher: EventDispatcher
+        ):
+    """Target of each thread. Takes the next load case from the queue until it is empty"""
+    while True:
+        file, data = __getCase(caseQueue)
+        if file == None: break
+        __runCase(iProc, file, cfg, dispatcher, data=data)
+
+def __registerEvent(cfg: MultiProcConfig, event: RunEvent, resultWriter: PostProcResultWriter|None):
+    """Adds the outcome of the finished and failed load cases to the result tally"""
+    if not event.kind in ['finished', 'failed']: return
+    if event.kind == 'finished' and event.results != None and resultWriter != None: 
+        resultWriter.append(event.file, event.results)
+    __registerOutcome(
+        cfg.procResults[max(0, event.worker)], event.file, event.kind == 'finished', event.failure)
+
+def __registerOutcome(
+        procResult: ProcessResult, 
+        file: str, 
+        success: bool, 
+        failure: FailureRecord|None = None
+        ):
+    procResult.nAssignedLCs += 1
+    if not success:
+        procResult.nErrorLCs += 1
+        procResult.ErrorLcList.append(file)
+        if failure != None: 
+            procResult.FailureList.append(failure)
+
+def __runLCsInProcess(
+        iProc: int, 
+        caseQueue: Any, 
+        cfg: MultiProcConfig, 
+        resultQueue: multiprocessing.SimpleQueue
+        ):
+    """
+    Target of each worker process. The process owns a single model, reused for all 
+    load cases taken from the queue, and sends the run events to the main process
+    """
+    model = orc.Model(threadCount=cfg.modelThreads)
+    while True:
+        file, data = __getCase(caseQueue)
+        if file == None: break
+        __runCase(iProc, file, cfg, resultQueue.put, model, data)
+
+def __startWorkerProcess(
+        iProc: int, 
+        caseQueue: Any, 
+        cfg: MultiProcConfig, 
+        resultQueue: multiprocessing.SimpleQueue
+        ) -> multiprocessing.Process:
+    proc = multiprocessing.Process(
+        target=__runLCsInProcess, args=(iProc, caseQueue, cfg, resultQueue))
+    proc.start()
+    return proc
 
-    for i, file in enumerate(group):
-        __runLoadCase(iProc, i, len(group), file, cfg)
+def __runMultiProcessing(cfg: MultiProcConfig, caseQueue: Any, dispatcher: EventDispatcher):
+    """`caseQueue`: `multiprocessing.Queue` or `SharedCaseQueue` (each process claims the LCs itself)"""
+    # the events are written directly to the pipe (no feeder thread), so 
+    # they are not lost if the worker process crashes right after sending
+    resultQueue = multiprocessing.SimpleQueue()
+    procs: dict[int, multiprocessing.Process] = {}
+    running: dict[int, str|None] = {}
+    startTimes: dict[str, float] = {}
+    killed: set[int] = set()
+    processed: set[str] = set()
+    restarts: dict[int, int] = {}   # consecutive exits of each worker before starting a load case
+    stopped: set[int] = set()       # workers not restarted (`maxRestarts` reached)
+
+    def lostLC(i: int, file: str, failure: FailureRecord):
+        # a load case that never started is recorded with zero duration
+        end = time.time()
+        dispatcher(RunEvent(
+            'failed', file, i, timeStamp=end, startTime=startTimes.get(file, end), 
+            output=__simPath(cfg, file), failure=failure))
+        processed.add(file)
+
+    for i in range(cfg.nProcs):
+        procs[i] = __startWorkerProcess(i, caseQueue, cfg, resultQueue)
+        running[i] = None
+        restarts[i] = 0
+
+    # dispatch the events sent by the workers
+    while not cfg.hasCaseList or len(processed) < cfg.nFiles:
+        if not resultQueue.empty():
+            event: RunEvent = resultQueue.get()
+            if event.kind == 'started':
+                running[event.worker] = event.file
+                startTimes[event.file] = event.startTime
+                restarts[event.worker] = 0
+            elif event.kind in ['finished', 'failed']:
+                running[event.worker] = None
+                processed.add(event.file)
+            dispatcher(event)
+            continue
+
+        # all the events sent were received, so the workers can be checked
+        for i, p in procs.items():
+            # a process that exits normally after the last load case 
+            # has exit code 0; otherwise, the running LC was lost
+            if i in stopped: continue
+            if not p.is_alive() and p.exitcode != 0:
+                if i in killed:
+                    killed.remove(i)
+                    category, msg = 'timeout', 'process terminated after exceeding the timeout'
+                else:
+                    category, msg = 'crash', f'process terminated unexpectedly (exit code {p.exitcode})'
+                if running[i] != None:
+                    lostLC(i, running[i], FailureRecord(running[i], category, message=msg))
+                    running[i] = None
+                else:
+                    restarts[i] += 1 # exited before starting a load case (e.g. licence or import error)
+                if restarts[i] > cfg.maxRestarts:
+                    print(f'{__tTag(i, cfg.nProcs)}: {msg}. Not restarted (exited {restarts[i]} '
+                          'times in a row before starting a load case).', flush=True)
+                    stopped.add(i)
+                    continue
+                print(f'{__tTag(i, cfg.nProcs)}: {msg}. Starting a new one.', flush=True)
+                procs[i] = __startWorkerProcess(i, caseQueue, cfg, resultQueue)
+
+            # the worker cancels the simulation itself when the timeout is exceeded;
+            # it is terminated if it does not respond (e.g., stuck in the statics)
+            elif cfg.timeout != None and running[i] != None and not i in killed:
+                if time.time() - startTimes[running[i]] > __hardTimeout(cfg):
+                    p.terminate()
+                    killed.add(i)
+
+        if all([not p.is_alive() for p in procs.values()]) and resultQueue.empty():
+            break # all workers finished
+        time.sleep(0.1)
+
+    for p in procs.values():
+        p.join()
+
+    if len(stopped) == cfg.nProcs:
+        raise Exception(
+            f'All worker processes exited more than {cfg.maxRestarts} times in a row before '
+            'starting a load case (e.g. licence, import or DLL error). See the output of the worker processes.')
+
+    # LCs lost by a worker before being reported 
+    # (with a shared folder queue, only the ones claimed by this computer)
+    if cfg.hasCaseList: fileList = cfg.fileList
+    else: fileList = list(startTimes.keys())
+    for file in fileList:
+        if not file in processed:
+            lostLC(-1, file, FailureRecord(file, 'crash', message='load case lost by a worker process'))
+
+def __hardTimeout(cfg: MultiProcConfig) -> float:
+    """Wall-clock time after which a worker process is terminated, covering all attempts"""
+    nAttempts = cfg.retries + 1
+    backoff = sum([cfg.retryBackoff * 2**i for i in range(cfg.retries)])
+    return nAttempts * cfg.timeout + backoff + max(60., 0.1*cfg.timeout)
 
 def __tTag(iProc: int, nProcs: int):
     return f'Proc {iProc+1}/{nProcs}'
 
-def __runLoadCase(iProc: int, iFile: int, nProcFiles: int, file: str, cfg: MultiProcConfig):
+def __runCase(
+        iProc: int, 
+        file: str, 
+        cfg: MultiProcConfig,
+        emit: Callable[[RunEvent], Any],
+        model: orc.Model|None = None,
+        data: bytes|None = None
+        ):
+    """
+    Run the load case, trying again after failures classified as transient 
+    (e.g. licence or file lock), up to `cfg.retries` times, with exponential backoff.
+    The run events are sent to `emit`
+    """
+    start = time.time()
+    output = __simPath(cfg, file)
+    emit(RunEvent('started', file, iProc, start, start, output))
+    attempt = 0
+    while True:
+        attempt += 1
+        success, results, failure = __runLoadCase(iProc, file, cfg, emit, start, attempt, model, data)
+        if success: 
+            emit(RunEvent(
+                'finished', file, iProc, startTime=start, output=output, attempt=attempt, results=results))
+            return
+        failure.attempts = attempt
+        if failure.category != 'transient' or attempt > cfg.retries:
+            emit(RunEvent(
+                'failed', file, iProc, startTime=start, output=output, attempt=attempt, failure=failure))
+            return
+        emit(RunEvent(
+            'retrying', file, iProc, startTime=start, output=output, attempt=attempt, failure=failure))
+        time.sleep(cfg.retryBackoff * 2**(attempt-1))
+
+def __runLoadCase(
+        iProc: int, 
+        file: str, 
+        cfg: MultiProcConfig,
+        emit: Callable[[RunEvent], Any],
+        start: float,
+        attempt: int,
+        model: orc.Model|None = None,
+        data: bytes|None = None
+        ) -> tuple[bool, dict|None, FailureRecord|None]:
+    """
+    Run and save a single load case, then run the post-processors on the model in memory.
+    Returns `True` if completed successfully, the results of the post-processors, 
+    and the failure record (`None` if successful)
+    * model: if provided, the file is loaded into this model instead of a new one
+    * data: if provided, the model data (in memory) is loaded instead of the file
+    """
     fullPath = os.path.join(cfg.pathModelFiles, file)
-    model = orc.Model(fullPath, threadCount=cfg.nProcs)
-    print(f'{__tTag(iProc, cfg.nProcs)}: running "{file}" ({iFile+1}/{nProcFiles}) ...', flush=True)
+    success = False
+    results = None
+    failure = None
+    try:
+        if model == None:
+            model = orc.Model(threadCount=cfg.modelThreads)
+        if data != None:
+            model.LoadDataMem(data)
+        else:
+            __loadCaseFile(model, fullPath)
+    except Exception as error:
+        failure = classifyFailure(file, error, None, loading=True)
+        return success, results, failure
+
+    def onProgress(percent: float, simTime: float):
+        emit(RunEvent(
+            'progress', file, iProc, startTime=start, output=__simPath(cfg, file), 
+            percent=percent, simTime=simTime, attempt=attempt))
+
+    if cfg.progressStep: 
+        handler = CaseProgressHandler(cfg.timeout, onProgress, cfg.progressStep)
+    else: 
+        handler = CaseProgressHandler(cfg.timeout)
+    model.staticsProgressHandler = handler.statics
+    model.dynamicsProgressHandler = handler.dynamics
     try:
         model.RunSimulation()
-        percent = float(iFile+1)/nProcFiles*100
-        print(f'{__tTag(iProc, cfg.nProcs)}: simulation of file "{file}" ({iFile+1}/{nProcFiles}) completed ({percent:0.1f}%). Saving results...', flush=True)        
         if model.state == orc.ModelState.SimulationStopped:
-            fullSimPath = os.path.join(cfg.pathModelFiles, cfg.outputFolder, file.replace('.dat', '.sim'))
-            model.SaveSimulation(fullSimPath)            
-            print(f'{__tTag(iProc, cfg.nProcs)}: result file saved.', flush=True)
-            if cfg.delSuccessRunLCs:
+            if cfg.saveSim:
+                __saveSimulation(model, __simPath(cfg, file))
+            if cfg.postProcessors:
+                results = runPostProcessors(model, cfg.postProcessors)
+            if cfg.delSuccessRunLCs and data == None:
                 os.remove(fullPath)
-                cfg.procResults[iProc].nErrorLCs -= 1
+            success = True
         else:
-            cfg.procResults[iProc].ErrorLcList.append(file)
+            failure = classifyFailure(file, None, model, handler.timedOut, handler.simTime)
 
     except Exception as error:
-        cfg.procResults[iProc].ErrorLcList.append(file)
-        print(f'{__tTag(iProc, cfg.nProcs)}: error during simulation', error, flush=True)
+        failure = classifyFailure(file, error, model, handler.timedOut, handler.simTime)
+    model.staticsProgressHandler = None
+    model.dynamicsProgressHandler = None
     model.Clear()
+    return success, results, failure
 
-def __printSummary(procResults: list[ProcessResult]):
+def __printSummary(procResults: list[ProcessResult], metrics: BatchMetrics):
     nTotalLCs = 0
     nErrorLCs = 0
     ErrorLCs = []
+    failures: list[FailureRecord] = []
     for procRst in procResults:
         nTotalLCs += procRst.nAssignedLCs
         nErrorLCs += procRst.nErrorLCs
         ErrorLCs.extend(procRst.ErrorLcList)
+        failures.extend(procRst.FailureList)
 
     print(f'\nTOTAL NUMBER OF LCs: {nTotalLCs}')
     print(f'NUMBER OF LCs WITH ERROR: {nErrorLCs}')
     print('LIST OF LCs WITH ERROR: ', ErrorLCs)
+    for failure in failures:
+        print(f'  {failure}')
+    print(metrics.summary(), flush=True)
 
 
 def ProcMultiThread(
         dat_files_path: str,
         out_path: str,
         n_threads: None|int=None,
-        del_success_dat: bool=True
-        ):
+        del_success_dat: bool=True,
+        backend: str='thread',
+        longest_first: bool=True,
+        resume: bool=False,
+        manifest_file: str|None=None,
+        core_budget: int|None=None,
+        thread_policy: str|int='auto',
+        model_threads: int|None=None,
+        post_processors: dict[str, Callable[[orc.Model], Any]]|None=None,
+        save_sim: bool=True,
+        results_file: str|None=None,
+        timeout: float|None=None,
+        retries: int=0,
+        retry_backoff: float=30.,
+        on_event: Callable[[RunEvent], Any]|None=None,
+        progress_step: float|None=10.,
+        shared_queue: bool|str=False
+        ) -> BatchMetrics:
     """
     Run multi-threading simulations. 
     ATTENTION! Ensure that your model is thread-safe, which may be an issue when using external functions 
-    * dat_files_path: path to the folder containing the .dat files to be simulated
+    * dat_files_path: path to the folder containing the .dat files (or the variation files, '.var.yml', 
+    see the `compact` option of `GenLoadCases`) to be simulated
     * out_path: output folder to save the simulation (.sim) files
-    * n_threads: number of threads to be used; if `None` (default), will be set to the number of computer cores minus 1
+    * n_threads: number of models simulated at the same time (threads or processes); if `None` (default), set by the `thread_policy`
     * del_success_dat: if the .dat files successfully simulated should be deleted
+    * backend: 'thread' (default) runs the load cases in threads of the current process; 
+    'process' runs them in worker processes, each one with its own model, so the Python side 
+    work is not limited by the GIL and a crashing model does not stop the other workers. A worker that 
+    exits 4 times in a row before starting a load case (e.g. licence error) is not restarted, and an error is 
+    raised if all workers stop this way. When using 'process' on Windows, the calling script must be protected by `if __name__ == '__main__':`
+    * longest_first: the load cases are taken by the free workers from a shared queue; if `True`, 
+    the queue is sorted by the estimated cost of each case (stage durations divided by the time step), longest first
+    * resume: if `True`, skips the load cases whose simulation file already exists and is newer than the .dat file
+    * manifest_file: JSON lines file where the state, start and end time, wall time, and output path of each 
+    load case are recorded; if `None` (default), '_RunManifest.jsonl' in the output folder
+    * core_budget: total number of cores shared by the concurrent models and the internal threads 
+    of each model; if `None` (default), the number of computer cores minus 1
+    * thread_policy: split of the core budget, used for the values not set by `n_threads` and `model_threads`:
+    'auto' (default) one single-threaded model per core, or, if there are less cases than cores, one model per case 
+    sharing the cores; 'throughput' many single-threaded models; 'balanced' about sqrt(cores) models with 
+    sqrt(cores) threads each; 'latency' a single model using all cores; or an integer with the threads per model.
+    The function `BenchmarkThreadPolicies` measures the throughput of each policy for a given batch
+    * model_threads: number of threads of each model (OrcaFlex `threadCount`); if `None` (default), set by the `thread_policy`
+    * post_processors: dictionary of functions (name as key) called with the model in memory right after each simulation, 
+    e.g. `ExtremeResults`, `TimeHistoryResults` and `RangeGraphResults`. Their results are appended to the `results_file` 
+    as each load case is completed and may be loaded with `ReadPostProcResults`. With the 'process' backend, 
+    the functions must be picklable (e.g., defined at module level)
+    * save_sim: if the simulation (.sim) files should be saved; may be set to `False` when the 
+    required results are extracted by the `post_processors`
+    * results_file: file where the results of the `post_processors` are saved; 
+    if `None` (default), '_PostProcResults.pkl' in the output folder
+    * timeout: maximum wall-clock time (seconds) of each load case; the statics or simulation is cancelled when exceeded. 
+    With the 'process' backend, a worker that does not respond is terminated and replaced
+    * retries: number of times a load case is run again after a transient failure (e.g. licence or file lock error)
+    * retry_backoff: wait time (seconds) before the first retry, doubled for each new retry.
+    The failures (category, exception type, message, simulation time reached and model state) 
+    are listed in the summary and recorded in the manifest
+    * on_event: function called with each run event (`RunEvent`), one at a time, from the main process. 
+    The event kinds are 'started', 'progress', 'retrying', 'finished', 'failed' and 'skipped' (resume), 
+    with the time stamp, the start time of the load case and, depending on the kind, the percentage of the 
+    simulation completed, the failure record or the results of the post-processors
+    * progress_step: interval (percentage of the simulation) between the 'progress' events of each load case; 
+    if `None`, no 'progress' events are emitted
+    * shared_queue: to split the batch between several computers, the same call is made in each one, 
+    with `dat_files_path` and `out_path` in a shared (network) folder and `shared_queue=True` (queue folder 
+    '_Queue' in the `dat_files_path`) or the path of the queue folder. The workers of all computers claim 
+    the load cases from the queue (see `SharedCaseQueue`), which may be prepared by `PrepareSharedQueue`; 
+    otherwise, the first worker to start writes the order of the load cases. Each computer writes its own 
+    manifest and post-processing results files (host name appended to the default file names)
+    \nReturns the `BatchMetrics` of the run (load cases per hour, mean and 95th percentile of the 
+    load case duration), also printed in the summary along with the ETA after each load case
     """
-    # global procResults, nProcs, pathModelFiles, outputFolder, delSuccessRunLCs
+    if not backend in ['thread', 'process']:
+        raise Exception(f'Backend "{backend}" not recognized. Use "thread" or "process".')
+
+    queueFolder = __sharedQueueFolder(dat_files_path, shared_queue)
+
+    fileList = __getFileList(dat_files_path)
+    budget = resolveThreadBudget(
+        len(fileList), core_budget, thread_policy, n_threads, model_threads)
+
+    config = __newConfig(
+        fileList, budget, dat_files_path, out_path, del_success_dat, 
+        backend=backend, longestFirst=longest_first, resume=resume, 
+        postProcessors=post_processors, saveSim=save_sim, 
+        timeout=timeout, retries=retries, retryBackoff=retry_backoff, progressStep=progress_step,
+        sharedQueue=queueFolder)
+
+    if manifest_file == None:
+        manifest_file = os.path.join(
+            dat_files_path, out_path, __defaultFileName(RunManifest.defaultFileName, queueFolder))
+    manifest = RunManifest(manifest_file)
 
-    
-    if not n_threads:
-        nProcs = os.cpu_count()-1
+    resultWriter = None
+    if post_processors:
+        if results_file == None:
+            results_file = os.path.join(
+                dat_files_path, out_path, __defaultFileName(PostProcResultWriter.defaultFileName, queueFolder))
+        resultWriter = PostProcResultWriter(results_file)
+
+    return __runAllLCs(config, manifest, resultWriter, on_event)
+
+
+def ProcLoadCases(
+        load_cases: Iterable[tuple[str, dict, orc.Model]],
+        out_path: str,
+        n_cases: int|None=None,
+        n_threads: None|int=None,
+        backend: str='thread',
+        resume: bool=False,
+        manifest_file: str|None=None,
+        core_budget: int|None=None,
+        thread_policy: str|int='auto',
+        model_threads: int|None=None,
+        post_processors: dict[str, Callable[[orc.Model], Any]]|None=None,
+        save_sim: bool=True,
+        results_file: str|None=None,
+        timeout: float|None=None,
+        retries: int=0,
+        retry_backoff: float=30.,
+        on_event: Callable[[RunEvent], Any]|None=None,
+        progress_step: float|None=10.
+        ) -> BatchMetrics:
+    """
+    Run the load cases generated on demand (e.g. by `IterLoadCases`), without writing data files. 
+    Each case is sent in memory to the free worker, while the next ones are generated 
+    (up to twice the number of workers ahead of the simulations)
+    * load_cases: iterable of tuples (case name, parameters, model)
+    * out_path: output folder to save the simulation (.sim) files, the manifest and the post-processing results
+    * n_cases: number of load cases, used to estimate the ETA and by the 'auto' `thread_policy`
+    \nThe other inputs and the returned value are the same of `ProcMultiThread`. With `resume=True`, 
+    the load cases whose simulation file exists (or, if `save_sim=False`, recorded as 
+    completed in the manifest) are skipped
+    """
+    if not backend in ['thread', 'process']:
+        raise Exception(f'Backend "{backend}" not recognized. Use "thread" or "process".')
+
+    budget = resolveThreadBudget(n_cases, core_budget, thread_policy, n_threads, model_threads)
+    config = __newConfig(
+        [], budget, '', out_path, False, 
+        backend=backend, longestFirst=False, resume=resume, 
+        postProcessors=post_processors, saveSim=save_sim, 
+        timeout=timeout, retries=retries, retryBackoff=retry_backoff, progressStep=progress_step,
+        inMemory=True)
+
+    if manifest_file == None:
+        manifest_file = os.path.join(out_path, RunManifest.defaultFileName)
+    manifest = RunManifest(manifest_file)
+
+    resultWriter = None
+    if post_processors:
+        if results_file == None:
+            results_file = os.path.join(out_path, PostProcResultWriter.defaultFileName)
+        resultWriter = PostProcResultWriter(results_file)
+
+    return __runAllLCs(config, manifest, resultWriter, on_event, load_cases, n_cases)
+
+
+def __sharedQueueFolder(datFilesPath: str, sharedQueue: bool|str) -> str|None:
+    if sharedQueue == True:
+        return os.path.join(datFilesPath, SharedCaseQueue.defaultFolderName)
+    elif sharedQueue:
+        return sharedQueue
     else:
-        nProcs = n_threads
-    nProcs = max(1,nProcs)
+        return None
 
+def __defaultFileName(fileName: str, sharedQueue: str|None) -> str:
+    """With a shared folder queue, the host name is appended to the file name"""
+    if sharedQueue == None: return fileName
+    name, ext = os.path.splitext(fileName)
+    return f'{name}_{socket.gethostname()}{ext}'
+
+def PrepareSharedQueue(
+        dat_files_path: str,
+        queue_folder: str|None = None,
+        longest_first: bool = True,
+        reset: bool = False
+        ) -> SharedCaseQueue:
+    """
+    Prepares the queue in a shared folder, from which the `ProcMultiThread` workers 
+    of several computers (`shared_queue` argument) claim the load cases
+    * dat_files_path: path to the (shared) folder containing the .dat files to be simulated
+    * queue_folder: queue folder; if `None`, '_Queue' in the `dat_files_path`
+    * longest_first: if the load cases are sorted by their estimated cost, longest first
+    * reset: if `True`, an existing queue (e.g. of a previous batch) is removed; 
+    otherwise, the existing queue is kept
+    \nReturns the `SharedCaseQueue`, whose `status()` gives the load cases pending, 
+    running, completed and with error, and `releaseClaims()` releases the load cases 
+    claimed by a computer that stopped, so they are taken by the other workers
+    """
+    if queue_folder == None:
+        queue_folder = os.path.join(dat_files_path, SharedCaseQueue.defaultFolderName)
+    sharedQueue = SharedCaseQueue(queue_folder)
+    if reset: 
+        sharedQueue.reset()
+    if not sharedQueue.isCreated():
+        cfg = MultiProcConfig(
+            __getFileList(dat_files_path), [], 1, dat_files_path, '.', False, longestFirst=longest_first)
+        sharedQueue.create(__orderedFileList(cfg))
+    print(f'Shared queue "{queue_folder}": {len(sharedQueue.order())} LCs.', flush=True)
+    return sharedQueue
 
-    procResults: list[ProcessResult] = []
-    for _ in range(nProcs):
-        procResults.append(ProcessResult())
-        procResults[-1].ErrorLcList = []
 
+def BenchmarkThreadPolicies(
+        dat_files_path: str,
+        policies: list[str|int] = ['throughput', 'balanced', 'latency'],
+        n_cases: int|None = None,
+        core_budget: int|None = None,
+        backend: str = 'thread'
+        ) -> dict[str, dict]:
+    """
+    Measures the throughput of each thread policy (see `ProcMultiThread`) running the same 
+    sample of load cases from the batch. The .dat files are kept and the simulation 
+    files are saved in a temporary folder, deleted at the end.
+    * dat_files_path: path to the folder containing the .dat files of the batch
+    * policies: list of thread policies to be compared ('throughput', 'balanced', 
+    'latency', 'auto' or number of threads of each model)
+    * n_cases: number of load cases of the sample; if `None`, the number of cores of the budget
+    * core_budget: total number of cores; if `None`, the number of computer cores minus 1
+    * backend: 'thread' or 'process'
+    \nReturns a dictionary with the number of models, threads per model, wall time (s) 
+    and load cases per hour of each policy
+    """
+    if not core_budget: core_budget = defaultCoreBudget()
+    if not n_cases: n_cases = core_budget
+
+    # sample spread over the batch
     fileList = __getFileList(dat_files_path)
+    step = max(1, len(fileList) // n_cases)
+    sample = fileList[::step][:n_cases]
 
-    config = MultiProcConfig(
-        fileList, procResults, nProcs, dat_files_path, out_path, del_success_dat)
+    results = {}
+    for policy in policies:
+        budget = ThreadBudgetFromPolicy(policy, core_budget, len(sample))
+        outFolder = tempfile.mkdtemp()
+        config = __newConfig(
+            sample, budget, dat_files_path, outFolder, False, backend=backend, longestFirst=False)
+        manifest = RunManifest(os.path.join(outFolder, RunManifest.defaultFileName))
 
+        start = time.time()
+        __runAllLCs(config, manifest)
+        wallTime = time.time() - start
+        shutil.rmtree(outFolder, ignore_errors=True)
 
-    model = orc.Model()
-    
-    __runAllLCs(config)
\ No newline at end of file
+        results[str(policy)] = {
+            'nWorkers': budget.nWorkers,
+            'modelThreads': budget.modelThreads,
+            'wallTime': wallTime,
+            'casesPerHour': len(sample)/wallTime*3600,
+        }
+
+    print('\nTHREAD POLICY BENCHMARK')
+    print(f'Core budget: {core_budget} | Number of LCs: {len(sample)}')
+    for policy, rst in results.items():
+        print(f'{policy}: {rst["nWorkers"]} model(s) x {rst["modelThreads"]} thread(s) -> ' + \
+              f'{rst["wallTime"]:0.1f} s ({rst["casesPerHour"]:0.1f} LCs/hour)')
+
+    return results
@@ -0,0 +1,171 @@
+"""
+Post-processing hooks run by `ProcMultiThread` on the model in memory, right after the simulation
+"""
+
+import os
+import pickle
+import threading
+from typing import Any, Callable
+import numpy as np
+import OrcFxAPI as orc
+
+
+def periodFromSpec(period: None|str|int|tuple[float,float]) -> orc.PeriodArg:
+    """
+    Returns the OrcaFlex period from a simple (picklable) definition:
+    * `None` or 'whole simulation': whole simulation
+    * 'latest wave': latest wave (regular waves)
+    * 'static': static state
+    * integer: stage number
+    * tuple (from, to): specified period (simulation time)
+    """
+    if period == None or period == 'whole simulation': return orc.pnWholeSimulation
+    elif period == 'latest wave': return orc.pnLatestWave
+    elif period == 'static': return orc.pnStaticState
+    elif type(period) == int: return orc.Period(period)
+    elif type(period) in [tuple, list] and len(period) == 2:
+        return orc.SpecifiedPeriod(period[0], period[1])
+    else:
+        raise Exception(f'Period {period} not recognized.')
+
+def objectExtraFromSpec(objectExtra: None|str|float) -> orc.ObjectExtra|None:
+    """
+    Returns the OrcaFlex object extra from a simple (picklable) definition:
+    * `None`: no object extra
+    * 'End A', 'End B' or 'Touchdown': line ends or touchdown point
+    * float: line arc length
+    """
+    if objectExtra == None: return None
+    elif objectExtra == 'End A': return orc.oeEndA
+    elif objectExtra == 'End B': return orc.oeEndB
+    elif objectExtra == 'Touchdown': return orc.oeTouchdown
+    elif type(objectExtra) in [int, float]: return orc.oeArcLength(objectExtra)
+    else:
+        raise Exception(f'Object extra {objectExtra} not recognized.')
+
+
+class ExtremeResults:
+    """
+    Post-processor returning, for each variable, a dictionary with the
+    'Max', 'TimeOfMax', 'Min' and 'TimeOfMin' values of its time history
+    """
+    def __init__(
+            self,
+            objName: str,
+            varNames: list[str],
+            period: None|str|int|tuple[float,float] = None,
+            objectExtra: None|str|float = None
+            ):
+        self.objName = objName
+        self.varNames = varNames
+        self.period = period
+        self.objectExtra = objectExtra
+
+    def __call__(self, model: orc.Model) -> dict[str, dict[str, float]]:
+        obj = model[self.objName]
+        pn = periodFromSpec(self.period)
+        oe = objectExtraFromSpec(self.objectExtra)
+        times = obj.SampleTimes(pn)
+        results = {}
+        for varName in self.varNames:
+            th = obj.TimeHistory(varName, pn, oe)
+            iMax, iMin = np.argmax(th), np.argmin(th)
+            results[varName] = {
+                'Max': float(th[iMax]), 'TimeOfMax': float(times[iMax]),
+                'Min': float(th[iMin]), 'TimeOfMin': float(times[iMin])}
+        return results
+
+class TimeHistoryResults:
+    """Post-processor returning the sample times ('Time') and the time history of each variable"""
+    def __init__(
+            self,
+            objName: str,
+            varNames: list[str],
+            period: None|str|int|tuple[float,float] = None,
+            objectExtra: None|str|float = None
+            ):
+        self.objName = objName
+        self.varNames = varNames
+        self.period = period
+        self.objectExtra = objectExtra
+
+    def __call__(self, model: orc.Model) -> dict[str, np.ndarray]:
+        obj = model[self.objName]
+        pn = periodFromSpec(self.period)
+        oe = objectExtraFromSpec(self.objectExtra)
+        results = {'Time': np.array(obj.SampleTimes(pn))}
+        for varName in self.varNames:
+            results[varName] = np.array(obj.TimeHistory(varName, pn, oe))
+        return results
+
+class RangeGraphResults:
+    """
+    Post-processor returning the arc lengths ('X') and a dictionary
+    with 'Min', 'Max' and 'Mean' of the range graph of each variable
+    """
+    def __init__(
+            self,
+            lineName: str,
+            varNames: list[str],
+            period: None|str|int|tuple[float,float] = None
+            ):
+        self.lineName = lineName
+        self.varNames = varNames
+        self.period = period
+
+    def __call__(self, model: orc.Model) -> dict[str, Any]:
+        line = model[self.lineName]
+        pn = periodFromSpec(self.period)
+        results = {}
+        for varName in self.varNames:
+            rg = line.RangeGraph(varName, pn)
+            if not 'X' in results: results['X'] = np.array(rg.X)
+            results[varName] = {
+                'Min': np.array(rg.Min), 'Max': np.array(rg.Max), 'Mean': np.array(rg.Mean)}
+        return results
+
+
+def runPostProcessors(
+        model: orc.Model,
+        postProcessors: dict[str, Callable[[orc.Model], Any]]
+        ) -> dict[str, Any]:
+    """Returns the result of each post-processor (name as key)"""
+    results = {}
+    for name, func in postProcessors.items():
+        results[name] = func(model)
+    return results
+
+
+class PostProcResultWriter:
+    """Appends the post-processing results of each load case to a file, as they are completed"""
+    defaultFileName = '_PostProcResults.pkl'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def append(self, LC: str, results: dict[str, Any]):
+        with self.__lock:
+            with open(self.path, 'ab') as f:
+                pickle.dump((LC, results), f)
+
+
+def ReadPostProcResults(path: str) -> dict[str, dict[str, Any]]:
+    """
+    Reads the post-processing results saved by `ProcMultiThread`
+    * path: results file (by default, '_PostProcResults.pkl' in the output folder)
+    \nReturns a dictionary with the load case (file name) as key and the
+    results of each post-processor (dictionary with the post-processor name as key)
+    """
+    results = {}
+    if not os.path.isfile(path): return results
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                LC, caseResults = pickle.load(f)
+            except EOFError:
+                break
+            except pickle.UnpicklingError:
+                break # record truncated by an interrupted run
+            results[LC] = caseResults
+    return results
@@ -0,0 +1,194 @@
+"""
+Rainflow cycle counting (ASTM E1049, four-point algorithm) of stress time histories, with all
+the series of an array (e.g. nodes x thetas x samples) counted at once
+"""
+
+import numpy as np
+import OrcFxAPI as orc
+from .postproc import periodFromSpec
+from .utils import RadialPosFromStr
+from .sncurves import SNCurve, curveParameters, snCurveLogCycles
+
+
+def TurningPoints(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reversals (peaks and valleys, including the first and last samples) of each series (last axis).
+    In a plateau, only its first sample is kept
+    \nReturns the reversals (series x reversals, padded with NaN) and the number of reversals of each series
+    """
+    x = np.asarray(values, dtype=float).reshape(-1, np.shape(values)[-1])
+    nSeries, nSamples = x.shape
+    if nSamples < 3:
+        return x.copy(), np.full(nSeries, nSamples)
+    slope = np.sign(np.diff(x, axis=1))
+    index = np.broadcast_to(np.arange(nSamples - 1), slope.shape)
+    rows = np.arange(nSeries)[:, None]
+    # sign of the latest non-zero slope up to each diff, and of the next one from each diff
+    last = np.maximum.accumulate(np.where(slope != 0, index, 0), axis=1)
+    following = np.minimum.accumulate(np.where(slope != 0, index, nSamples - 2)[:, ::-1], axis=1)[:, ::-1]
+    before, after = slope[rows, last[:, :-1]], slope[rows, following[:, 1:]]
+    reversal = np.zeros(x.shape, dtype=bool)
+    reversal[:, [0, -1]] = True
+    reversal[:, 1:-1] = (before * after < 0) & (slope[:, :-1] != 0)
+
+    nReversals = reversal.sum(axis=1)
+    order = np.argsort(~reversal, axis=1, kind='stable') # reversals first, in the original order
+    points = np.take_along_axis(x, order[:, :nReversals.max()], axis=1)
+    points[np.arange(points.shape[1]) >= nReversals[:, None]] = np.nan
+    return points, nReversals
+
+
+class RainflowCycles:
+    """
+    Cycles counted in the series of a stress array, as flat arrays with the index of the series
+    (in the array without the last axis, e.g. node x theta), the range, the mean and the count
+    (1 for full cycles, 0.5 for the half cycles of the residue)
+    """
+    def __init__(self, shape: tuple, series: np.ndarray, ranges: np.ndarray, means: np.ndarray, counts: np.ndarray):
+        self.shape = shape      # shape of the array of series (without the samples axis)
+        self.series = series    # flat index of the series of each cycle
+        self.ranges = ranges
+        self.means = means
+        self.counts = counts
+
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    def seriesIndex(self) -> tuple[np.ndarray, ...]:
+        """Index of the series of each cycle in the array (e.g. node and theta)"""
+        return np.unravel_index(self.series, self.shape)
+
+    def histogram(
+            self,
+            bins: int|np.ndarray = 50,
+            mean_bins: None|int|np.ndarray = None
+            ) -> tuple[np.ndarray, np.ndarray] | tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Number of cycles in each stress range bin of each series
+        * bins: number of range bins (from 0 to the largest range of all series) or the bin edges
+        * mean_bins: number of mean bins or their edges, for the range-mean matrix; not counted by the mean if `None`
+        \nReturns the counts (series shape x range bins [x mean bins]), the range bin edges [and the mean bin edges]
+        """
+        rangeEdges = binEdges(bins, self.ranges, 0.)
+        nSeries = int(np.prod(self.shape, dtype=int))
+        iRange = binIndex(self.ranges, rangeEdges)
+        if mean_bins is None:
+            counts = np.bincount(
+                self.series * (len(rangeEdges) - 1) + iRange, self.counts, nSeries * (len(rangeEdges) - 1))
+            return counts.reshape(*self.shape, len(rangeEdges) - 1), rangeEdges
+
+        meanEdges = binEdges(mean_bins, self.means, None)
+        nRange, nMean = len(rangeEdges) - 1, len(meanEdges) - 1
+        iMean = binIndex(self.means, meanEdges)
+        counts = np.bincount((self.series * nRange + iRange) * nMean + iMean, self.counts, nSeries * nRange * nMean)
+        return counts.reshape(*self.shape, nRange, nMean), rangeEdges, meanEdges
+
+    def damage(self, curves: SNCurve|list[SNCurve], factors: float|np.ndarray = 1.) -> np.ndarray:
+        """
+        Miner's sum of the cycles (stress ranges in MPa) of each series, cycle by cycle (no binning), 
+        against each curve and each stress factor (see `minerDamage`)
+        \nReturns the damage with the shape (curves, *factors shape, *series shape)
+        """
+        if isinstance(curves, SNCurve): curves = [curves]
+        factors = np.asarray(factors, dtype=float)
+        params = curveParameters(curves)
+        nSeries = int(np.prod(self.shape, dtype=int))
+        damage = np.empty((len(curves), factors.size, nSeries))
+        for i in range(len(curves)): # one curve at a time, limiting the memory to factors x cycles
+            logN = snCurveLogCycles(params[i:i+1], factors.reshape(-1, 1) * self.ranges)[0]
+            for j, cycleDamage in enumerate(self.counts * 10**(-logN)):
+                damage[i, j] = np.bincount(self.series, cycleDamage, nSeries)
+        return damage.reshape(len(curves), *factors.shape, *self.shape)
+
+
+def binEdges(bins: int|np.ndarray, values: np.ndarray, lower: float|None) -> np.ndarray:
+    if np.ndim(bins) > 0: return np.asarray(bins, dtype=float)
+    if len(values) == 0: return np.linspace(0., 1., bins + 1)
+    low = values.min() if lower == None else lower
+    high = values.max()
+    if high <= low: high = low + 1.
+    return np.linspace(low, high, bins + 1)
+
+def binIndex(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Index of the bin of each value (the values out of the edges are counted in the first or last bin)"""
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+def Rainflow(stress: np.ndarray) -> RainflowCycles:
+    """
+    Rainflow counting (ASTM E1049, four-point algorithm) of the series in the last axis of the
+    array (e.g. nodes x thetas x samples), all series at once. The residue is counted as half cycles
+    """
+    stress = np.asarray(stress, dtype=float)
+    shape = stress.shape[:-1]
+    points, nPoints = TurningPoints(stress)
+    nSeries = len(nPoints)
+
+    stack = np.empty(points.shape)
+    top = np.zeros(nSeries, dtype=int) # number of points in the stack of each series
+    cycles = [] # (series, range, mean) of the full cycles
+    for k in range(points.shape[1]):
+        rows = np.flatnonzero(nPoints > k)
+        stack[rows, top[rows]] = points[rows, k]
+        top[rows] += 1
+        # the cycles closed by the new point (B-C inside the ranges A-B and C-D), removing B and C
+        while True:
+            rows = rows[top[rows] >= 4]
+            if len(rows) == 0: break
+            t = top[rows]
+            a, b, c, d = (stack[rows, t - i] for i in [4, 3, 2, 1])
+            inner = np.abs(b - c)
+            closed = (inner <= np.abs(a - b)) & (inner <= np.abs(c - d))
+            rows = rows[closed]
+            if len(rows) == 0: break
+            cycles.append((rows, inner[closed], 0.5 * (b + c)[closed]))
+            stack[rows, top[rows] - 3] = d[closed]
+            top[rows] -= 2
+
+    # residue: half cycles between consecutive points of the stack
+    nResidue = np.maximum(top - 1, 0)
+    residue = np.arange(stack.shape[1] - 1) < nResidue[:, None]
+    rows = np.broadcast_to(np.arange(nSeries)[:, None], residue.shape)[residue]
+    first, second = stack[:, :-1][residue], stack[:, 1:][residue]
+
+    series = np.concatenate([c[0] for c in cycles] + [rows]).astype(int)
+    ranges = np.concatenate([c[1] for c in cycles] + [np.abs(second - first)])
+    means = np.concatenate([c[2] for c in cycles] + [0.5 * (first + second)])
+    counts = np.concatenate([np.ones(len(ranges) - len(rows)), np.full(len(rows), 0.5)])
+    return RainflowCycles(shape, series, ranges, means, counts)
+
+def RainflowHistogram(
+        stress: np.ndarray,
+        bins: int|np.ndarray = 50,
+        mean_bins: None|int|np.ndarray = None
+        ) -> tuple[np.ndarray, np.ndarray] | tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Rainflow counting of the series in the last axis of the array (e.g. nodes x thetas x samples),
+    binned by the stress range [and mean] (see `RainflowCycles.histogram`)
+    """
+    return Rainflow(stress).histogram(bins, mean_bins)
+
+def StressTimeHistories(
+        line: orc.OrcaFlexLineObject,
+        period: None|str|int|tuple[float,float] = None,
+        arc_lengths: list[float]|None = None,
+        n_thetas: int = 8,
+        radius_pos: str = 'outer',
+        var_name: str = 'ZZ stress'
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stress time histories of a line at the arc lengths and cross section points (thetas), in the
+    stress units of the model, in one call of the OrcaFlex API
+    * period: see `periodFromSpec`
+    * arc_lengths: arc lengths of the results; the nodes if `None`
+    * n_thetas: number of cross section points (polar coords.), equally spaced
+    * radius_pos: 'inner', 'mid', 'outer'
+    \nReturns the arc lengths, the thetas (deg.) and the stresses (arc lengths x thetas x samples)
+    """
+    if arc_lengths == None: arc_lengths = line.NodeArclengths
+    rp = RadialPosFromStr(radius_pos)
+    thetas = np.arange(n_thetas) * 360. / n_thetas
+    specs = [
+        orc.TimeHistorySpecification(line, var_name, orc.oeLine(ArcLength=z, RadialPos=rp, Theta=theta))
+        for z in arc_lengths for theta in thetas]
+    values = orc.GetMultipleTimeHistories(specs, periodFromSpec(period)) # samples x (arc lengths x thetas)
+    return np.asarray(arc_lengths), thetas, np.asarray(values).T.reshape(len(arc_lengths), n_thetas, -1)
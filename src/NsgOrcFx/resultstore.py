@@ -0,0 +1,303 @@
+"""
+Columnar store (Parquet) of the results extracted from the simulations, queried by load case,
+object, variable and period without loading the whole data set
+"""
+
+import os
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from .variations import caseNameFromFile
+
+
+def requirePyArrow():
+    """Imports the optional dependency of the store (`pyarrow`)"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception('The result store requires the "pyarrow" package (pip install pyarrow).')
+    return pyarrow
+
+def periodLabel(period: None|str|int|tuple[float,float]) -> str:
+    """Label of the period definition (see `periodFromSpec`), used as index of the store"""
+    if period == None: return 'whole simulation'
+    elif type(period) in [tuple, list]: return f'{period[0]:g} to {period[1]:g}'
+    else: return str(period)
+
+
+class ResultStore:
+    """
+    Results of a batch of load cases in a folder of Parquet files (requires `pyarrow`):
+    * 'cases': parameters of each load case (e.g. 'Height(m)', 'Period(s)', 'Direction(deg)')
+    * 'results': one row per load case, object, variable, period and object extra, with the
+    statistics of the time history ('Max', 'TimeOfMax', 'Min', 'TimeOfMin', 'Mean', 'Std'), the
+    static value ('Static') and the time history itself ('Time' and 'Values', compressed columns)
+    * other tables (e.g. 'VesselResponses', 'FatigueDamage'), written by `addTable`
+
+    Each write adds a new file to the table folder, so several processes may write to the same
+    store. The queries read only the columns and the row groups they need, e.g. the
+    largest Fz of the load cases with Hs > 5 m:
+    `store.query(variable='Fz', columns=['Max'], cases='`Height(m)` > 5')['Max'].max()`.
+    The Excel files are views built from the store (see `toExcel`)
+    """
+    casesTable = 'cases'
+    resultsTable = 'results'
+    indexColumns = ['LC', 'Object', 'Variable', 'Period', 'ObjectExtra']
+    statColumns = ['Max', 'TimeOfMax', 'Min', 'TimeOfMin', 'Mean', 'Std', 'Static']
+    historyColumns = ['Time', 'Values']
+
+    def __init__(self, folder: str, compression: str = 'zstd'):
+        """
+        * folder: folder of the store (created if it does not exist)
+        * compression: compression codec of the Parquet files (e.g. 'zstd', 'snappy', 'gzip')
+        """
+        requirePyArrow()
+        self.folder = folder
+        self.compression = compression
+        os.makedirs(folder, exist_ok=True)
+
+    def tableFolder(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def tableNames(self) -> list[str]:
+        return sorted(
+            [d for d in os.listdir(self.folder) if os.path.isdir(self.tableFolder(d)) and self.__files(d)])
+
+    def __files(self, name: str) -> list[str]:
+        folder = self.tableFolder(name)
+        if not os.path.isdir(folder): return []
+        return sorted([os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.parquet')])
+
+    def __write(self, name: str, table):
+        """Writes the (pyarrow) table as a new file of the table folder"""
+        import pyarrow.parquet as pq
+        folder = self.tableFolder(name)
+        os.makedirs(folder, exist_ok=True)
+        fileName = f'{time.time_ns()}_{os.getpid()}_{uuid.uuid4().hex[:8]}.parquet'
+        # written with a hidden name (ignored by the readers) and renamed when complete
+        tmpPath = os.path.join(folder, '.' + fileName + '.tmp')
+        pq.write_table(table, tmpPath, compression=self.compression)
+        os.replace(tmpPath, os.path.join(folder, fileName))
+
+    def __read(
+            self, 
+            name: str, 
+            columns: list[str]|None = None, 
+            filters: list[tuple]|None = None, 
+            files: list[str]|None = None
+            ) -> pd.DataFrame:
+        """`files`: files of the table to be read (all, if `None`)"""
+        import pyarrow.parquet as pq
+        if files == None: files = self.__files(name)
+        if not files: return pd.DataFrame(columns=columns)
+        return pq.read_table(files, columns=columns, filters=filters).to_pandas()
+
+    def addTable(self, name: str, df: pd.DataFrame):
+        """
+        Appends the rows of the data frame to the table (created if it does not exist).
+        The columns must be the same in all writes of the table. Multi-level columns are
+        joined by ' | ' and the index (if named) is kept as columns
+        """
+        import pyarrow as pa
+        if any(name != None for name in df.index.names): df = df.reset_index()
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = [' | '.join([str(c) for c in col if str(c) != '']) for col in df.columns]
+        df.columns = [str(c) for c in df.columns]
+        self.__write(name, pa.Table.from_pandas(df, preserve_index=False))
+
+    def readTable(self, name: str, columns: list[str]|None = None, filters: list[tuple]|None = None) -> pd.DataFrame:
+        """
+        Reads the table. Only the `columns` (all, if `None`) and the rows matching the `filters`
+        (e.g. `[('LC', 'in', ['LC01', 'LC02'])]`, see `pyarrow.parquet.read_table`) are read
+        """
+        return self.__read(name, columns, filters)
+
+    def addCases(self, cases: pd.DataFrame | dict[str, dict[str, float]]):
+        """
+        Adds the parameters of the load cases: data frame with a 'LC' column (or the load case as index),
+        or dictionary with the load case as key and its parameters (dictionary) as value. The load case
+        is the file name without the extension, as in the results
+        """
+        if isinstance(cases, dict):
+            cases = pd.DataFrame([{'LC': LC, **params} for LC, params in cases.items()])
+        elif not 'LC' in cases.columns:
+            cases = cases.rename_axis('LC').reset_index()
+        cases = cases.copy()
+        cases['LC'] = [caseNameFromFile(str(LC)) for LC in cases['LC']]
+        self.addTable(self.casesTable, cases.set_index('LC'))
+
+    def addCaseList(self, caseListFile: str):
+        """Adds the parameters of the load cases from the list of cases generated by `GenLoadCases` (_CaseList.xlsx)"""
+        df = pd.read_excel(caseListFile, index_col=0)
+        df = df.drop(columns=[c for c in ['Hash'] if c in df.columns]).rename(columns={'File': 'LC'})
+        self.addCases(df)
+
+    def cases(self) -> pd.DataFrame:
+        """Parameters of the load cases, with the load case as index (latest parameters of each one)"""
+        df = self.__read(self.casesTable)
+        if df.empty: return df
+        return df.drop_duplicates('LC', keep='last').set_index('LC')
+
+    def __resultsSchema(self):
+        import pyarrow as pa
+        fields = [pa.field(c, pa.string()) for c in self.indexColumns]
+        fields += [pa.field(c, pa.float64()) for c in self.statColumns]
+        fields += [pa.field(c, pa.list_(pa.float64())) for c in self.historyColumns]
+        return pa.schema(fields)
+
+    def timeHistoryRecords(
+            self,
+            LC: str,
+            objName: str,
+            times: np.ndarray,
+            histories: dict[str, np.ndarray],
+            period: None|str|int|tuple[float,float] = None,
+            objectExtra: None|str|float = None,
+            static: dict[str, float]|None = None,
+            keepHistories: bool = True,
+            records: dict[str, list]|None = None
+            ) -> dict[str, list]:
+        """
+        Returns the records (column name as key) of the time history of each variable (name as key) 
+        of the object in the load case, to be written by `addRecords`
+        * LC: load case (file name; the extension is removed)
+        * period, objectExtra: definitions used to get the results (see `periodFromSpec` and `objectExtraFromSpec`)
+        * static: static value of each variable, if available
+        * keepHistories: if `False`, only the statistics are stored
+        * records: records to which the new ones are appended (e.g. to write several objects at once)
+        """
+        times = np.asarray(times, dtype=float)
+        if records == None: records = {c: [] for c in self.indexColumns + self.statColumns + self.historyColumns}
+        for varName, values in histories.items():
+            values = np.asarray(values, dtype=float)
+            iMax, iMin = int(np.argmax(values)), int(np.argmin(values))
+            row = {
+                'LC': caseNameFromFile(LC), 'Object': objName, 'Variable': varName,
+                'Period': periodLabel(period), 'ObjectExtra': None if objectExtra == None else str(objectExtra),
+                'Max': values[iMax], 'TimeOfMax': times[iMax], 'Min': values[iMin], 'TimeOfMin': times[iMin],
+                'Mean': values.mean(), 'Std': values.std(),
+                'Static': None if static == None else float(static[varName]),
+                'Time': times if keepHistories else None, 'Values': values if keepHistories else None}
+            for c, value in row.items(): records[c].append(value)
+        return records
+
+    def addRecords(self, records: dict[str, list]):
+        """Writes the result records (see `timeHistoryRecords`) as a new file of the results"""
+        import pyarrow as pa
+        self.__write(self.resultsTable, pa.Table.from_pydict(records, schema=self.__resultsSchema()))
+
+    def addTimeHistories(
+            self,
+            LC: str,
+            objName: str,
+            times: np.ndarray,
+            histories: dict[str, np.ndarray],
+            period: None|str|int|tuple[float,float] = None,
+            objectExtra: None|str|float = None,
+            static: dict[str, float]|None = None,
+            keepHistories: bool = True
+            ):
+        """Adds the time history of each variable (name as key) of the object in the load case (see `timeHistoryRecords`)"""
+        self.addRecords(self.timeHistoryRecords(
+            LC, objName, times, histories, period, objectExtra, static, keepHistories))
+
+    def resultFiles(self, LC: list[str]|None = None) -> dict[str, list[str]]:
+        """
+        Returns the files of the results of each load case (in the order they were written), reading
+        only the 'LC' column of each file, once. Used to read the results of many load cases one by one
+        (`query` with `files`), opening only the files of each load case instead of all files of the store
+        * LC: load cases (file names; the extension is removed); all if `None`
+        """
+        import pyarrow.parquet as pq
+        if LC != None: LC = set([caseNameFromFile(name) for name in LC])
+        filesByLC = {}
+        for file in self.__files(self.resultsTable):
+            for name in pq.read_table(file, columns=['LC']).column('LC').unique().to_pylist():
+                if LC == None or name in LC: filesByLC.setdefault(name, []).append(file)
+        return filesByLC
+
+    def query(
+            self,
+            LC: str|list[str]|None = None,
+            objName: str|list[str]|None = None,
+            variable: str|list[str]|None = None,
+            period: None|str|int|tuple[float,float]|list = None,
+            columns: list[str]|None = None,
+            cases: str|None = None,
+            withCases: bool = False,
+            files: list[str]|None = None
+            ) -> pd.DataFrame:
+        """
+        Returns the results (one row per load case, object, variable, period and object extra)
+        matching the inputs (`None` for all; a list for several values)
+        * columns: columns to be read besides the index ones; if `None`, the statistics
+        (the time histories, 'Time' and 'Values', are read only if requested)
+        * cases: condition on the parameters of the load cases (pandas query, see `addCases`),
+        e.g. "`Height(m)` > 5"
+        * withCases: if the parameters of the load cases are included as columns
+        * files: files of the results to be read (e.g. the ones of the load case, see `resultFiles`); all if `None`
+        """
+        if columns == None: columns = self.statColumns
+        filters = []
+        for column, value in [('LC', LC), ('Object', objName), ('Variable', variable)]:
+            if value == None: continue
+            if type(value) == list: filters.append((column, 'in', value))
+            else: filters.append((column, '=', value))
+        if period != None:
+            if type(period) == list: filters.append(('Period', 'in', [periodLabel(p) for p in period]))
+            else: filters.append(('Period', '=', periodLabel(period)))
+
+        caseParams = None
+        if cases != None or withCases:
+            caseParams = self.cases()
+            if cases != None:
+                selected = list(caseParams.query(cases).index)
+                if len(selected) == 0: 
+                    return pd.DataFrame(columns=self.indexColumns + columns)
+                filters.append(('LC', 'in', selected))
+
+        df = self.__read(self.resultsTable, self.indexColumns + [c for c in columns if not c in self.indexColumns], filters or None, files)
+        if withCases and not df.empty:
+            df = df.join(caseParams, on='LC')
+        return df
+
+    def timeHistory(
+            self,
+            LC: str,
+            objName: str,
+            variable: str,
+            period: None|str|int|tuple[float,float] = None,
+            objectExtra: None|str|float = None
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the sample times and the time history of the variable (latest one written)"""
+        filters = [
+            ('LC', '=', caseNameFromFile(LC)), ('Object', '=', objName),
+            ('Variable', '=', variable), ('Period', '=', periodLabel(period))]
+        df = self.__read(self.resultsTable, ['ObjectExtra'] + self.historyColumns, filters)
+        if objectExtra != None: df = df[df['ObjectExtra'] == str(objectExtra)]
+        if df.empty or df.iloc[-1]['Values'] is None:
+            raise Exception(f'Time history of "{variable}" of "{objName}" not found for the load case "{LC}".')
+        row = df.iloc[-1]
+        return np.asarray(row['Time']), np.asarray(row['Values'])
+
+    def toExcel(self, path: str, tables: list[str]|None = None, **queryArgs):
+        """
+        Writes an Excel file with a sheet for the load cases, a sheet for the statistics of the results
+        (`query` with `queryArgs` and the parameters of the cases) and a sheet for each other table (all, if `tables == None`)
+        """
+        if tables == None: tables = [t for t in self.tableNames() if not t in [self.casesTable, self.resultsTable]]
+        with pd.ExcelWriter(path) as writer:
+            cases = self.cases()
+            if not cases.empty: cases.to_excel(writer, sheet_name='Load cases')
+            results = self.query(**queryArgs)
+            if not results.empty: results.set_index(self.indexColumns).to_excel(writer, sheet_name='Results')
+            for name in tables:
+                self.readTable(name).to_excel(writer, sheet_name=name[:31], index=False)
+
+
+def resultStoreFrom(store: ResultStore|str|None) -> ResultStore|None:
+    """Returns the store from the store object or from its folder"""
+    if store == None or isinstance(store, ResultStore): return store
+    return ResultStore(store)
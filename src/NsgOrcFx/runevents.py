@@ -0,0 +1,228 @@
+"""
+Events emitted by `ProcMultiThread` along the batch run, and the built-in listeners
+(console output and throughput metrics)
+"""
+
+import math
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable
+import OrcFxAPI as orc
+from .failures import FailureRecord
+
+# event kinds
+eventKinds = ['started', 'progress', 'retrying', 'finished', 'failed', 'skipped']
+
+
+@dataclass
+class RunEvent:
+    kind: str                           # one of `eventKinds`
+    file: str                           # load case file name
+    worker: int                         # index of the worker (thread or process), -1 if not run
+    timeStamp: float = field(default_factory=time.time)
+    startTime: float|None = None        # start of the load case run (seconds since epoch)
+    output: str|None = None             # path of the simulation (.sim) file
+    percent: float|None = None          # 'progress': percentage of the simulation completed
+    simTime: float|None = None          # 'progress': simulation time reached
+    attempt: int = 1                    # attempt number (see `retries` of `ProcMultiThread`)
+    failure: FailureRecord|None = None  # 'retrying' and 'failed': failure record
+    results: dict|None = None           # 'finished': results of the post-processors
+
+    @property
+    def wallTime(self) -> float|None:
+        """Time (s) from the start of the load case to the event"""
+        if self.startTime == None: return None
+        return self.timeStamp - self.startTime
+
+    def __str__(self) -> str:
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.timeStamp))
+        s = f'{stamp} | worker {self.worker+1} | {self.kind} | {self.file}'
+        if self.kind == 'progress': s += f' | {self.percent:0.0f}%'
+        if self.kind in ['finished', 'failed'] and self.wallTime != None: s += f' | {self.wallTime:0.1f} s'
+        if self.failure != None: s += f' | {self.failure.category}: {self.failure.message}'
+        return s
+
+
+class EventDispatcher:
+    """
+    Calls each listener (function with the event as argument) with the run events, one event at
+    a time, so the listeners do not need to be thread-safe. An error in a listener is printed
+    and does not stop the run
+    """
+    def __init__(self, listeners: list[Callable[[RunEvent], Any]] = []):
+        self.listeners = list(listeners)
+        self.__lock = threading.Lock()
+
+    def add(self, listener: Callable[[RunEvent], Any]):
+        self.listeners.append(listener)
+
+    def __call__(self, event: RunEvent):
+        with self.__lock:
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as error:
+                    print(f'Error in the listener of the event "{event.kind}" of "{event.file}":', error, flush=True)
+
+
+class CaseProgressHandler:
+    """
+    Progress handler of a load case. Cancels the statics or the simulation when the wall-clock
+    time exceeds the timeout, keeps the latest simulation time reached and calls `onProgress`
+    with the percentage of the simulation completed, each `progressStep` percent
+    """
+    def __init__(
+            self,
+            timeout: float|None,
+            onProgress: Callable[[float, float], None]|None = None,
+            progressStep: float = 10.
+            ):
+        self.timeout = timeout
+        self.onProgress = onProgress
+        self.progressStep = progressStep
+        self.start = time.time()
+        self.timedOut = False
+        self.simTime: float|None = None
+        self.__nextPercent = progressStep
+
+    def __checkTimeout(self) -> bool:
+        if self.timeout != None and time.time() - self.start > self.timeout:
+            self.timedOut = True
+        return self.timedOut
+
+    def statics(self, model: orc.Model, progress: str) -> bool:
+        return self.__checkTimeout()
+
+    def dynamics(self, model: orc.Model, simTime: float, start: float, stop: float) -> bool:
+        self.simTime = simTime
+        if self.onProgress != None and stop > start:
+            percent = 100. * (simTime - start) / (stop - start)
+            if percent >= self.__nextPercent:
+                self.onProgress(percent, simTime)
+                while self.__nextPercent <= percent:
+                    self.__nextPercent += self.progressStep
+        return self.__checkTimeout()
+
+
+class BatchMetrics:
+    """
+    Listener of the run events that keeps the throughput of the batch: load cases per hour,
+    mean and 95th percentile of the load case duration, and estimated time to finish (ETA)
+    """
+    def __init__(self, nCases: int|None, start: float|None = None):
+        """
+        * nCases: number of load cases to be run; `None` if not known (e.g. shared 
+        queue with other computers), so the ETA is not estimated
+        """
+        self.nCases = nCases
+        if start == None: start = time.time()
+        self.start = start
+        self.nFinished = 0
+        self.nFailed = 0
+        self.nSkipped = 0
+        self.durations: list[float] = []
+
+    def __call__(self, event: RunEvent):
+        if event.kind == 'finished':
+            self.nFinished += 1
+        elif event.kind == 'failed':
+            self.nFailed += 1
+        elif event.kind == 'skipped':
+            self.nSkipped += 1
+            return
+        else:
+            return
+        if event.wallTime != None:
+            self.durations.append(event.wallTime)
+
+    @property
+    def nDone(self) -> int:
+        return self.nFinished + self.nFailed
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.start
+
+    @property
+    def casesPerHour(self) -> float|None:
+        if self.nDone == 0: return None
+        return self.nDone / self.elapsed * 3600
+
+    @property
+    def meanDuration(self) -> float|None:
+        if not self.durations: return None
+        return sum(self.durations) / len(self.durations)
+
+    @property
+    def p95Duration(self) -> float|None:
+        """95th percentile (nearest rank) of the load case durations"""
+        if not self.durations: return None
+        durations = sorted(self.durations)
+        return durations[math.ceil(0.95*len(durations)) - 1]
+
+    @property
+    def eta(self) -> float|None:
+        """Estimated time (s) to finish the remaining load cases, at the current throughput"""
+        if self.nDone == 0 or self.nCases == None: return None
+        return (self.nCases - self.nDone) * self.elapsed / self.nDone
+
+    def asDict(self) -> dict[str, Any]:
+        return {
+            'nCases': self.nCases, 'nFinished': self.nFinished, 'nFailed': self.nFailed,
+            'nSkipped': self.nSkipped, 'elapsed': self.elapsed, 'casesPerHour': self.casesPerHour,
+            'meanDuration': self.meanDuration, 'p95Duration': self.p95Duration, 'eta': self.eta}
+
+    def progressLine(self) -> str:
+        if self.nCases == None:
+            s = f'{self.nDone} LCs processed'
+        else:
+            percent = float(self.nDone)/max(1, self.nCases)*100
+            s = f'{self.nDone}/{self.nCases} LCs processed ({percent:0.1f}%)'
+        if self.casesPerHour != None:
+            s += f' | {self.casesPerHour:0.1f} LCs/hour'
+        if self.eta != None:
+            s += f' | ETA {formatDuration(self.eta)}'
+        return s + '.'
+
+    def summary(self) -> str:
+        rows = [
+            f'Elapsed time: {formatDuration(self.elapsed)}',
+            f'LCs completed: {self.nFinished} | with error: {self.nFailed} | skipped: {self.nSkipped}']
+        if self.casesPerHour != None:
+            rows.append(f'Throughput: {self.casesPerHour:0.1f} LCs/hour')
+        if self.durations:
+            rows.append(f'LC duration: mean {self.meanDuration:0.1f} s | p95 {self.p95Duration:0.1f} s')
+        return '\n'.join(rows)
+
+
+def formatDuration(seconds: float) -> str:
+    if seconds < 60: return f'{seconds:0.0f} s'
+    elif seconds < 3600: return f'{seconds/60:0.1f} min'
+    else: return f'{seconds/3600:0.1f} h'
+
+
+class ConsolePrinter:
+    """Listener of the run events that prints one line per event"""
+    def __init__(self, nWorkers: int, metrics: BatchMetrics|None = None, showProgress: bool = True):
+        self.nWorkers = nWorkers
+        self.metrics = metrics
+        self.showProgress = showProgress
+
+    def __call__(self, event: RunEvent):
+        if event.worker < 0: tag = 'Main'
+        else: tag = f'Proc {event.worker+1}/{self.nWorkers}'
+        if event.kind == 'started':
+            print(f'{tag}: running "{event.file}" ...', flush=True)
+        elif event.kind == 'progress':
+            if self.showProgress:
+                print(f'{tag}: "{event.file}" {event.percent:0.0f}% (t={event.simTime:0.1f} s)', flush=True)
+        elif event.kind == 'retrying':
+            print(f'{tag}: transient error in "{event.file}" ({event.failure.message}). Trying again...', flush=True)
+        elif event.kind == 'finished':
+            if event.wallTime == None: print(f'{tag}: "{event.file}" completed.', flush=True)
+            else: print(f'{tag}: "{event.file}" completed in {event.wallTime:0.1f} s.', flush=True)
+        elif event.kind == 'failed':
+            print(f'{tag}: "{event.file}" failed: {event.failure}', flush=True)
+        if event.kind in ['finished', 'failed'] and self.metrics != None:
+            print(self.metrics.progressLine(), flush=True)
@@ -0,0 +1,107 @@
+"""
+On-disk manifest (JSON lines) of the load cases run by `ProcMultiThread`
+"""
+
+import os
+import json
+import time
+import threading
+from dataclasses import asdict
+from .failures import FailureRecord
+from .runevents import RunEvent
+
+
+class RunManifest:
+    """
+    Records the state of each load case of a batch run, one JSON object per line:
+    * file: load case file name
+    * state: 'started', 'completed', 'error' or 'skipped'
+    * start, end: time stamps (seconds since epoch) of the start and end of the run
+    * wallTime: duration of the run (seconds)
+    * output: path of the simulation (.sim) file
+    * failure: for the 'error' state, the failure record (category, error type, message, 
+    simulation time reached, model state and number of attempts)
+
+    The file is only appended, so the latest record of each load case gives its state
+    """
+    defaultFileName = '_RunManifest.jsonl'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def __write(self, record: dict):
+        with self.__lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+
+    def started(self, file: str, output: str, start: float|None = None):
+        if start == None: start = time.time()
+        self.__write({
+            'file': file, 'state': 'started', 'start': start,
+            'end': None, 'wallTime': None, 'output': output})
+
+    def finished(
+            self,
+            file: str,
+            output: str,
+            success: bool,
+            start: float|None,
+            end: float|None = None,
+            failure: FailureRecord|None = None
+            ):
+        if end == None: end = time.time()
+        if success: state = 'completed'
+        else: state = 'error'
+        if start == None: wallTime = None
+        else: wallTime = end - start
+        record = {
+            'file': file, 'state': state, 'start': start,
+            'end': end, 'wallTime': wallTime, 'output': output}
+        if failure != None: record['failure'] = asdict(failure)
+        self.__write(record)
+
+    def skipped(self, file: str, output: str):
+        self.__write({
+            'file': file, 'state': 'skipped', 'start': None,
+            'end': None, 'wallTime': None, 'output': output})
+
+    def __call__(self, event: RunEvent):
+        """Records the run event (used as listener of `ProcMultiThread` events)"""
+        if event.kind == 'started':
+            self.started(event.file, event.output, event.startTime)
+        elif event.kind in ['finished', 'failed']:
+            self.finished(
+                event.file, event.output, event.kind == 'finished', 
+                event.startTime, event.timeStamp, event.failure)
+        elif event.kind == 'skipped':
+            self.skipped(event.file, event.output)
+
+    def records(self) -> list[dict]:
+        """Returns all the records in the manifest, in the order they were written"""
+        if not os.path.isfile(self.path): return []
+        recordList = []
+        with open(self.path) as f:
+            for row in f:
+                row = row.strip()
+                if row == '': continue
+                try:
+                    recordList.append(json.loads(row))
+                except json.JSONDecodeError:
+                    pass # line truncated by an interrupted run
+        return recordList
+
+    def latestStates(self) -> dict[str, dict]:
+        """Returns the latest record of each load case (file name as key)"""
+        states = {}
+        for record in self.records():
+            states[record['file']] = record
+        return states
+
+
+def isSimUpToDate(datFile: str, simFile: str) -> bool:
+    """Returns `True` if the simulation file exists and is newer than the data file"""
+    if not os.path.isfile(simFile): return False
+    if not os.path.isfile(datFile): return True
+    return os.path.getmtime(simFile) >= os.path.getmtime(datFile)
@@ -0,0 +1,182 @@
+"""
+Queue of load cases in a shared folder (e.g. network drive), from which the workers
+of `ProcMultiThread` running in several computers claim the load cases
+"""
+
+import os
+import json
+import time
+import socket
+import shutil
+import threading
+
+
+class SharedCaseQueue:
+    """
+    Work queue based on files in a shared folder:
+    * '_CaseOrder.json': list of load cases (file names) in the order they are run,
+    written once by the coordinator (the first worker, if not prepared by `PrepareSharedQueue`)
+    * 'claims/<file>.claim': created by the worker that takes the load case, with the host name,
+    process id and time. The creation is atomic (exclusive creation), so each load case
+    is run by a single worker, in any host
+    * 'done/<file>.done': created when the load case is finished, with its final state
+
+    The workers take the load cases with `get`, which returns `None` when there are no more
+    load cases to be claimed, as the sentinel of the local queue
+    """
+    defaultFolderName = '_Queue'
+    orderFileName = '_CaseOrder.json'
+
+    def __init__(self, folder: str, fileList: list[str]|None = None):
+        """
+        * folder: queue folder
+        * fileList: load cases that can be taken by this worker (e.g. the ones not completed
+        when resuming); if `None`, all the load cases of the queue
+        """
+        self.folder = folder
+        self.host = socket.gethostname()
+        if fileList == None: self.allowed = None
+        else: self.allowed = set(fileList)
+        self.__order: list[str]|None = None
+        self.__next = 0
+        self.__lock = threading.Lock() # the instance is shared by the threads of the workers
+
+    def __getstate__(self) -> dict:
+        # the lock is not picklable (e.g. queue passed to the worker processes), each process has its own
+        state = self.__dict__.copy()
+        del state['_SharedCaseQueue__lock']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    @property
+    def claimsFolder(self) -> str:
+        return os.path.join(self.folder, 'claims')
+
+    @property
+    def doneFolder(self) -> str:
+        return os.path.join(self.folder, 'done')
+
+    @property
+    def orderFile(self) -> str:
+        return os.path.join(self.folder, self.orderFileName)
+
+    def isCreated(self) -> bool:
+        return os.path.isfile(self.orderFile)
+
+    def reset(self):
+        """Removes the queue (order, claims and finished states), e.g. to run a new batch"""
+        if os.path.isdir(self.folder): shutil.rmtree(self.folder)
+        with self.__lock:
+            self.__order = None
+            self.__next = 0
+
+    def create(self, fileList: list[str], waitTime: float = 60.) -> list[str]:
+        """
+        Writes the order of the load cases, if not written yet by another worker or host,
+        and returns the order of the queue. Only the first caller writes it (exclusive creation
+        of a lock file), while the others wait for the file up to `waitTime` (seconds)
+        """
+        os.makedirs(self.claimsFolder, exist_ok=True)
+        os.makedirs(self.doneFolder, exist_ok=True)
+        if createExclusive(self.orderFile + '.lock', self.__claimInfo()):
+            tmpFile = f'{self.orderFile}.{self.host}.{os.getpid()}.tmp'
+            with open(tmpFile, 'w') as f:
+                json.dump(fileList, f)
+            os.replace(tmpFile, self.orderFile)
+        return self.order(waitTime)
+
+    def order(self, waitTime: float = 60.) -> list[str]:
+        """Returns the order of the load cases, waiting up to `waitTime` (seconds) for it to be written"""
+        if self.__order != None: return self.__order
+        start = time.time()
+        while not os.path.isfile(self.orderFile):
+            if time.time() - start > waitTime:
+                raise Exception(f'Order of the load cases not found in the queue folder "{self.folder}".')
+            time.sleep(0.5)
+        with open(self.orderFile) as f:
+            self.__order = json.load(f)
+        return self.__order
+
+    def __claimInfo(self) -> str:
+        return json.dumps({'host': self.host, 'pid': os.getpid(), 'time': time.time()})
+
+    def claimPath(self, file: str) -> str:
+        return os.path.join(self.claimsFolder, file + '.claim')
+
+    def donePath(self, file: str) -> str:
+        return os.path.join(self.doneFolder, file + '.done')
+
+    def claim(self, file: str) -> bool:
+        """Returns `True` if the load case was claimed by this worker"""
+        return createExclusive(self.claimPath(file), self.__claimInfo())
+
+    def get(self) -> str|None:
+        """Claims the next free load case and returns its file name, or `None` if there are no more"""
+        order = self.order()
+        with self.__lock:
+            while self.__next < len(order):
+                file = order[self.__next]
+                self.__next += 1
+                if self.allowed != None and not file in self.allowed: continue
+                if self.claim(file): return file
+        return None
+
+    def markDone(self, file: str, state: str):
+        """Records the final state ('completed' or 'error') of the load case"""
+        with open(self.donePath(file), 'w') as f:
+            f.write(json.dumps({'host': self.host, 'pid': os.getpid(), 'time': time.time(), 'state': state}))
+
+    def status(self) -> dict[str, list[str]]:
+        """
+        Returns the load cases of the queue in each state: 'pending' (not claimed),
+        'running' (claimed and not finished), 'completed' and 'error'
+        """
+        status = {'pending': [], 'running': [], 'completed': [], 'error': []}
+        for file in self.order():
+            if os.path.isfile(self.donePath(file)):
+                with open(self.donePath(file)) as f:
+                    try: state = json.load(f)['state']
+                    except json.JSONDecodeError: state = 'completed'
+                status[state].append(file)
+            elif os.path.isfile(self.claimPath(file)):
+                status['running'].append(file)
+            else:
+                status['pending'].append(file)
+        return status
+
+    def releaseClaims(self, host: str|None = None, errors: bool = False) -> list[str]:
+        """
+        Removes the claims of the load cases not finished (e.g. of a computer that stopped),
+        so they are taken again by the workers. Returns the released load cases
+        * host: if provided, only the claims of this host are released
+        * errors: if the load cases finished with error are also released
+        """
+        released = []
+        status = self.status()
+        files = status['running']
+        if errors: files = files + status['error']
+        for file in files:
+            try:
+                with open(self.claimPath(file)) as f:
+                    claimHost = json.load(f)['host']
+            except (OSError, json.JSONDecodeError):
+                claimHost = None
+            if host != None and claimHost != host: continue
+            if os.path.isfile(self.donePath(file)): os.remove(self.donePath(file))
+            os.remove(self.claimPath(file))
+            released.append(file)
+        return released
+
+
+def createExclusive(path: str, content: str) -> bool:
+    """Creates the file if it does not exist (atomic). Returns `False` if it already exists"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    return True
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+import numpy as np
 import OrcFxAPI as _ofx
 
 
@@ -17,6 +18,11 @@ class SNCurve:
     N_boundary: int = None         # number of cycles between the low and high cycle regions
     m2: float = None        # m for the hogh cycle region (N > N_boundary)
     log_a2: float = None    # log(a) for the hogh cycle region (N > N_boundary)
+    k: float = 0.           # thickness exponent (thickness correction factor (t/t_ref)^k)
+
+    def cycles(self, stressRange: np.ndarray) -> np.ndarray:
+        """Number of cycles to failure at the stress ranges (MPa)"""
+        return 10**snCurveLogCycles(curveParameters([self]), np.asarray(stressRange, dtype=float))[0]
 
     def setToAnalysis(
             self,
@@ -45,12 +51,129 @@ class SNCurve:
 
 
 # ==== Curves ==== #
-F3s = SNCurve('F3', 'seawater', 3.0, 11.146, 1e6, 5.0, 14.576)
+# DNV-RP-C203: curves (rows) with m1, log(a1), m2, log(a2) and thickness exponent k of each 
+# environment (air: Table 2-1; seawater with cathodic protection: Table 2-2; free corrosion: Table 2-4)
+snCurveNames = ['B1', 'B2', 'C', 'C1', 'C2', 'D', 'E', 'F', 'F1', 'F3', 'G', 'W1', 'W2', 'W3']
+snCurveEnvironments = ['air', 'seawater', 'free corrosion']
+snCurveBoundaries = {'air': 1e7, 'seawater': 1e6, 'free corrosion': None} # number of cycles of the slope change
+snCurveTables = {
+    'air': np.array([
+        [4., 15.117, 5., 17.146, 0.  ],
+        [4., 14.885, 5., 16.856, 0.  ],
+        [3., 12.592, 5., 16.320, 0.05],
+        [3., 12.449, 5., 16.081, 0.10],
+        [3., 12.301, 5., 15.835, 0.15],
+        [3., 12.164, 5., 15.606, 0.20],
+        [3., 12.010, 5., 15.350, 0.20],
+        [3., 11.855, 5., 15.091, 0.25],
+        [3., 11.699, 5., 14.832, 0.25],
+        [3., 11.546, 5., 14.576, 0.25],
+        [3., 11.398, 5., 14.330, 0.25],
+        [3., 11.261, 5., 14.101, 0.25],
+        [3., 11.107, 5., 13.845, 0.25],
+        [3., 10.970, 5., 13.617, 0.25]]),
+    'seawater': np.array([
+        [4., 14.917, 5., 17.146, 0.  ],
+        [4., 14.685, 5., 16.856, 0.  ],
+        [3., 12.192, 5., 16.320, 0.05],
+        [3., 12.049, 5., 16.081, 0.10],
+        [3., 11.901, 5., 15.835, 0.15],
+        [3., 11.764, 5., 15.606, 0.20],
+        [3., 11.610, 5., 15.350, 0.20],
+        [3., 11.455, 5., 15.091, 0.25],
+        [3., 11.299, 5., 14.832, 0.25],
+        [3., 11.146, 5., 14.576, 0.25],
+        [3., 10.998, 5., 14.330, 0.25],
+        [3., 10.861, 5., 14.101, 0.25],
+        [3., 10.707, 5., 13.845, 0.25],
+        [3., 10.570, 5., 13.617, 0.25]]),
+    'free corrosion': np.array([ # single slope
+        [3., 12.436, np.nan, np.nan, 0.  ],
+        [3., 12.262, np.nan, np.nan, 0.  ],
+        [3., 12.115, np.nan, np.nan, 0.05],
+        [3., 11.972, np.nan, np.nan, 0.10],
+        [3., 11.824, np.nan, np.nan, 0.15],
+        [3., 11.687, np.nan, np.nan, 0.20],
+        [3., 11.533, np.nan, np.nan, 0.20],
+        [3., 11.378, np.nan, np.nan, 0.25],
+        [3., 11.222, np.nan, np.nan, 0.25],
+        [3., 11.068, np.nan, np.nan, 0.25],
+        [3., 10.921, np.nan, np.nan, 0.25],
+        [3., 10.784, np.nan, np.nan, 0.25],
+        [3., 10.630, np.nan, np.nan, 0.25],
+        [3., 10.493, np.nan, np.nan, 0.25]]),
+    }
+
+F3s = SNCurve('F3', 'seawater', 3.0, 11.146, 1e6, 5.0, 14.576, 0.25)
 
 
 # ==== Selection function ==== #
 def selectSNCurveByName(name: str, environment: str) -> SNCurve:
-    """Name (e.g, 'F1') and environment ('air' or 'seawater')"""
-    if name == 'F3' and environment == 'seawater': return F3s
-    else:
+    """Name (e.g, 'F1') and environment ('air', 'seawater' or 'free corrosion')"""
+    if not name in snCurveNames or not environment in snCurveEnvironments:
         raise Exception(f'Curve {name} in {environment} not available.')
+    m1, log_a1, m2, log_a2, k = snCurveTables[environment][snCurveNames.index(name)].tolist()
+    if snCurveBoundaries[environment] == None:
+        return SNCurve(name, environment, m1, log_a1, k=k)
+    return SNCurve(name, environment, m1, log_a1, snCurveBoundaries[environment], m2, log_a2, k)
+
+def selectSNCurves(
+        names: list[str]|None = None, 
+        environments: list[str]|None = None
+        ) -> list[SNCurve]:
+    """
+    S-N curves of the library (DNV-RP-C203) with the names (e.g. ['D', 'F3']) in the environments 
+    ('air', 'seawater' or 'free corrosion'); all names or environments if `None`
+    """
+    if names == None: names = snCurveNames
+    if environments == None: environments = snCurveEnvironments
+    return [selectSNCurveByName(name, env) for env in environments for name in names]
+
+
+# ==== Damage ==== #
+def curveParameters(curves: list[SNCurve]) -> np.ndarray:
+    """
+    Parameters of the curves (rows) as an array with m1, log(a1), log(N_boundary), m2 and log(a2); 
+    the single slope curves have an infinite boundary
+    """
+    params = np.empty((len(curves), 5))
+    for i, c in enumerate(curves):
+        if c.m2 == None: params[i] = [c.m1, c.log_a1, np.inf, c.m1, c.log_a1]
+        else: params[i] = [c.m1, c.log_a1, np.log10(c.N_boundary), c.m2, c.log_a2]
+    return params
+
+def snCurveLogCycles(params: np.ndarray, stressRange: np.ndarray) -> np.ndarray:
+    """
+    Logarithm of the number of cycles to failure of each curve (rows of `curveParameters`) at the 
+    stress ranges (MPa), with the shape (curves, *stress ranges shape)
+    """
+    m1, log_a1, log_Nb, m2, log_a2 = (p.reshape(-1, *[1]*np.ndim(stressRange)) for p in params.T)
+    with np.errstate(divide='ignore'):
+        logS = np.log10(stressRange)
+    logN = log_a1 - m1 * logS
+    return np.where(logN <= log_Nb, logN, log_a2 - m2 * logS)
+
+def minerDamage(
+        stressRanges: np.ndarray,
+        counts: np.ndarray,
+        curves: SNCurve|list[SNCurve],
+        factors: float|np.ndarray = 1.
+        ) -> np.ndarray:
+    """
+    Miner's sum of the cycles (last axis, e.g. histogram bins of each node x theta) against each
+    curve and each stress factor (e.g. SCF x thickness factor combinations), at once
+    * stressRanges: stress ranges (MPa), e.g. the bin centers (broadcast with `counts`)
+    * counts: number of cycles of each stress range
+    * curves: S-N curves (see `selectSNCurves`)
+    * factors: factors applied to the stress ranges (array of combinations, e.g. SCF x thickness factor)
+    \nReturns the damage with the shape (curves, *factors shape, *series shape)
+    """
+    if isinstance(curves, SNCurve): curves = [curves]
+    stressRanges, counts = np.broadcast_arrays(np.asarray(stressRanges, dtype=float), np.asarray(counts, dtype=float))
+    factors = np.asarray(factors, dtype=float)
+    S = factors.reshape(*factors.shape, *[1]*stressRanges.ndim) * stressRanges # (*factors, *series, cycles)
+    params = curveParameters(curves)
+    damage = np.empty((len(curves), *S.shape[:-1]))
+    for i in range(len(curves)): # one curve at a time, limiting the memory to factors x series x cycles
+        damage[i] = np.sum(counts * 10**(-snCurveLogCycles(params[i:i+1], S)[0]), axis=-1)
+    return damage
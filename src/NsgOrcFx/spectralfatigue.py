@@ -0,0 +1,147 @@
+"""
+Spectral (frequency-domain) fatigue damage from stress power spectral densities (PSD), by the
+narrow-band, Dirlik and Tovo-Benasciutti methods, for many series (e.g. nodes x thetas) at once
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+from scipy.integrate import trapezoid
+from .sncurves import SNCurve, minerDamage
+
+spectralMethods = ['narrow-band', 'dirlik', 'tovo-benasciutti']
+
+# grid of the normalized stress range Z = S/(2*sqrt(m0)) for the integration of the range distributions
+__zMax = 60.
+__nZ = 3001
+
+
+def StressPSD(
+        stress: np.ndarray,
+        time_step: float,
+        nperseg: int|None = None
+        ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    One-sided PSD (Welch method) of the stress time histories in the last axis of the array
+    (e.g. nodes x thetas x samples, see `StressTimeHistories`)
+    * time_step: time step of the samples (s)
+    * nperseg: samples per segment; the smaller of the number of samples and 2048 if `None`
+    \nReturns the frequencies (Hz) and the PSD (series shape x frequencies)
+    """
+    stress = np.asarray(stress, dtype=float)
+    if nperseg == None: nperseg = min(stress.shape[-1], 2048)
+    return signal.welch(stress, fs=1./time_step, nperseg=nperseg, axis=-1)
+
+def ModalStressPSD(
+        stress_shapes: np.ndarray,
+        modal_spectra: np.ndarray,
+        shapes_as_ranges: bool = True
+        ) -> np.ndarray:
+    """
+    Stress PSD of a response combined from the modes (uncorrelated, e.g. well separated frequencies)
+    * stress_shapes: stress of each mode (rows) at each series (e.g. arc lengths), per unit of the modal
+    amplitude, e.g. from `Modes.StressShapes`
+    * modal_spectra: one-sided PSD of the amplitude of each mode (modes x frequencies)
+    * shapes_as_ranges: if the shapes are stress ranges (as `Modes.StressShape`), i.e. twice the amplitude
+    \nReturns the PSD (series shape x frequencies)
+    """
+    shapes = np.asarray(stress_shapes, dtype=float)
+    if shapes_as_ranges: shapes = shapes / 2.
+    return np.einsum('m...,mf->...f', shapes**2, np.asarray(modal_spectra, dtype=float))
+
+def SpectralMoments(
+        freqs: np.ndarray,
+        psd: np.ndarray,
+        orders: list[int] = [0, 1, 2, 4]
+        ) -> np.ndarray:
+    """Spectral moments (frequency in Hz) of the PSD (last axis), with the shape (orders, *series shape)"""
+    freqs = np.asarray(freqs, dtype=float)
+    psd = np.asarray(psd, dtype=float)
+    return np.stack([trapezoid(freqs**k * psd, freqs, axis=-1) for k in orders])
+
+def __cycleRateDensity(moments: np.ndarray, method: str, z: np.ndarray) -> np.ndarray:
+    """
+    Cycles per second and per unit of the normalized range Z = S/(2*sqrt(m0)) of each series,
+    from the moments 0, 1, 2 and 4
+    """
+    m0, m1, m2, m4 = (m[..., None] for m in moments)
+    nu0 = np.sqrt(m2 / m0)   # mean upcrossing rate
+    nuP = np.sqrt(m4 / m2)   # rate of peaks
+    alpha1 = m1 / np.sqrt(m0 * m2)
+    alpha2 = m2 / np.sqrt(m0 * m4)
+    rayleigh = z * np.exp(-z**2 / 2)
+
+    if method == 'narrow-band':
+        return nu0 * rayleigh
+
+    elif method == 'dirlik':
+        xm = m1 / m0 * np.sqrt(m2 / m4)
+        D1 = 2 * (xm - alpha2**2) / (1 + alpha2**2)
+        R = (alpha2 - xm - D1**2) / (1 - alpha2 - D1 + D1**2)
+        D2 = (1 - alpha2 - D1 + D1**2) / (1 - R)
+        D3 = 1 - D1 - D2
+        Q = 1.25 * (alpha2 - D3 - D2 * R) / D1
+        density = (
+            np.nan_to_num(D1 / Q * np.exp(-z / Q)) +
+            np.nan_to_num(D2 * z / R**2 * np.exp(-z**2 / (2 * R**2))) +
+            D3 * rayleigh)
+        return nuP * density
+
+    elif method == 'tovo-benasciutti':
+        # weighted narrow-band and range-counting (Rayleigh ranges with variance alpha2^2.m0, at the rate of peaks)
+        b = (alpha1 - alpha2) * (
+            1.112 * (1 + alpha1 * alpha2 - (alpha1 + alpha2)) * np.exp(2.11 * alpha2) + (alpha1 - alpha2)
+            ) / (alpha2 - 1)**2
+        b = np.clip(np.nan_to_num(b, nan=1.), 0., 1.)
+        rangeCounting = z / alpha2**2 * np.exp(-z**2 / (2 * alpha2**2))
+        return b * nu0 * rayleigh + (1 - b) * nuP * rangeCounting
+
+    else:
+        raise Exception(f'Spectral method "{method}" not supported. Options: {spectralMethods}.')
+
+def SpectralDamage(
+        freqs: np.ndarray,
+        psd: np.ndarray,
+        duration: float,
+        curves: SNCurve|list[SNCurve],
+        factors: float|np.ndarray = 1.,
+        method: str = 'dirlik'
+        ) -> np.ndarray:
+    """
+    Fatigue damage, in the duration, from the stress PSD (last axis, stress in MPa) of each series
+    (e.g. nodes x thetas), against each S-N curve and each stress factor (see `minerDamage`), at once
+    * freqs: frequencies (Hz) of the PSD
+    * psd: one-sided stress PSD (series shape x frequencies), e.g. from `StressPSD` or `ModalStressPSD`
+    * duration: exposure time (s)
+    * curves: S-N curves (see `selectSNCurves`); bilinear curves are integrated with both slopes
+    * factors: factors applied to the stress ranges (array of combinations, e.g. SCF x thickness factor)
+    * method: 'narrow-band', 'dirlik' or 'tovo-benasciutti'
+    \nReturns the damage with the shape (curves, *factors shape, *series shape)
+    """
+    if not method in spectralMethods:
+        raise Exception(f'Spectral method "{method}" not supported. Options: {spectralMethods}.')
+    moments = SpectralMoments(freqs, psd)
+    z = np.linspace(0., __zMax, __nZ)
+    weights = np.full(__nZ, z[1] - z[0])
+    weights[[0, -1]] /= 2 # trapezoidal rule
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        counts = np.nan_to_num(duration * __cycleRateDensity(moments, method, z) * weights) # series without stress: 0
+    stressRanges = 2 * np.sqrt(moments[0])[..., None] * z
+    return minerDamage(stressRanges, counts, curves, factors)
+
+def SpectralFatigueTable(
+        arc_lengths: list[float]|np.ndarray,
+        damage: np.ndarray,
+        duration: float
+        ) -> pd.DataFrame:
+    """
+    Table of the arc length, damage and life of each node, as `FatigueAnalysis.getArcLengthDamageLifeListAsDF`
+    * damage: damage of each node (rows) and theta (e.g. `SpectralDamage` of one curve and factor)
+    * duration: exposure time (s) of the damage
+    """
+    secsPerYear = 365.25*24*3600
+    damage = np.asarray(damage, dtype=float).reshape(len(arc_lengths), -1).max(axis=1) # max around the circumference
+    with np.errstate(divide='ignore'):
+        life = duration / damage / secsPerYear
+    cols = ['Arc length (m)', 'Damage', 'Life (years)']
+    return pd.DataFrame({c: v for c, v in zip(cols, [np.asarray(arc_lengths), damage, life])})
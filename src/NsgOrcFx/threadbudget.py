@@ -0,0 +1,86 @@
+"""
+Split of a core budget between concurrent models and the internal threads of each model
+"""
+
+import os
+import math
+from dataclasses import dataclass
+
+threadPolicies = ['auto', 'throughput', 'balanced', 'latency']
+
+
+@dataclass
+class ThreadBudget:
+    nWorkers: int           # number of models simulated at the same time
+    modelThreads: int       # number of threads of each model (OrcaFlex `threadCount`)
+
+    @property
+    def totalThreads(self) -> int:
+        return self.nWorkers * self.modelThreads
+
+    def __str__(self) -> str:
+        return f'{self.nWorkers} model(s) x {self.modelThreads} thread(s)'
+
+
+def defaultCoreBudget() -> int:
+    """Number of computer cores minus 1 (at least 1)"""
+    return max(1, os.cpu_count()-1)
+
+def ThreadBudgetFromPolicy(
+        policy: str|int,
+        coreBudget: int,
+        nCases: int|None = None
+        ) -> ThreadBudget:
+    """
+    Returns the split of the core budget for the given policy
+    * policy:
+        - 'throughput': many single-threaded models (one per core)
+        - 'latency': a single model using all the cores
+        - 'balanced': about sqrt(cores) models with sqrt(cores) threads each
+        - 'auto': 'throughput' if there are at least as many cases as cores;
+        otherwise one model per case, sharing the remaining cores
+        - an integer: number of threads of each model
+    * coreBudget: total number of cores to be used
+    * nCases: number of load cases to be run (required by 'auto')
+    """
+    coreBudget = max(1, coreBudget)
+    if type(policy) == int:
+        modelThreads = min(max(1, policy), coreBudget)
+    elif policy == 'throughput':
+        modelThreads = 1
+    elif policy == 'latency':
+        modelThreads = coreBudget
+    elif policy == 'balanced':
+        modelThreads = max(1, int(math.sqrt(coreBudget)))
+    elif policy == 'auto':
+        if nCases == None or nCases >= coreBudget:
+            modelThreads = 1
+        else:
+            nWorkers = max(1, nCases)
+            return ThreadBudget(nWorkers, max(1, coreBudget // nWorkers))
+    else:
+        raise Exception(f'Thread policy "{policy}" not recognized. Use one of {threadPolicies} or an integer.')
+
+    return ThreadBudget(max(1, coreBudget // modelThreads), modelThreads)
+
+def resolveThreadBudget(
+        nCases: int|None,
+        coreBudget: int|None = None,
+        policy: str|int = 'auto',
+        nWorkers: int|None = None,
+        modelThreads: int|None = None
+        ) -> ThreadBudget:
+    """
+    Returns the thread budget, giving priority to the values set by the user
+    (`nWorkers` and/or `modelThreads`) over the `policy`
+    """
+    if not coreBudget: coreBudget = defaultCoreBudget()
+
+    if nWorkers and modelThreads:
+        return ThreadBudget(nWorkers, modelThreads)
+    elif nWorkers:
+        return ThreadBudget(nWorkers, max(1, coreBudget // nWorkers))
+    elif modelThreads:
+        return ThreadBudget(max(1, coreBudget // modelThreads), modelThreads)
+    else:
+        return ThreadBudgetFromPolicy(policy, coreBudget, nCases)
@@ -0,0 +1,132 @@
+"""
+Compact load case files: a base model and, for each case, a small text file with the data changed
+"""
+
+import os
+import json
+import threading
+from typing import Any
+import OrcFxAPI as orc
+from .auxfuncs import isRegularWave
+
+baseModelFileName = '_BaseModel.dat'
+variationExtension = '.var.yml'
+
+# data of each wave train recorded in the variation files (the ones not applicable to the wave type are skipped)
+waveTrainDataNames = [
+    'WaveType', 'WaveDirection', 'WaveTimeOrigin', 'WaveHeight', 'WavePeriod', 'WaveHs', 'WaveTp', 'WaveGamma']
+
+__baseDataCache: dict[str, tuple[float, bytes]] = {}
+__cacheLock = threading.Lock()
+
+
+def caseNameFromFile(file: str) -> str:
+    """Returns the load case name, without the extension of the data (.dat) or variation (.var.yml) file"""
+    if file.endswith(variationExtension): return file[:-len(variationExtension)]
+    return os.path.splitext(file)[0]
+
+def isVariationFile(file: str) -> bool:
+    return file.endswith(variationExtension)
+
+def __tryGetData(obj: Any, dataName: str) -> tuple[bool, Any]:
+    try:
+        return True, getattr(obj, dataName)
+    except Exception:
+        return False, None # data not available (e.g., wave height of irregular waves)
+
+def __isGammaSpecified(env: Any) -> bool:
+    """If the gamma of the selected wave train is set by the user (JONSWAP spectrum, not computed automatically)"""
+    if env.WaveType != 'JONSWAP': return False
+    available, parameters = __tryGetData(env, 'WaveJONSWAPParameters')
+    return available and parameters in ['Partially specified', 'Fully specified']
+
+def GetLoadCaseVariation(model: orc.Model) -> list[list]:
+    """
+    Returns the environment and stage data set for a load case (see `GenLoadCases`),
+    as a list of [object name, data name, index, value], where the index is `None` for
+    non-indexed data. The wave train data follow the selection of each wave train
+    """
+    variation = []
+    env = model.environment
+    selected = env.SelectedWaveTrainIndex
+    for i in range(env.NumberOfWaveTrains):
+        env.SelectedWaveTrainIndex = i
+        variation.append(['Environment', 'SelectedWaveTrainIndex', None, i])
+        regular = isRegularWave(env.WaveType)
+        for dataName in waveTrainDataNames:
+            if regular and dataName in ['WaveHs', 'WaveTp', 'WaveGamma']: continue
+            if not regular and dataName in ['WaveHeight', 'WavePeriod']: continue
+            if dataName == 'WaveGamma' and not __isGammaSpecified(env): continue
+            available, value = __tryGetData(env, dataName)
+            if available: variation.append(['Environment', dataName, None, value])
+    env.SelectedWaveTrainIndex = selected
+    variation.append(['Environment', 'SelectedWaveTrainIndex', None, selected])
+
+    for dataName in ['WavePreviewPositionX', 'WavePreviewPositionY']:
+        available, value = __tryGetData(env, dataName)
+        if available: variation.append(['Environment', dataName, None, value])
+
+    for j, duration in enumerate(model.general.StageDuration):
+        variation.append(['General', 'StageDuration', j, duration])
+    return variation
+
+def ApplyVariation(model: orc.Model, variation: list[list]):
+    """
+    Sets the data of the variation (list of [object name, data name, index, value]) in the model. 
+    The gamma of a wave train whose spectral parameters are computed automatically is not set
+    """
+    for objName, dataName, index, value in variation:
+        obj = model[objName]
+        if dataName == 'WaveGamma' and not __isGammaSpecified(obj): continue
+        if index == None:
+            setattr(obj, dataName, value)
+        else:
+            getattr(obj, dataName)[index] = value
+
+def WriteVariationFile(path: str, baseFile: str, variation: list[list]):
+    """
+    Writes the variation file (YAML), with the base model file (relative to the variation file)
+    and one data item per row, as [object name, data name, index, value]
+    """
+    rows = [
+        '# NsgOrcFx load case variation: data changed from the base file, as [object, data name, index, value]',
+        f'BaseFile: {json.dumps(baseFile)}',
+        'Variation:']
+    for item in variation:
+        rows.append(f'  - {json.dumps(item)}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(rows) + '\n')
+
+def ReadVariationFile(path: str) -> tuple[str, list[list]]:
+    """Returns the path of the base model file and the variation (see `WriteVariationFile`)"""
+    baseFile = None
+    variation = []
+    with open(path) as f:
+        for row in f:
+            row = row.strip()
+            if row.startswith('BaseFile:'):
+                baseFile = json.loads(row[len('BaseFile:'):].strip())
+            elif row.startswith('- '):
+                variation.append(json.loads(row[2:]))
+    if baseFile == None:
+        raise Exception(f'Base file not defined in the variation file "{path}".')
+    return os.path.join(os.path.dirname(path), baseFile), variation
+
+def __baseData(baseFile: str) -> bytes:
+    """Data of the base model, loaded once per process (reloaded if the file changes)"""
+    mtime = os.path.getmtime(baseFile)
+    with __cacheLock:
+        cached = __baseDataCache.get(baseFile)
+    if cached != None and cached[0] == mtime:
+        return cached[1]
+    model = orc.Model(baseFile)
+    data = model.SaveDataMem()
+    with __cacheLock:
+        __baseDataCache[baseFile] = (mtime, data)
+    return data
+
+def LoadVariationFile(model: orc.Model, path: str):
+    """Loads the base model (cached in memory) into the model and applies the variation of the file"""
+    baseFile, variation = ReadVariationFile(path)
+    model.LoadDataMem(__baseData(baseFile))
+    ApplyVariation(model, variation)
@@ -362,6 +362,7 @@ class VesselResponseList(dict[str, VesselResponses]):
             stormDuration: float = 3.0,
             northDir: float|None = None,
             waveTrainIndex: int|None = None,
+            store: 'ResultStore|str|None' = None
             ):
         """
         Process extreme responses for the vessel.
@@ -377,6 +378,8 @@ class VesselResponseList(dict[str, VesselResponses]):
         * northDir: North direction from the x-axis, as defined by the OrcaFlex convention.
             If None, use the model definition.
         * waveTrainIndex: index of the wave train to use. If None, use the model definition.
+        * store: result store (`ResultStore` or its folder) to which the results are also written 
+            (table 'VesselResponses'). Requires `pyarrow`.
         """
 
         if waveTrainIndex is not None:
@@ -445,4 +448,8 @@ class VesselResponseList(dict[str, VesselResponses]):
         # export results to excel
         print(f'Exporting results to Excel file: "{outFile}" ...', end='', flush=True)
         self.to_excel(outFile, waveDirsHsTp.keys())
-        print(' done.')
\ No newline at end of file
+        print(' done.')
+
+        if store is not None:
+            from .resultstore import resultStoreFrom
+            resultStoreFrom(store).addTable('VesselResponses', self.all_results_to_df())
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Persistent cache of the largest rise and fall times found by the wave search (see `GetLargestRiseAndFall`)
+"""
+
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+import numpy as np
+import OrcFxAPI as orc
+from . import constants
+
+
+class WaveSearchCache:
+    """
+    On-disk (SQLite) cache of the time of the largest rise and fall of the wave search,
+    with the wave search key (see `WaveSearchKey`) as key. When the number of entries
+    exceeds `maxEntries`, the least recently used ones are removed. The file may be
+    shared by several processes and projects
+    """
+    defaultMaxEntries = 100000
+
+    def __init__(self, path: str, maxEntries: int = defaultMaxEntries):
+        self.path = path
+        self.maxEntries = maxEntries
+        with self.__connect() as db, db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS WaveSearch ' + \
+                '(Key TEXT PRIMARY KEY, TimeOfRise REAL, TimeOfFall REAL, LastUsed REAL)')
+
+    def __connect(self) -> closing[sqlite3.Connection]:
+        """Connection closed at the end of the `with` block (`with self.__connect() as db, db:` also commits)"""
+        return closing(sqlite3.connect(self.path, timeout=60.))
+
+    def get(self, key: str) -> tuple[float, float]|None:
+        """Returns the time of the largest rise and fall, or `None` if not in the cache"""
+        with self.__connect() as db, db:
+            row = db.execute('SELECT TimeOfRise, TimeOfFall FROM WaveSearch WHERE Key = ?', (key,)).fetchone()
+            if row == None: return None
+            db.execute('UPDATE WaveSearch SET LastUsed = ? WHERE Key = ?', (time.time(), key))
+        return row[0], row[1]
+
+    def put(self, key: str, timeOfRise: float, timeOfFall: float):
+        with self.__connect() as db, db:
+            db.execute(
+                'INSERT OR REPLACE INTO WaveSearch VALUES (?, ?, ?, ?)',
+                (key, timeOfRise, timeOfFall, time.time()))
+            nEntries = db.execute('SELECT COUNT(*) FROM WaveSearch').fetchone()[0]
+            if nEntries > self.maxEntries:
+                # removes 10% more than the excess, so the eviction is not done for each new entry
+                nRemove = nEntries - self.maxEntries + self.maxEntries // 10
+                db.execute(
+                    'DELETE FROM WaveSearch WHERE Key IN ' + \
+                    '(SELECT Key FROM WaveSearch ORDER BY LastUsed LIMIT ?)', (nRemove,))
+
+    def __len__(self) -> int:
+        with self.__connect() as db, db:
+            return db.execute('SELECT COUNT(*) FROM WaveSearch').fetchone()[0]
+
+    def clear(self):
+        with self.__connect() as db, db:
+            db.execute('DELETE FROM WaveSearch')
+
+
+class WaveSearchMemoryCache(dict):
+    """
+    In-memory cache of the wave search results, with the interface of `WaveSearchCache`
+    (e.g. the results of the load cases searched at once by `GenLoadCases`)
+    """
+    def put(self, key: str, timeOfRise: float, timeOfFall: float):
+        self[key] = (timeOfRise, timeOfFall)
+
+
+def waveSearchCacheFrom(cache: WaveSearchCache|WaveSearchMemoryCache|str|None) -> WaveSearchCache|WaveSearchMemoryCache|None:
+    """Returns the cache from the cache object or from the path of its file"""
+    if cache == None or isinstance(cache, (WaveSearchCache, WaveSearchMemoryCache)): return cache
+    return WaveSearchCache(cache)
+
+def __tryGetData(obj, dataName: str):
+    try:
+        return getattr(obj, dataName)
+    except Exception:
+        return None # data not available for the wave type
+
+def WaveSearchKey(model: orc.Model, waveSearchDuration: float, engine: str = 'spreadsheet') -> str:
+    """
+    Returns the key (hash) of the wave search, based on the wave components of all wave trains
+    (frequency, amplitude and phase lag with respect to the simulation time), the search
+    duration and position. When the search is at the origin, the elevation does not depend
+    on the wave direction, so the same sea state in different directions has the same key.
+    Regular waves are identified by their type, height, period, direction and time origin.
+    The results of each engine (see `GetLargestRiseAndFall`) have different keys
+    """
+    env = model.environment
+    position = [env.WavePreviewPositionX, env.WavePreviewPositionY]
+    atOrigin = position == [0., 0.]
+
+    regularWaves = []
+    selected = env.SelectedWaveTrainIndex
+    for i in range(env.NumberOfWaveTrains):
+        env.SelectedWaveTrainIndex = i
+        if env.WaveType in constants.regularWaveTypes:
+            regularWaves.append([
+                env.WaveType, env.WaveHeight, env.WavePeriod,
+                None if atOrigin else __tryGetData(env, 'WaveDirection'), env.WaveTimeOrigin])
+    env.SelectedWaveTrainIndex = selected
+
+    components = []
+    for c in env.waveComponents:
+        row = [c.Frequency, c.Amplitude, c.PhaseLagWrtSimulationTime]
+        if not atOrigin: row += [c.Direction, c.WaveNumber]
+        components.append(row)
+
+    content = {
+        'components': np.round(np.array(components, dtype=float), 9).tolist(),
+        'regularWaves': regularWaves,
+        'duration': waveSearchDuration,
+        'position': None if atOrigin else position,
+        }
+    if engine != 'spreadsheet': content['engine'] = engine
+    return hashlib.sha256(json.dumps(content, default=str).encode()).hexdigest()
+
+
+# engines of the search of the largest rise and fall (see `GetLargestRiseAndFall`)
+waveSearchEngines = ['spreadsheet', 'numpy']
+
+def WaveComponentTable(model: orc.Model) -> np.ndarray:
+    """
+    Returns the wave components of all wave trains of the model as an array with one row per
+    component and the columns: frequency (Hz), amplitude, phase lag with respect to the
+    simulation time (deg), direction (deg) and wave number (rad/length)
+    """
+    env = model.environment
+    selected = env.SelectedWaveTrainIndex
+    for i in range(env.NumberOfWaveTrains):
+        env.SelectedWaveTrainIndex = i
+        if env.WaveType in constants.regularWaveTypes and env.WaveType != 'Airy':
+            env.SelectedWaveTrainIndex = selected
+            raise Exception(
+                f'Wave type {env.WaveType} (wave train {i+1}) is not represented by wave components. ' + \
+                'Use the "spreadsheet" engine for the wave search.')
+    env.SelectedWaveTrainIndex = selected
+    return np.array(
+        [[c.Frequency, c.Amplitude, c.PhaseLagWrtSimulationTime, c.Direction, c.WaveNumber]
+        for c in env.waveComponents], dtype=float)
+
+def __stackTables(tables: list[np.ndarray]) -> np.ndarray:
+    """Tables of several sea states in a 3D array (sea state, component, column), padded with null components"""
+    nComponents = max(len(table) for table in tables)
+    stacked = np.zeros((len(tables), nComponents, 5))
+    for i, table in enumerate(tables):
+        stacked[i, :len(table)] = table
+    return stacked
+
+def ElevationHistory(
+        tables: np.ndarray | list[np.ndarray],
+        start: float,
+        timeStep: float,
+        nTimes: int,
+        position: list[float] = [0., 0.]
+        ) -> np.ndarray:
+    """
+    Returns the sea surface elevation (linear superposition of the wave components) at the
+    position, for each sea state (row) at the times `start + i*timeStep`, i = 0 ... nTimes-1 (column).
+    The times are split in blocks, t = tBlock + tau, so exp(i w t) = exp(i w tBlock) exp(i w tau) and 
+    the elevation of all the blocks is a single (batched) matrix product, with the trigonometric 
+    functions evaluated only for the block start times and the offsets inside a block
+    * tables: wave component table (see `WaveComponentTable`) or list of tables (one per sea state)
+    * start, timeStep, nTimes: simulation times
+    * position: horizontal position [x, y]
+    """
+    if isinstance(tables, np.ndarray) and tables.ndim == 2: tables = [tables]
+    stacked = __stackTables(tables)
+    omega = 2*np.pi*stacked[:, :, 0]
+    direction = np.radians(stacked[:, :, 3])
+    # phase of each component at the position, at time zero
+    phase = stacked[:, :, 4]*(position[0]*np.cos(direction) + position[1]*np.sin(direction)) + \
+        np.radians(stacked[:, :, 2])
+    coefficients = stacked[:, :, 1] * np.exp(-1j*phase)
+
+    blockSize = int(np.ceil(np.sqrt(nTimes)))
+    nBlocks = int(np.ceil(nTimes / blockSize))
+    tau = np.arange(blockSize) * timeStep
+    tBlock = start + np.arange(nBlocks) * blockSize * timeStep
+    offsets = np.exp(1j*omega[:, :, None]*tau[None, None, :]) # (sea state, component, tau)
+    blocks = np.exp(1j*omega[:, None, :]*tBlock[None, :, None]) * coefficients[:, None, :] # (sea state, block, component)
+    elevation = np.matmul(blocks, offsets).real.reshape(len(tables), nBlocks*blockSize)
+    return elevation[:, :nTimes]
+
+def LargestRiseAndFallFromElevation(times: np.ndarray, elevation: np.ndarray) -> tuple[float, float, float, float]:
+    """
+    Returns the time and height of the largest rise (trough to the following crest) and of the 
+    largest fall (crest to the following trough) of the elevation history, as 
+    (time of rise, rise, time of fall, fall). The time is the zero crossing between the trough
+    and the crest (linear interpolation). Incomplete half-cycles at the ends are not considered
+    """
+    positive = elevation >= 0
+    # index of the last sample before each zero crossing
+    crossings = np.flatnonzero(positive[1:] != positive[:-1])
+    if len(crossings) < 3:
+        raise Exception('Wave search duration too short: less than one wave found.')
+    
+    # extreme of each complete half-cycle (between consecutive crossings)
+    starts = crossings + 1
+    maxima = np.maximum.reduceat(elevation, starts)[:-1]
+    minima = np.minimum.reduceat(elevation, starts)[:-1]
+    isCrest = positive[starts[:-1]]
+    extremes = np.where(isCrest, maxima, minima)
+
+    # crossings between consecutive half-cycles
+    i = crossings[1:-1]
+    e0, e1 = elevation[i], elevation[i+1]
+    tCross = times[i] + (times[i+1] - times[i]) * e0 / (e0 - e1)
+    heights = extremes[1:] - extremes[:-1]
+    isRise = ~isCrest[:-1]
+
+    if not np.any(isRise) or np.all(isRise):
+        raise Exception('Wave search duration too short: less than one wave found.')
+    iRise = np.flatnonzero(isRise)[np.argmax(heights[isRise])]
+    iFall = np.flatnonzero(~isRise)[np.argmin(heights[~isRise])]
+    return float(tCross[iRise]), float(heights[iRise]), float(tCross[iFall]), float(-heights[iFall])
+
+def __timeStep(table: np.ndarray, samplesPerPeriod: int) -> float:
+    return 1. / (np.max(table[table[:, 1] > 0, 0]) * samplesPerPeriod)
+
+def LargestRiseAndFallBatch(
+        tables: list[np.ndarray],
+        searchFrom: float = 0.,
+        duration: float = 10800.,
+        position: list[float] = [0., 0.],
+        samplesPerPeriod: int = 20,
+        chunkSize: int = 20_000_000
+        ) -> np.ndarray:
+    """
+    Searches the largest rise and fall of many sea states at once (elevation of a group of sea 
+    states computed together, see `ElevationHistory`). Returns an array with one row per sea state 
+    and the columns: time of the largest rise, rise height, time of the largest fall and fall height.
+    * tables: wave component table of each sea state (see `WaveComponentTable`)
+    * searchFrom, duration: search period (simulation time)
+    * position: horizontal position [x, y] of the search
+    * samplesPerPeriod: number of time samples per period of the highest frequency component (of each sea state)
+    * chunkSize: maximum number of values (complex) kept in memory for each group of sea states
+    """
+    results = np.empty((len(tables), 4))
+    # sea states with the same time step computed together
+    groups: dict[float, list[int]] = {}
+    for i, table in enumerate(tables):
+        groups.setdefault(__timeStep(table, samplesPerPeriod), []).append(i)
+
+    for timeStep, indexes in groups.items():
+        nTimes = int(np.ceil(duration/timeStep)) + 1
+        times = searchFrom + np.arange(nTimes) * timeStep
+        nComponents = max(len(tables[i]) for i in indexes)
+        blockSize = np.ceil(np.sqrt(nTimes))
+        valuesPerState = nComponents * 2 * blockSize + 2 * nTimes
+        nStates = max(1, int(chunkSize // valuesPerState))
+        for start in range(0, len(indexes), nStates):
+            group = indexes[start:start+nStates]
+            elevation = ElevationHistory([tables[i] for i in group], searchFrom, timeStep, nTimes, position)
+            for i, row in zip(group, elevation):
+                results[i] = LargestRiseAndFallFromElevation(times, row)
+    return results
+
+def LargestRiseAndFallNumpy(
+        model: orc.Model, 
+        waveSearchDuration: float = 10800.,
+        samplesPerPeriod: int = 20
+        ) -> tuple[float, float]:
+    """
+    Returns the time of the largest rise and fall of the model wave, as `GetLargestRiseAndFall`,
+    from the wave components (elevation computed in memory, without the wave search spreadsheet)
+    at the wave preview position, from the wave search start (`WaveSearchFrom`)
+    """
+    env = model.environment
+    position = [env.WavePreviewPositionX, env.WavePreviewPositionY]
+    result = LargestRiseAndFallBatch(
+        [WaveComponentTable(model)], env.WaveSearchFrom, waveSearchDuration, position, samplesPerPeriod)[0]
+    t0 = env.WaveTimeOrigin
+    return float(result[0]-t0), float(result[2]-t0)
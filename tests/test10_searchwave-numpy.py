@@ -0,0 +1,32 @@
+# import NsgOrcFx as ofx
+
+import sys
+import time
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+from src import NsgOrcFx as ofx
+
+model = ofx.Model()
+
+# set irregular wave
+model.environment.data.WaveType = 'JONSWAP'
+model.environment.data.WaveHs = 2.5
+model.environment.data.WaveGamma = 2
+model.environment.data.WaveTp = 8
+
+# time of the largest rise and fall by the OrcaFlex wave search and computed in memory
+for engine in ['spreadsheet', 'numpy']:
+    start = time.time()
+    tRise, tFall = ofx.GetLargestRiseAndFall(model, engine=engine)
+    print(f'{engine}: rise at {tRise:0.1f} s, fall at {tFall:0.1f} s ({time.time()-start:0.2f} s)')
+
+# many sea states at once (e.g., a scatter diagram)
+tables = []
+for hs in [1.5, 2.5, 3.5]:
+    for tp in [6, 8, 10, 12]:
+        model.environment.data.WaveHs = hs
+        model.environment.data.WaveTp = tp
+        tables.append(ofx.WaveComponentTable(model))
+results = ofx.LargestRiseAndFallBatch(tables, duration=10800)
+print(results)
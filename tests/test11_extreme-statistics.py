@@ -0,0 +1,29 @@
+"""
+Example of the statistical extreme estimation (most probable maximum and P90) 
+from the maxima of several seeds and from the peaks over a threshold
+"""
+
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import numpy as np
+import pandas as pd
+from src import NsgOrcFx as ofx
+
+rng = np.random.default_rng(0)
+
+# maxima of 20 seeds (rows) of two results (columns), e.g. the 'Extremes by file' table
+# of ofx.ExtremeResultsFromSims('.', specs)
+maxima = pd.DataFrame({
+    'Tension': rng.gumbel(1000., 50., 20),
+    'Bend moment': rng.gumbel(200., 10., 20)})
+print(ofx.ExtremeStatistics(maxima, 'gumbel', [0.5, 0.9]))
+print(ofx.ExtremeStatistics(maxima, 'weibull', [0.9]))
+
+# two sea states, 10 seeds each, fitted separately
+print(ofx.ExtremeStatistics(maxima, groups=['Hs 2.5m']*10 + ['Hs 3.5m']*10))
+
+# peaks over threshold of 1-hour time histories, for the maximum in 3 hours
+histories = rng.normal(size=(2, 36000))
+print(ofx.PeaksOverThreshold(histories, duration=3600., target_duration=10800.))
@@ -0,0 +1,27 @@
+"""
+Example of the rainflow counting of stress time histories (nodes x thetas x samples), 
+checked against the example of the ASTM E1049 standard
+"""
+
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import numpy as np
+from src import NsgOrcFx as ofx
+
+# ASTM E1049 (Fig. 6): ranges 9 (0.5 cycle), 8 (1.0), 6 (0.5), 4 (1.5) and 3 (0.5)
+cycles = ofx.Rainflow([-2, 1, -3, 5, -1, 3, -4, 4, -2])
+counts, edges = cycles.histogram(np.arange(0.5, 11))
+for r, n in zip(edges[:-1] + 0.5, counts):
+    if n > 0: print(f'range {r:g}: {n:g} cycles')
+
+# stress field of a line, all nodes and thetas in one call
+model = ofx.Model()
+line = model.CreateLine()
+model.environment.WaveHeight = 5.0
+model.general.StageDuration[1] = 30.
+model.RunSimulation()
+arcLengths, thetas, stress = ofx.StressTimeHistories(line, period=1, n_thetas=8)
+counts, edges = ofx.RainflowHistogram(stress / 1e3, bins=20) # MPa
+print(stress.shape, counts.shape)
@@ -0,0 +1,66 @@
+"""
+Example of the shared folder queue of load cases (`ProcMultiThread` in several computers),
+with the workers of this computer (threads or processes) claiming the load cases of the queue
+"""
+
+import sys
+import tempfile
+import threading
+import multiprocessing
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+from src import NsgOrcFx as ofx
+
+fileList = [f'LC_{i:03d}.dat' for i in range(200)]
+
+def takeCases(queue: ofx.SharedCaseQueue) -> list[str]:
+    taken = []
+    while (file := queue.get()) != None:
+        taken.append(file)
+        queue.markDone(file, 'completed')
+    return taken
+
+def processWorker(queue: ofx.SharedCaseQueue, results: multiprocessing.Queue):
+    results.put(takeCases(queue))
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as folder:
+        queue = ofx.SharedCaseQueue(path.join(folder, '_Queue'))
+        queue.create(fileList)
+
+        # 8 workers sharing the same instance, as the thread backend of ProcMultiThread
+        taken = [[] for _ in range(8)]
+        def threadWorker(i: int):
+            taken[i] = takeCases(queue)
+        threads = [threading.Thread(target=threadWorker, args=(i,)) for i in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        allTaken = [file for files in taken for file in files]
+        assert sorted(allTaken) == sorted(fileList), 'Each load case must be taken exactly once'
+        print('Load cases per thread:', [len(files) for files in taken])
+
+        # a second computer (another instance) finds no load case left
+        other = ofx.SharedCaseQueue(path.join(folder, '_Queue'))
+        assert other.get() == None
+        status = queue.status()
+        print({state: len(files) for state, files in status.items()})
+        assert len(status['completed']) == len(fileList)
+
+    # 4 worker processes, as the process backend of ProcMultiThread (instance passed to each
+    # process, as on Windows, where the processes are spawned)
+    with tempfile.TemporaryDirectory() as folder:
+        queue = ofx.SharedCaseQueue(path.join(folder, '_Queue'))
+        queue.create(fileList)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        procs = [context.Process(target=processWorker, args=(queue, results)) for _ in range(4)]
+        for p in procs: p.start()
+        taken = [results.get() for _ in procs]
+        for p in procs: p.join()
+
+        allTaken = [file for files in taken for file in files]
+        assert sorted(allTaken) == sorted(fileList), 'Each load case must be taken exactly once'
+        print('Load cases per process:', [len(files) for files in taken])
+        assert len(queue.status()['completed']) == len(fileList)
@@ -0,0 +1,49 @@
+"""
+Example of the cache of the wave search results (`WaveSearchCache`): hit, miss and
+removal of the least recently used entries
+"""
+
+import sys
+import time
+import tempfile
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+from src import NsgOrcFx as ofx
+
+with tempfile.TemporaryDirectory() as folder:
+    cache = ofx.WaveSearchCache(path.join(folder, 'WaveSearch.db'), maxEntries=10)
+
+    # miss and hit
+    assert cache.get('sea state 0') == None
+    cache.put('sea state 0', 100., 150.)
+    assert cache.get('sea state 0') == (100., 150.)
+
+    # least recently used entries removed (10% more than the excess, so 2 entries)
+    for i in range(1, 10):
+        time.sleep(0.02) # distinct times of use
+        cache.put(f'sea state {i}', 100. + i, 150. + i)
+    time.sleep(0.02)
+    cache.get('sea state 0') # used again, so it is kept
+    time.sleep(0.02)
+    cache.put('sea state 10', 110., 160.)
+    assert len(cache) == 9
+    assert cache.get('sea state 0') != None
+    assert cache.get('sea state 1') == None and cache.get('sea state 2') == None
+    assert cache.get('sea state 10') == (110., 160.)
+
+    # wave search of a model: searched once, then taken from the cache
+    cache.clear()
+    model = ofx.Model()
+    model.environment.data.WaveType = 'JONSWAP'
+    model.environment.data.WaveHs = 2.5
+    model.environment.data.WaveTp = 8
+    for engine in ['spreadsheet', 'numpy']:
+        start = time.time()
+        first = ofx.GetLargestRiseAndFall(model, cache=cache, engine=engine)
+        searchTime = time.time() - start
+        start = time.time()
+        second = ofx.GetLargestRiseAndFall(model, cache=cache, engine=engine)
+        print(f'{engine}: {first} searched in {searchTime:0.2f} s, {second} from the cache in {time.time()-start:0.3f} s')
+        assert first == second
+    assert len(cache) == 2 # results of each engine with different keys
@@ -0,0 +1,58 @@
+"""
+Example of the compact load cases (base model and one variation file '.var.yml' per case):
+generation, reading and loading of the variation files, and the incremental generation
+"""
+
+import os
+import sys
+import tempfile
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+from src import NsgOrcFx as ofx
+
+directions = [0, 90]
+heights = [2.0, 3.0]
+periods = [8, 10]
+
+with tempfile.TemporaryDirectory() as tempFolder:
+    model = ofx.Model()
+    model.CreateLine()
+
+    def generate():
+        model.GenerateLoadCases('JONSWAP', directions, heights, periods, folder, incremental=True, compact=True)
+
+    folder = path.join(tempFolder, 'LoadCases')
+    os.makedirs(folder)
+    generate()
+    files = sorted([f for f in os.listdir(folder) if f.endswith('.var.yml')])
+    assert len(files) == 8 and path.isfile(path.join(folder, '_BaseModel.dat'))
+
+    # variation of the last case (Hs = 3.0 m, Tp = 10 s, direction = 90 deg)
+    baseFile, variation = ofx.ReadVariationFile(path.join(folder, files[-1]))
+    assert path.samefile(baseFile, path.join(folder, '_BaseModel.dat'))
+    for item in variation: print(item)
+
+    # loaded from the file or applied to the base model, the same data
+    case = ofx.Model()
+    ofx.LoadVariationFile(case, path.join(folder, files[-1]))
+    other = ofx.Model(baseFile)
+    ofx.ApplyVariation(other, variation)
+    for env in [case.environment, other.environment]:
+        assert (env.WaveHs, env.WaveTp, env.WaveDirection) == (3.0, 10, 90)
+    assert list(case.general.StageDuration) == list(other.general.StageDuration)
+
+    # incremental: a case whose file was deleted (e.g. after its simulation) is not generated again, 
+    # nor the data set by the cases (e.g. wave) changes the model
+    os.remove(path.join(folder, files[0]))
+    model.environment.WaveType = 'JONSWAP'
+    model.environment.WaveHs = 5.
+    mtimes = {f: path.getmtime(path.join(folder, f)) for f in files[1:]}
+    generate()
+    assert not path.isfile(path.join(folder, files[0]))
+    assert all(path.getmtime(path.join(folder, f)) == mtimes[f] for f in files[1:])
+
+    # ... unless the model changes (all cases generated again)
+    model.CreateLine()
+    generate()
+    assert path.isfile(path.join(folder, files[0]))
@@ -0,0 +1,47 @@
+"""
+Example of the cache of the models loaded from files (`ModelCache`): hit, reload of a
+changed file and release of the least recently used models
+"""
+
+import sys
+import time
+import tempfile
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+from src import NsgOrcFx as ofx
+
+with tempfile.TemporaryDirectory() as folder:
+    files = [path.join(folder, f'Model{i}.dat') for i in range(3)]
+    model = ofx.Model()
+    for file in files: model.SaveData(file)
+
+    cache = ofx.ModelCache(maxModels=2)
+    first = cache.load(files[0])
+    assert cache.load(files[0]) is first and (cache.hits, cache.misses) == (1, 1)
+
+    # changed file: loaded again, the old model released
+    time.sleep(0.1) # distinct modification time
+    model.general.StageDuration[1] += 10.
+    model.SaveData(files[0])
+    changed = cache.load(files[0])
+    assert changed is not first and len(cache) == 1
+    assert changed.general.StageDuration[1] == model.general.StageDuration[1]
+
+    # least recently used model released (files[0] used again, so files[1] is released)
+    cache.load(files[1])
+    cache.load(files[0])
+    cache.load(files[2])
+    assert len(cache) == 2
+    misses = cache.misses
+    cache.load(files[0])
+    assert cache.misses == misses
+    cache.load(files[1])
+    assert cache.misses == misses + 1
+
+    # released after its use (e.g. by the post-processing, after each file)
+    cache.release(files[1])
+    assert len(cache) == 1
+    cache.release()
+    assert len(cache) == 0
+    print(f'hits: {cache.hits}, misses: {cache.misses}')
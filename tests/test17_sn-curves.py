@@ -0,0 +1,38 @@
+"""
+Example of the S-N curves of the library (DNV-RP-C203), checked against some entries of the
+tables of each environment (air: Table 2-1; seawater with cathodic protection: Table 2-2;
+free corrosion: Table 2-4)
+"""
+
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+import numpy as np
+from src import NsgOrcFx as ofx
+
+# (name, environment): m1, log(a1), m2, log(a2), k (m2 and log(a2) are None for single slope curves)
+reference = {
+    ('B1', 'air'):              (4.0, 15.117, 5.0, 17.146, 0.  ),
+    ('D', 'air'):               (3.0, 12.164, 5.0, 15.606, 0.20),
+    ('F3', 'air'):              (3.0, 11.546, 5.0, 14.576, 0.25),
+    ('B2', 'seawater'):         (4.0, 14.685, 5.0, 16.856, 0.  ),
+    ('D', 'seawater'):          (3.0, 11.764, 5.0, 15.606, 0.20),
+    ('F3', 'seawater'):         (3.0, 11.146, 5.0, 14.576, 0.25),
+    ('B1', 'free corrosion'):   (3.0, 12.436, None, None, 0.  ),
+    ('B2', 'free corrosion'):   (3.0, 12.262, None, None, 0.  ),
+    ('D', 'free corrosion'):    (3.0, 11.687, None, None, 0.20),
+    ('F3', 'free corrosion'):   (3.0, 11.068, None, None, 0.25),
+    }
+
+for (name, environment), (m1, log_a1, m2, log_a2, k) in reference.items():
+    curve = ofx.selectSNCurveByName(name, environment)
+    print(curve)
+    assert (curve.m1, curve.log_a1, curve.m2, curve.log_a2, curve.k) == (m1, log_a1, m2, log_a2, k)
+
+# cycles to failure: low cycle region, high cycle region (two slopes) and single slope
+D = ofx.selectSNCurveByName('D', 'air')
+assert np.isclose(D.cycles(100.), 10**(12.164 - 3*2))
+assert np.isclose(D.cycles(20.), 10**(15.606 - 5*np.log10(20.)))
+B1 = ofx.selectSNCurveByName('B1', 'free corrosion')
+assert np.allclose(B1.cycles([10., 100.]), 10**(12.436 - 3*np.array([1., 2.])))
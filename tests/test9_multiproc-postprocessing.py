@@ -0,0 +1,36 @@
+"""
+Example of running load cases in worker processes, extracting results 
+from the model in memory right after each simulation
+"""
+
+import sys
+from os import path
+sys.path.append( path.dirname( path.dirname( path.abspath(__file__) ) ) )
+
+from src import NsgOrcFx as ofx
+
+outFolder = r'tests\tmptestfiles'
+
+if __name__ == '__main__': # required by the 'process' backend on Windows
+    model = ofx.Model()
+    model.CreateLine()
+
+    # generate the load cases
+    model.GenerateLoadCases('Dean stream', [0, 90], [2.0, 3.0], [7, 9], outFolder)
+
+    # extreme tension at End A and bending moment range graph, without saving the .sim files
+    postProcessors = {
+        'Tension': ofx.ExtremeResults('Line1', ['Effective tension'], objectExtra='End A'),
+        'Moment': ofx.RangeGraphResults('Line1', ['Bend moment']),
+    }
+
+    ofx.ProcMultiThread(
+        outFolder, '.', 
+        backend='process', 
+        post_processors=postProcessors, 
+        save_sim=False,
+        resume=True)
+
+    results = ofx.ReadPostProcResults(path.join(outFolder, '_PostProcResults.pkl'))
+    for LC, rst in results.items():
+        print(LC, rst['Tension']['Effective tension']['Max'])